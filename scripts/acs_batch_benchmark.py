@@ -0,0 +1,148 @@
+#!/usr/bin/env python2
+
+"""
+Frames and bytes of the BA votes in one ACS round, with every vote in its own ACS message versus batched in ACSBatch.
+
+The n promoters run in one process and their messages go through the reactor instead of TCP, every message is
+serialized and parsed again on delivery. Every promoter has its own order of the promoter list, the batches only
+depend on the sorted order. We run one ACS round with t = (n - 1) / 3 until every promoter completes it and count
+the frames that were sent and their bytes, including the length prefix and the header of the frame.
+
+Usage: PYTHONPATH=. python2 scripts/acs_batch_benchmark.py [--ns N [N ...]]
+"""
+
+import argparse
+import logging
+import os
+import random
+import subprocess
+import sys
+from collections import defaultdict
+
+from twisted.internet import reactor
+
+import src.messages.messages_pb2 as pb
+from src.consensus.acs import ACS
+from src.utils import Replay, Handled, FutureBuffer
+
+# the length prefix and the header of a frame, see protobufreceiver
+_FRAME_OVERHEAD = 4 + 3
+
+
+class Config(object):
+    def __init__(self, n, t, batch_votes):
+        self.n = n
+        self.t = t
+        self.from_instruction = True
+        self.failure = None
+        self.ec_backend = 'numpy'
+        self.ec_threads = 0
+        self.batch_votes = batch_votes
+
+
+class Network(object):
+    def __init__(self):
+        self.nodes = {}
+        self.frames = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.done = 0
+
+    def deliver(self, src, dst, msg):
+        if isinstance(msg, pb.ACS):
+            kind = 'ACS ' + msg.WhichOneof('body')
+        else:
+            kind = msg.__class__.__name__
+        data = msg.SerializeToString()
+        self.frames[kind] += 1
+        self.bytes[kind] += len(data) + _FRAME_OVERHEAD
+        reactor.callLater(0, self.nodes[dst].receive, type(msg).FromString(data), src)
+
+    def completed(self):
+        self.done += 1
+        if self.done == len(self.nodes):
+            reactor.stop()
+
+
+class Factory(object):
+    """
+    The parts of MyFactory that ACS uses, including the handling of ACS messages
+    """
+    def __init__(self, network, config, vk, promoters):
+        self.network = network
+        self.config = config
+        self.vk = vk
+        self.promoters = promoters
+        self.acs = ACS(self)
+        self.future_msgs = FutureBuffer(1 << 20)
+
+    def send(self, node, msg):
+        self.network.deliver(self.vk, node, msg)
+
+    def promoter_cast(self, msg):
+        for promoter in self.promoters:
+            self.send(promoter, msg)
+
+    def receive(self, msg, remote_vk):
+        if isinstance(msg, pb.ACSBatch):
+            res = self.acs.unbatch(msg)
+            if isinstance(res, Replay):
+                self.future_msgs.add(msg.round, None, (remote_vk, msg))
+                return
+            for m in res:
+                self.process_acs_res(self.acs.handle(m, remote_vk), m, remote_vk)
+        else:
+            self.process_acs_res(self.acs.handle(msg, remote_vk), msg, remote_vk)
+
+    def process_acs_res(self, o, m, remote_vk):
+        if isinstance(o, Replay):
+            self.future_msgs.add(m.round, m.instance, (remote_vk, m))
+        elif isinstance(o, Handled) and o.m is not None:
+            self.network.completed()
+
+    def release_acs(self, round, instance=None):
+        for remote_vk, m in self.future_msgs.release(round, instance):
+            reactor.callLater(0, self.receive, m, remote_vk)
+
+    def discard_acs(self, round):
+        self.future_msgs.discard(round)
+
+
+def run_once(n, batch_votes):
+    t = (n - 1) / 3
+    network = Network()
+    promoters = [os.urandom(32) for _ in range(n)]
+    for vk in promoters:
+        own_order = list(promoters)
+        random.shuffle(own_order)
+        network.nodes[vk] = Factory(network, Config(n, t, batch_votes), vk, own_order)
+    for node in network.nodes.itervalues():
+        reactor.callLater(0, node.acs.start, os.urandom(1000), 1)
+    reactor.run()
+
+    ba = [kind for kind in network.frames if kind in ('ACS mo14', 'ACSBatch')]
+    print sum(network.frames[k] for k in ba), sum(network.bytes[k] for k in ba), \
+        sum(network.frames.values()), sum(network.bytes.values())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns', type=int, nargs='+', default=[4, 10, 19, 31])
+    parser.add_argument('--run', nargs=2, type=int, metavar=('N', 'BATCH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.run:
+        run_once(args.run[0], bool(args.run[1]))
+        sys.exit(0)
+
+    # every run uses a fresh reactor in a subprocess
+    for n in args.ns:
+        res = {}
+        for batch in [0, 1]:
+            out = subprocess.check_output([sys.executable, __file__, '--run', str(n), str(batch)])
+            res[batch] = map(int, out.split())
+        print "n = {}: BA votes {} frames, {:.1f} kB -> {} frames, {:.1f} kB; " \
+              "all of ACS {} frames, {:.1f} kB -> {} frames, {:.1f} kB"\
+            .format(n, res[0][0], res[0][1] / 1e3, res[1][0], res[1][1] / 1e3,
+                    res[0][2], res[0][3] / 1e3, res[1][2], res[1][3] / 1e3)
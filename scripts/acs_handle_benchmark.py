@@ -0,0 +1,104 @@
+#!/usr/bin/env python2
+
+"""
+Cost of ACS.handle per Mo14 message against the number of promoters n, with t = (n - 1) / 3.
+
+We feed one ACS round a synthetic stream of messages, as if they came from all the n promoters. The RBCs of n - t
+instances have delivered, their BAs get EST and AUX messages with value 1 and decide 1 in the first round. Then ACS
+starts the other t BAs with 0, which get EST and AUX messages with value 0 until they decide 0 in the fifth round,
+and ACS completes. The messages are made beforehand and are not sent, we report the mean time per message.
+
+Usage: PYTHONPATH=. python2 scripts/acs_handle_benchmark.py [--ns N [N ...]]
+"""
+
+import argparse
+import os
+import time
+
+import src.messages.messages_pb2 as pb
+from src.consensus.acs import ACS
+from src.consensus.mo14 import coins
+from src.utils import Handled, PromoterIndex
+
+
+class Config(object):
+    def __init__(self, n, t):
+        self.n = n
+        self.t = t
+        self.from_instruction = True
+        self.failure = None
+        self.ec_backend = 'numpy'
+        self.ec_threads = 0
+        self.batch_votes = False
+
+
+class Factory(object):
+    """
+    The parts of MyFactory that ACS uses
+    """
+    def __init__(self, n, t):
+        self.config = Config(n, t)
+        self.promoters = [os.urandom(32) for _ in range(n)]
+        self.vk = self.promoters[0]
+
+    def send(self, node, msg):
+        pass
+
+    def promoter_cast(self, msg):
+        pass
+
+    def discard_acs(self, r):
+        pass
+
+    def release_acs(self, r, instance=None):
+        pass
+
+
+def stream(instances, senders, v, rounds):
+    """
+    :return: (message, sender) of every promoter for every instance, round by round, the ESTs before the AUXs
+    """
+    index = PromoterIndex(senders)
+    for r in rounds:
+        for ty in (pb.Mo14.EST, pb.Mo14.AUX):
+            msgs = [pb.ACS(instance=index.index(instance), round=1, mo14=pb.Mo14(ty=ty, r=r, v=v))
+                    for instance in instances]
+            for sender in senders:
+                for msg in msgs:
+                    yield msg, sender
+
+
+def run_once(n):
+    t = (n - 1) / 3
+    factory = Factory(n, t)
+    acs = ACS(factory)
+    acs.start('proposal', 1)
+    ones, zeros = factory.promoters[:n - t], factory.promoters[n - t:]
+    for instance in ones:
+        acs._bracha_delivered(instance, 'proposal')
+
+    zero_rounds = range(1, coins.index(0, 1) + 1)
+    count = 0
+    res = None
+    start = time.time()
+    for msg, sender in stream(ones, factory.promoters, 1, [1]):
+        acs.handle(msg, sender)
+        count += 1
+    for msg, sender in stream(zeros, factory.promoters, 0, zero_rounds):
+        handled = acs.handle(msg, sender)
+        if isinstance(handled, Handled) and handled.m is not None:
+            res = handled.m[0]
+        count += 1
+    elapsed = time.time() - start
+    assert res is not None and len(res) == n - t, "ACS did not complete"
+    return elapsed / count, count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns', type=int, nargs='+', default=[4, 10, 31, 64, 100])
+    args = parser.parse_args()
+
+    for n in args.ns:
+        per_msg, count = run_once(n)
+        print "n = {}: {} messages, ACS.handle {:.1f} us per message".format(n, count, per_msg * 1e6)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python2
+
+"""
+Cost of ACS.start against the number of promoters n, with t = (n - 1) / 3.
+
+ACS.start sets up one Bracha and one Mo14 instance per promoter and erasure codes our proposal.
+We run many rounds, either constructing new instances and erasure coding drivers every round, which is what ACS did
+before the drivers were cached and the instances pooled, or reusing them, and report the mean time per round.
+The messages are counted but not sent.
+
+Usage: PYTHONPATH=. python2 scripts/acs_start_benchmark.py [--ns N [N ...]] [--rounds ROUNDS] [--size BYTES]
+"""
+
+import argparse
+import os
+import time
+
+from src.consensus import erasure
+from src.consensus.acs import ACS
+
+
+class Config(object):
+    def __init__(self, n, t):
+        self.n = n
+        self.t = t
+        self.from_instruction = True
+        self.ec_backend = 'pyeclib'
+        self.ec_threads = 0
+
+
+class Factory(object):
+    """
+    The parts of MyFactory that ACS uses
+    """
+    def __init__(self, n, t):
+        self.config = Config(n, t)
+        self.promoters = [os.urandom(32) for _ in range(n)]
+        self.vk = self.promoters[0]
+        self.sent = 0
+
+    def send(self, node, msg):
+        self.sent += 1
+
+    def promoter_cast(self, msg):
+        self.sent += len(self.promoters)
+
+    def discard_acs(self, r):
+        pass
+
+    def release_acs(self, r, instance=None):
+        pass
+
+
+def run_once(n, rounds, size, pooled):
+    factory = Factory(n, (n - 1) / 3)
+    acs = ACS(factory)
+    msg = os.urandom(size)
+    start = time.time()
+    for r in range(1, rounds + 1):
+        if not pooled:
+            erasure._ec_drivers.clear()
+            acs = ACS(factory)
+        acs.reset_then_start(msg, r)
+    return (time.time() - start) / rounds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns', type=int, nargs='+', default=[4, 7, 10, 16, 19, 25, 31])
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--size', type=int, default=10000, help='bytes in the proposal')
+    args = parser.parse_args()
+
+    for n in args.ns:
+        fresh = run_once(n, args.rounds, args.size, False)
+        pooled = run_once(n, args.rounds, args.size, True)
+        print "n = {}: ACS.start fresh {:.1f} us, pooled {:.1f} us".format(n, fresh * 1e6, pooled * 1e6)
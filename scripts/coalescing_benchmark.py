@@ -0,0 +1,118 @@
+#!/usr/bin/env python2
+
+"""
+Benchmark of the outbound write coalescing in ProtobufReceiver.
+
+One sender is connected to n receivers over TCP on localhost, this is the view of a single promoter.
+In every step (one reactor iteration) the sender sends one small ACS/Mo14 message per BA instance to every receiver,
+i.e. n * n frames, which is the traffic of one BA step of ACS.
+We count the number of transport writes, the number of send syscalls and the received messages per second.
+
+Usage: PYTHONPATH=. python2 scripts/coalescing_benchmark.py N [--steps STEPS] [--threshold BYTES] [--batch]
+"""
+
+import argparse
+import time
+
+from twisted.internet import reactor, tcp
+from twisted.internet.protocol import Factory, ClientFactory
+
+import src.messages.messages_pb2 as pb
+from src.protobufreceiver import ProtobufReceiver, Frame
+
+_counts = {'writes': 0, 'syscalls': 0}
+
+
+def _count(f, key):
+    def wrapper(*args, **kwargs):
+        _counts[key] += 1
+        return f(*args, **kwargs)
+    return wrapper
+
+tcp.Connection.write = _count(tcp.Connection.write, 'writes')
+tcp.Connection.writeSomeData = _count(tcp.Connection.writeSomeData, 'syscalls')
+
+
+class Receiver(ProtobufReceiver):
+    def __init__(self, factory):
+        self.factory = factory
+
+    def obj_received(self, obj):
+        self.factory.received += 1
+        if self.factory.received == self.factory.expected:
+            self.factory.done_time = time.time()
+            reactor.stop()
+
+    def connection_lost(self, reason):
+        pass
+
+
+class ReceiverFactory(Factory):
+    def __init__(self, expected):
+        self.received = 0
+        self.expected = expected
+        self.done_time = None
+
+    def buildProtocol(self, addr):
+        return Receiver(self)
+
+
+class Sender(ProtobufReceiver):
+    def obj_received(self, obj):
+        pass
+
+    def connection_lost(self, reason):
+        pass
+
+
+def run_once(n, steps, threshold, batch):
+    frames = [Frame(pb.ACS(instance=0, round=1, mo14=pb.Mo14(ty=pb.Mo14.EST, r=1, v=i % 2)))
+              for i in range(n)]
+    receiver_factory = ReceiverFactory(n * n * steps)
+    port = reactor.listenTCP(0, receiver_factory, interface='127.0.0.1')
+
+    senders = []
+
+    class SenderFactory(ClientFactory):
+        def buildProtocol(self, addr):
+            p = Sender()
+            p.flush_threshold = threshold
+            p.remote_batch = batch
+            senders.append(p)
+            if len(senders) == n:
+                reactor.callLater(0, start)
+            return p
+
+    def step(remaining):
+        for sender in senders:
+            for frame in frames:
+                sender.send_frame(frame)
+        if remaining > 1:
+            reactor.callLater(0, step, remaining - 1)
+
+    def start():
+        _counts['writes'] = 0
+        _counts['syscalls'] = 0
+        receiver_factory.start_time = time.time()
+        step(steps)
+
+    for _ in range(n):
+        reactor.connectTCP('127.0.0.1', port.getHost().port, SenderFactory())
+
+    reactor.run()
+    elapsed = receiver_factory.done_time - receiver_factory.start_time
+    return _counts['writes'], _counts['syscalls'], n * n * steps / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('n', type=int, choices=[16, 31], help='the number of promoters')
+    parser.add_argument('--steps', type=int, default=50, help='the number of BA steps')
+    parser.add_argument('--threshold', type=int, default=64 * 1024, help='flush threshold in bytes, 0 disables')
+    parser.add_argument('--batch', action='store_true', help='coalesce into batch frames')
+    args = parser.parse_args()
+
+    # the reactor cannot be restarted, so every configuration runs in its own process
+    writes, syscalls, rate = run_once(args.n, args.steps, args.threshold, args.batch)
+    print "n = {}, threshold = {}, batch = {}: {} writes, {} send syscalls, {:.0f} msgs/s"\
+        .format(args.n, args.threshold, args.batch, writes, syscalls, rate)
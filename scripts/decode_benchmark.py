@@ -0,0 +1,74 @@
+#!/usr/bin/env python2
+
+"""
+Benchmark of the inbound frame decoding in ProtobufReceiver.
+
+A stream of Cons frames of the given size is delivered in chunks of the size of a TCP read,
+first to a receiver built on Twisted's Int32StringReceiver, which is how ProtobufReceiver used to work,
+and then to the current ProtobufReceiver. We report the decode throughput in MB/s, including the protobuf parsing.
+
+Usage: PYTHONPATH=. python2 scripts/decode_benchmark.py [--sizes MB [MB ...]] [--chunk BYTES] [--frames FRAMES]
+"""
+
+import argparse
+import time
+
+from twisted.protocols.basic import Int32StringReceiver
+
+import src.messages.messages_pb2 as pb
+from src.protobufreceiver import ProtobufReceiver, Frame, _HEADER, _PB_TAG_TO_TUPLE
+
+
+class LegacyReceiver(Int32StringReceiver):
+    MAX_LENGTH = ProtobufReceiver.MAX_LENGTH
+
+    def __init__(self):
+        self.received = 0
+
+    def stringReceived(self, string):
+        _, tag = _HEADER.unpack_from(string)
+        obj = _PB_TAG_TO_TUPLE[tag][1]()
+        obj.ParseFromString(string[_HEADER.size:])
+        self.received += 1
+
+
+class Receiver(ProtobufReceiver):
+    def __init__(self):
+        self.received = 0
+
+    def obj_received(self, obj):
+        self.received += 1
+
+    def connection_lost(self, reason):
+        pass
+
+
+def make_cons(size):
+    vk = 'v' * 32
+    block = pb.CpBlock(inner=pb.CpBlock.Inner(seq=1, signers='\x0f', sigs=['s' * 64] * 4),
+                       s=pb.Signature(vk=vk, signed_document='s' * 64))
+    return pb.Cons(round=1, blocks=[block] * max(1, size / block.ByteSize()))
+
+
+def run_once(receiver, data, chunk, frames):
+    start = time.time()
+    for i in xrange(0, len(data), chunk):
+        receiver.dataReceived(data[i:i + chunk])
+    elapsed = time.time() - start
+    assert receiver.received == frames
+    return len(data) / elapsed / 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.01, 1, 5, 19], help='frame sizes in MB')
+    parser.add_argument('--chunk', type=int, default=64 * 1024, help='bytes per read')
+    parser.add_argument('--frames', type=int, default=4, help='frames per size')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        data = Frame(make_cons(int(size * 1e6))).data * args.frames
+        legacy = run_once(LegacyReceiver(), data, args.chunk, args.frames)
+        current = run_once(Receiver(), data, args.chunk, args.frames)
+        print "frame = {} MB: Int32StringReceiver {:.1f} MB/s, ProtobufReceiver {:.1f} MB/s"\
+            .format(size, legacy, current)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+
+"""
+Bootstrap cost of the discovery server, with the nodes learning the membership by polling versus by subscription.
+
+A discovery server and N clients run in one process and talk over TCP on localhost, the clients join one by one
+every INTERVAL seconds and each one waits until it knows all the N nodes. In the poll mode every client asks for the
+full membership every second until it is complete, which is what the clients did before the membership was
+versioned. In the push mode every client asks once and subscribes to the nodes that join later. We report the bytes
+that the server sent and the time from the first join until every client knows every node.
+Every run uses a fresh reactor in a subprocess.
+
+Usage: PYTHONPATH=. python2 scripts/discovery_benchmark.py [--populations N [N ...]] [--interval SECONDS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from base64 import b64encode
+
+from twisted.internet import reactor, task
+from twisted.internet.endpoints import TCP4ClientEndpoint, connectProtocol
+
+import src.messages.messages_pb2 as pb
+from src.discovery import Discovery, DiscoveryFactory
+
+
+class Run(object):
+    def __init__(self, population, mode):
+        self.population = population
+        self.mode = mode
+        self.received = 0
+        self.complete = 0
+        self.start = None
+        self.elapsed = None
+
+
+class Client(object):
+    """
+    The part of MyFactory that the discovery client uses
+    """
+    def __init__(self, run, vk, port):
+        self.run = run
+        self.vk = vk
+        self.port = port
+        self.known = set()
+        self.proto = None
+        self.done = False
+
+    def new_connection_if_not_exist(self, nodes):
+        self.known.update(nodes.keys())
+        if not self.done and len(self.known) >= self.run.population:
+            self.done = True
+            self.run.complete += 1
+            if self.run.complete == self.run.population:
+                self.run.elapsed = time.time() - self.run.start
+                reactor.stop()
+
+    def connected(self, proto):
+        self.proto = proto
+        if self.run.mode == 'push':
+            proto.say_hello(self.vk, self.port, True)
+        else:
+            self.poll()
+
+    def poll(self):
+        if not self.done:
+            self.proto.state = 'CLIENT'
+            self.proto.send_obj(pb.Discover(vk=self.vk, port=self.port))
+            reactor.callLater(1, self.poll)
+
+
+class CountingDiscovery(Discovery):
+    def dataReceived(self, data):
+        self.factory.run.received += len(data)
+        Discovery.dataReceived(self, data)
+
+
+def join(run, server_port, i):
+    if run.start is None:
+        run.start = time.time()
+    client = Client(run, b64encode(os.urandom(32)), 20000 + i)
+    point = TCP4ClientEndpoint(reactor, 'localhost', server_port)
+    connectProtocol(point, CountingDiscovery({}, client)).addCallback(client.connected)
+
+
+def run_once(population, mode, interval):
+    run = Run(population, mode)
+    server_port = reactor.listenTCP(0, DiscoveryFactory(None, None, None, None)).getHost().port
+    clients = iter(range(population))
+
+    def join_next():
+        try:
+            join(run, server_port, next(clients))
+        except StopIteration:
+            lc.stop()
+
+    lc = task.LoopingCall(join_next)
+    lc.start(interval)
+    reactor.run()
+    print run.received, run.elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--populations', type=int, nargs='+', default=[100, 500, 1000, 2000])
+    parser.add_argument('--interval', type=float, default=0.005, help='seconds between two joins')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'N'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_once(int(args.run[1]), args.run[0], args.interval)
+        sys.exit(0)
+
+    for population in args.populations:
+        res = {}
+        for mode in ['poll', 'push']:
+            out = subprocess.check_output([sys.executable, __file__, '--interval', str(args.interval),
+                                           '--run', mode, str(population)])
+            received, elapsed = out.split()
+            res[mode] = (int(received), float(elapsed))
+        print "population = {}: poll {:.1f} MB in {:.2f} s, push {:.1f} MB in {:.2f} s"\
+            .format(population, res['poll'][0] / 1e6, res['poll'][1], res['push'][0] / 1e6, res['push'][1])
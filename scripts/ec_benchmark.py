@@ -0,0 +1,71 @@
+#!/usr/bin/env python2
+
+"""
+Erasure coding throughput of the Bracha backends for the proposals of ACS.
+
+A proposal is a CpBlocks with the latest CP of every node of the population, each CP carries t + 1 signatures
+from the promoters, so its size grows with the population. For every number of promoters n, with t = (n - 1) / 3,
+we encode the proposal into n fragments and decode it from n - 2t of them, which is what Bracha does,
+and report the mean time of each. The pyeclib backend only supports n <= 32.
+Decoding uses the same random subset of fragments every time, so it shows the cost with a cached matrix inverse.
+
+Usage: PYTHONPATH=. python2 scripts/ec_benchmark.py [--ns N [N ...]] [--populations P [P ...]] [--repeat R]
+                                                   [--backends B [B ...]]
+"""
+
+import argparse
+import os
+import random
+import time
+
+import src.messages.messages_pb2 as pb
+from src.consensus import erasure
+
+
+def make_proposal(population, t):
+    cps = []
+    for _ in range(population):
+        # t + 1 signatures and the bitmap of the 3t + 1 promoters
+        sigs = [os.urandom(64) for _ in range(t + 1)]
+        inner = pb.CpBlock.Inner(prev=os.urandom(32), seq=1, round=1, cons_hash=os.urandom(32),
+                                 signers=os.urandom((3 * t + 8) / 8), sigs=sigs, p=1)
+        cps.append(pb.CpBlock(inner=inner, s=pb.Signature(vk=os.urandom(32), signed_document=os.urandom(64))))
+    return pb.CpBlocks(cps=cps).SerializeToString()
+
+
+def run_once(driver, data, k, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        fragments = driver.encode(data)
+    encode = (time.time() - start) / repeat
+
+    subset = random.sample(fragments, k)
+    assert driver.decode(subset) == data
+    start = time.time()
+    for _ in range(repeat):
+        driver.decode(subset)
+    decode = (time.time() - start) / repeat
+    return encode, decode
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns', type=int, nargs='+', default=[16, 32, 64, 128])
+    parser.add_argument('--populations', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', choices=erasure.EC_BACKENDS, default=list(erasure.EC_BACKENDS))
+    args = parser.parse_args()
+
+    for n in args.ns:
+        t = (n - 1) / 3
+        k, m = n - 2 * t, 2 * t
+        for population in args.populations:
+            data = make_proposal(population, t)
+            for backend in args.backends:
+                if backend == 'pyeclib' and n > 32:
+                    continue
+                encode, decode = run_once(erasure.ec_driver(k, m, backend), data, k, args.repeat)
+                print "n = {}, population = {}, proposal {:.2f} MB, {}: encode {:.1f} ms ({:.1f} MB/s), " \
+                      "decode {:.1f} ms ({:.1f} MB/s)"\
+                    .format(n, population, len(data) / 1e6, backend, encode * 1e3, len(data) / encode / 1e6,
+                            decode * 1e3, len(data) / decode / 1e6)
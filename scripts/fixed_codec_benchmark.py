@@ -0,0 +1,64 @@
+#!/usr/bin/env python2
+
+"""
+Encode and decode throughput of the small consensus messages, protobuf versus their fixed struct layouts.
+
+For every message type we encode a message and decode it again, in messages per second. The protobuf side serializes
+with SerializeToString and parses a fresh object with ParseFromString, the fixed side uses the codec of the layout,
+which also builds a protobuf object. The ACS messages also look up their body with WhichOneof, like ACS.handle does.
+The payloads are decoded from buffers, like ProtobufReceiver does. We also report the payload sizes.
+
+Usage: PYTHONPATH=. python2 scripts/fixed_codec_benchmark.py [--count COUNT]
+"""
+
+import argparse
+import time
+
+import src.messages.messages_pb2 as pb
+from src.messages import fixed
+
+_READY = pb.Bracha.Type.Value('READY')
+
+_CASES = [
+    ('Mo14', pb.Mo14(ty=pb.Mo14.AUX, r=3, v=1), fixed.Mo14Codec()),
+    ('Bracha READY', pb.Bracha(ty=_READY, digest='d' * 32), fixed.BrachaReadyCodec()),
+    ('ACS Mo14', pb.ACS(instance=17, round=1234, mo14=pb.Mo14(ty=pb.Mo14.EST, r=2, v=1)), fixed.ACSMo14Codec()),
+    ('ACS Bracha READY', pb.ACS(instance=17, round=1234, bracha=pb.Bracha(ty=_READY, digest='d' * 32)),
+     fixed.ACSBrachaReadyCodec()),
+]
+
+
+def run_protobuf(msg, count):
+    cls = msg.__class__
+    acs = cls is pb.ACS
+    start = time.time()
+    for _ in xrange(count):
+        obj = cls()
+        obj.ParseFromString(buffer(msg.SerializeToString()))
+        if acs:
+            obj.WhichOneof('body')
+    return count / (time.time() - start)
+
+
+def run_fixed(msg, codec, count):
+    acs = codec.cls is pb.ACS
+    start = time.time()
+    for _ in xrange(count):
+        obj = codec.decode(buffer(codec.encode(msg)))
+        if acs:
+            obj.WhichOneof('body')
+    return count / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200000, help='messages per measurement')
+    args = parser.parse_args()
+
+    for name, msg, codec in _CASES:
+        assert codec.fits(msg) and codec.decode(codec.encode(msg)) == msg
+        pb_rate = run_protobuf(msg, args.count)
+        fixed_rate = run_fixed(msg, codec, args.count)
+        print "{}: protobuf {} bytes, {:.0f} k msgs/s; fixed {} bytes, {:.0f} k msgs/s; {:.2f}x"\
+            .format(name, msg.ByteSize(), pb_rate / 1e3, len(codec.encode(msg)), fixed_rate / 1e3,
+                    fixed_rate / pb_rate)
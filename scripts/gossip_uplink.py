@@ -0,0 +1,114 @@
+#!/usr/bin/env python2
+
+"""
+Uplink usage of the promoters per round, broadcast over the full mesh versus the gossip overlay.
+
+Every round each promoter disseminates the same Cons, which has one CP per node, and its own SigWithRound.
+The population is simulated in one process, the messages are delivered in FIFO order without a network,
+and we count the bytes that every node sends (payload and framing) as well as how many nodes received everything.
+
+Usage: PYTHONPATH=. python2 scripts/gossip_uplink.py [--populations N [N ...]] [--promoters n] [--fan-out F]
+                                                    [--ttl HOPS]
+"""
+
+import argparse
+import os
+from collections import deque, defaultdict
+
+import src.messages.messages_pb2 as pb
+from src.gossip import GossipOverlay
+from src.protobufreceiver import MessageRegistry, _HEADER, _PREFIX
+
+_FRAMING = _PREFIX.size + _HEADER.size
+
+
+class Config(object):
+    def __init__(self, fan_out):
+        self.fan_out = fan_out
+
+
+class SimNode(object):
+    """
+    The parts of MyFactory that the gossip overlay uses
+    """
+    def __init__(self, vk, network, config, ttl):
+        self.vk = vk
+        self.network = network
+        self.members = network.members
+        self.config = config
+        self.sent = 0
+        self.received = defaultdict(int)  # key: message name
+
+        self.handlers = MessageRegistry()
+        self.handlers.register(pb.Cons, self.handle)
+        self.handlers.register(pb.SigWithRound, self.handle)
+        self.gossip_overlay = GossipOverlay(self, ttl)
+        self.handlers.register(pb.Gossip, self.gossip_overlay.handle)
+
+    def handle(self, msg, remote_vk):
+        self.received[msg.__class__.__name__] += 1
+
+    def send(self, node, frame):
+        self.sent += frame.size + _FRAMING
+        self.network.queue.append((node, frame, self.vk))
+
+    def send_loopback(self, frame):
+        self.handle(frame.obj, self.vk)
+
+
+class Network(object):
+    def __init__(self, population, config, ttl):
+        self.nodes = {}
+        self.members = [os.urandom(32) for _ in range(population)]
+        self.queue = deque()  # (receiver, frame, sender)
+        for vk in self.members:
+            self.nodes[vk] = SimNode(vk, self, config, ttl)
+
+    def run(self):
+        while self.queue:
+            node, frame, sender = self.queue.popleft()
+            self.nodes[node].handlers.dispatch(frame.tag, frame.obj, sender)
+
+
+def make_msgs(vks, r):
+    vk = 'v' * 32
+    cps = [pb.CpBlock(inner=pb.CpBlock.Inner(round=r, seq=1, signers='\x01', sigs=['s' * 64]),
+                      s=pb.Signature(vk=vk, signed_document='s' * 64)) for _ in vks]
+    cons = pb.Cons(round=r, blocks=cps)
+    sigs = {vk: pb.SigWithRound(r=r, signer=i, sig='s' * 64) for i, vk in enumerate(vks)}
+    return cons, sigs
+
+
+def run_once(population, promoters, fan_out, ttl):
+    network = Network(population, Config(fan_out), ttl)
+    vks = sorted(network.nodes.keys())
+    cons, sigs = make_msgs(vks, 1)
+
+    promoter_vks = vks[:promoters]
+    for vk in promoter_vks:
+        node = network.nodes[vk]
+        node.gossip_overlay.publish(cons)
+        node.gossip_overlay.publish(sigs[vk])
+    network.run()
+
+    bcast = (population - 1) * (cons.ByteSize() + sigs[vks[0]].ByteSize() + 2 * _FRAMING)
+    gossip = sum(network.nodes[vk].sent for vk in promoter_vks) / promoters
+    everyone = sum(node.sent for node in network.nodes.itervalues()) / population
+    complete = sum(1 for node in network.nodes.itervalues()
+                   if node.received['Cons'] >= 1 and node.received['SigWithRound'] == promoters)
+    return bcast, gossip, everyone, float(complete) / population
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--populations', type=int, nargs='+', default=[50, 100, 200, 500, 1000])
+    parser.add_argument('--promoters', type=int, default=16)
+    parser.add_argument('--fan-out', type=int, default=10)
+    parser.add_argument('--ttl', type=int, default=6)
+    args = parser.parse_args()
+
+    for population in args.populations:
+        bcast, gossip, everyone, coverage = run_once(population, args.promoters, args.fan_out, args.ttl)
+        print "population = {}: promoter uplink per round bcast {:.1f} KB, gossip {:.1f} KB " \
+              "(all nodes {:.1f} KB), coverage {:.3f}"\
+            .format(population, bcast / 1e3, gossip / 1e3, everyone / 1e3, coverage)
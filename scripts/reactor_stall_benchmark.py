@@ -0,0 +1,160 @@
+#!/usr/bin/env python2
+
+"""
+Reactor stalls caused by the erasure coding of one ACS round, with the coding on the reactor thread versus on a pool.
+
+We play one promoter of a round with n promoters and t = (n - 1) / 3: it encodes its own proposal, and for each of
+the n Bracha instances it receives the echoes of n - t promoters and 2t + 1 readies, which makes it decode that
+proposal. The fragments are made beforehand. The messages arrive one per reactor iteration, like they would from the
+network, while a LoopingCall ticks every millisecond. A stall is the time between two ticks beyond that millisecond,
+we report the longest stall, the number of stalls over 10 ms and the time until the n instances delivered.
+
+Usage: PYTHONPATH=. python2 scripts/reactor_stall_benchmark.py [--ns N [N ...]] [--size BYTES] [--threads T]
+                                                            [--backend B]
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from twisted.internet import reactor, task
+
+import src.messages.messages_pb2 as pb
+from src.consensus import erasure
+from src.consensus.bracha import Bracha
+
+_TICK = 0.001
+_LONG_STALL = 0.01
+
+
+class Config(object):
+    def __init__(self, n, t, backend, threads):
+        self.n = n
+        self.t = t
+        self.from_instruction = True
+        self.failure = None
+        self.ec_backend = backend
+        self.ec_threads = threads
+
+
+class Factory(object):
+    """
+    The parts of MyFactory that Bracha uses, the messages are kept but not sent
+    """
+    def __init__(self, config, promoters):
+        self.config = config
+        self.promoters = promoters
+        self.msgs = []
+
+    def send(self, node, msg):
+        self.msgs.append(msg)
+
+    def promoter_cast(self, msg):
+        pass
+
+
+class Run(object):
+    def __init__(self, n):
+        self.n = n
+        self.delivered = 0
+        self.last_tick = None
+        self.max_stall = 0.0
+        self.long_stalls = 0
+        self.start = None
+        self.elapsed = None
+
+    def tick(self):
+        now = time.time()
+        if self.last_tick is not None:
+            stall = max(0.0, now - self.last_tick - _TICK)
+            self.max_stall = max(self.max_stall, stall)
+            self.long_stalls += stall > _LONG_STALL
+        self.last_tick = now
+
+    def deliver(self, _m):
+        self.delivered += 1
+        if self.delivered == self.n:
+            self.elapsed = time.time() - self.start
+            reactor.stop()
+
+
+def make_inits(n, t, backend, size):
+    promoters = [os.urandom(32) for _ in range(n)]
+    inits = []
+    for _ in range(n):
+        factory = Factory(Config(n, t, backend, 0), promoters)
+        Bracha(factory).bcast_init(os.urandom(size))
+        inits.append(factory.msgs)
+    return promoters, inits
+
+
+def run_once(n, backend, size, threads):
+    t = (n - 1) / 3
+    promoters, inits = make_inits(n, t, backend, size)
+    run = Run(n)
+    factory = Factory(Config(n, t, backend, threads), promoters)
+    brachas = [Bracha(factory, deliver_f=run.deliver) for _ in range(n)]
+
+    msgs = []
+    for bracha, init in zip(brachas, inits):
+        for i in range(n - t):
+            echo = pb.Bracha()
+            echo.CopyFrom(init[i])
+            echo.ty = pb.Bracha.ECHO
+            msgs.append((bracha, echo, promoters[i]))
+        for i in range(2 * t + 1):
+            msgs.append((bracha, pb.Bracha(ty=pb.Bracha.READY, digest=init[0].digest), promoters[i]))
+    msgs = iter(msgs)
+
+    def next_msg():
+        try:
+            bracha, msg, vk = next(msgs)
+        except StopIteration:
+            return
+        res = bracha.handle(msg, vk)
+        if res.m is not None:
+            run.deliver(res.m)
+        reactor.callLater(0, next_msg)
+
+    def start():
+        run.start = time.time()
+        Bracha(factory).bcast_init(os.urandom(size))
+        reactor.callLater(0, next_msg)
+
+    if threads > 0:
+        reactor.suggestThreadPoolSize(threads)
+    task.LoopingCall(run.tick).start(_TICK)
+    reactor.callLater(0.1, start)
+    reactor.run()
+    print run.max_stall, run.long_stalls, run.elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ns', type=int, nargs='+', default=[4, 10, 19, 31])
+    parser.add_argument('--size', type=int, default=1000000, help='bytes in every proposal')
+    parser.add_argument('--threads', type=int, default=4, help='size of the thread pool')
+    parser.add_argument('--backend', choices=erasure.EC_BACKENDS, default='numpy')
+    parser.add_argument('--run', nargs=2, type=int, metavar=('N', 'THREADS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.run:
+        run_once(args.run[0], args.backend, args.size, args.run[1])
+        sys.exit(0)
+
+    # every run uses a fresh reactor in a subprocess
+    for n in args.ns:
+        res = {}
+        for threads in [0, args.threads]:
+            out = subprocess.check_output([sys.executable, __file__, '--size', str(args.size),
+                                           '--backend', args.backend, '--run', str(n), str(threads)])
+            res[threads] = map(float, out.split())
+        print "n = {}: reactor thread: max stall {:.1f} ms, {:.0f} stalls > 10 ms, round {:.1f} ms; " \
+              "{} threads: max stall {:.1f} ms, {:.0f} stalls > 10 ms, round {:.1f} ms"\
+            .format(n, res[0][0] * 1e3, res[0][1], res[0][2] * 1e3,
+                    args.threads, res[args.threads][0] * 1e3, res[args.threads][1], res[args.threads][2] * 1e3)
@@ -514,12 +514,15 @@ class MessageSizeReader(object):
     @staticmethod
     def _get_consensus_size(sent_res, recv_res):
         return value_or_zero(sent_res, 'ACS') + value_or_zero(recv_res, 'ACS') + \
-               value_or_zero(sent_res, 'AskCons') + value_or_zero(recv_res, 'AskCons')
+               value_or_zero(sent_res, 'AskCons') + value_or_zero(recv_res, 'AskCons') + \
+               value_or_zero(sent_res, 'AskConsRange') + value_or_zero(recv_res, 'AskConsRange') + \
+               value_or_zero(sent_res, 'ACSBatch') + value_or_zero(recv_res, 'ACSBatch')
 
     @staticmethod
     def _get_round_size(sent_res, recv_res):
         return MessageSizeReader._get_consensus_size(sent_res, recv_res) + \
-               value_or_zero(sent_res, 'Cons') + value_or_zero(sent_res, 'Cons')
+               value_or_zero(sent_res, 'Cons') + value_or_zero(recv_res, 'Cons') + \
+               value_or_zero(sent_res, 'Gossip') + value_or_zero(recv_res, 'Gossip')
 
     @staticmethod
     def _get_validation_size(sent_res, recv_res):
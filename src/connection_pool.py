@@ -0,0 +1,126 @@
+import logging
+import time
+from base64 import b64encode
+
+from typing import Dict, List, Tuple
+
+from src.protobufreceiver import Frame
+
+# seconds without traffic after which a connection may be closed,
+# closing busy connections loses the messages that are in flight in the other direction
+_MIN_IDLE = 5.0
+
+
+class ConnectionPool(object):
+    """
+    Connections to the peers are opened when we first send to them, the messages are queued while connecting.
+    The address book has every known node including ourselves and it is the membership,
+    the connected peers are kept in factory.peers as before.
+    When there are more than `max_connections` connections, the ones that have been idle for the longest are closed,
+    except for the connections to ourselves and to the promoters, which are pinned, and the ones that are not idle.
+    """
+    def __init__(self, factory, max_connections):
+        """
+        :param factory: MyFactory
+        :param max_connections: 0 means no limit
+        """
+        assert max_connections >= 0
+        self._factory = factory
+        self._max_connections = max_connections
+        self.address_book = {}  # type: Dict[str, Tuple[str, int]]
+        self._members = None  # type: List[str]
+        self._pending = {}  # type: Dict[str, List[Frame]]
+        self.dialed = 0
+        self.evicted = 0
+
+    @property
+    def members(self):
+        # type: () -> List[str]
+        """
+        The verification keys of all the known nodes, including ourselves, do not modify the list
+        :return:
+        """
+        if self._members is None:
+            self._members = self.address_book.keys()
+        return self._members
+
+    def add(self, vk, host, port):
+        if vk not in self.address_book:
+            self._members = None
+        self.address_book[vk] = (host, port)
+
+    def send(self, vk, frame):
+        # type: (str, Frame) -> None
+        """
+        Send to a node that we are not connected to, connect to it first
+        :param vk:
+        :param frame:
+        :return:
+        """
+        self.connect(vk)
+        self._pending[vk].append(frame)
+
+    def connect(self, vk):
+        """
+        Connect to a node unless we're connected or connecting already
+        :param vk:
+        :return:
+        """
+        if vk in self._pending or vk in self._factory.peers:
+            return
+        host, port = self.address_book[vk]
+        self._pending[vk] = []
+        self.dialed += 1
+        self._factory.make_new_connection(host, port, vk).addErrback(self._dial_failed, vk)
+
+    def _dial_failed(self, failure, vk):
+        self.lost(vk, failure.getErrorMessage())
+
+    def lost(self, vk, reason):
+        """
+        Call this when a connection that we dialed fails before it is identified
+        :param vk: the node that we dialed
+        :param reason:
+        :return:
+        """
+        frames = self._pending.pop(vk, [])
+        logging.warning("NODE: failed to connect to {}, dropped {} messages, {}"
+                        .format(b64encode(vk), len(frames), reason))
+
+    def connected(self, vk, proto):
+        """
+        Call this when the connection is identified, i.e. after Ping or Pong,
+        it flushes the queued messages and keeps the number of connections under the limit
+        :param vk:
+        :param proto: MyProto
+        :return:
+        """
+        for frame in self._pending.pop(vk, []):
+            proto.send_frame(frame)
+        self.evict(vk)
+
+    def evict(self, keep=None):
+        """
+        Close the least recently active connections that are not pinned until we're under the limit
+        :param keep: another connection to keep, e.g. the one that we just opened
+        :return:
+        """
+        excess = len(self._factory.peers) - self._max_connections
+        if self._max_connections == 0 or excess <= 0:
+            return
+        pinned = set(self._factory.promoters)
+        pinned.add(self._factory.vk)
+        pinned.add(keep)
+        idle_since = time.time() - _MIN_IDLE
+        candidates = sorted((v[2].last_active, k) for k, v in self._factory.peers.iteritems()
+                            if k not in pinned and k not in self._pending and v[2].last_active < idle_since)
+        for _, vk in candidates[:excess]:
+            logging.debug("NODE: evicting idle connection {}".format(b64encode(vk)))
+            proto = self._factory.peers.pop(vk)[2]
+            proto.transport.loseConnection()
+            self.evicted += 1
+
+    @property
+    def stats(self):
+        return {"connections": len(self._factory.peers), "members": len(self.address_book),
+                "dialed": self.dialed, "evicted": self.evicted}
@@ -1,11 +1,12 @@
 import logging
 import random
 from base64 import b64encode
+from collections import OrderedDict
 
-from typing import Dict, Union
+from typing import Dict, List, Set, Union
 
 import src.messages.messages_pb2 as pb
-from src.utils import Replay, Handled, dictionary_hash
+from src.utils import Replay, Handled, PromoterIndex, dictionary_hash, call_later
 from .bracha import Bracha
 from .mo14 import Mo14
 
@@ -21,6 +22,19 @@ class ACS(object):
         self._bracha_results = {}  # type: Dict[str, str]
         self._mo14_results = {}  # type: Dict[str, int]
         self._mo14_provided = {}  # type: Dict[str, int]
+        # updated as the instances deliver and decide, so that handling a message does not scan all the instances
+        self._ones = 0  # number of BA instances that decided 1
+        self._not_provided = set()  # type: Set[str], BA instances that have no input yet
+        self._undelivered_ones = set()  # type: Set[str], BA instances that decided 1 but whose RBC has not delivered
+        # the instances of the previous rounds, they are reset and reused by start
+        self._free_brachas = []  # type: List[Bracha]
+        self._free_mo14s = []  # type: List[Mo14]
+        # on the wire the instances of a round are the positions of their promoters, set at start
+        self._index = PromoterIndex([])
+        # votes of our BA instances that are sent together at the end of the reactor iteration, see _bcast_vote,
+        # they are kept across resets since the other promoters may still need the votes of a round that we completed
+        self._votes = OrderedDict()  # key: (round, ty, r, v), val: bytearray of the instances
+        self._flush_scheduled = False
 
     def reset(self):
         """
@@ -28,11 +42,16 @@ class ACS(object):
         """
         logging.debug("ACS: resetting...")
         self._done = False
+        self._free_brachas.extend(self._brachas.itervalues())
+        self._free_mo14s.extend(self._mo14s.itervalues())
         self._brachas = {}  # type: Dict[str, Bracha]
         self._mo14s = {}  # type: Dict[str, Mo14]
         self._bracha_results = {}  # type: Dict[str, str]
         self._mo14_results = {}  # type: Dict[str, int]
         self._mo14_provided = {}  # type: Dict[str, int]
+        self._ones = 0
+        self._not_provided = set()  # type: Set[str]
+        self._undelivered_ones = set()  # type: Set[str]
 
     def stop(self, r):
         """
@@ -44,6 +63,7 @@ class ACS(object):
         self.reset()
         self._round = r
         self._done = True
+        self._factory.discard_acs(r)
 
     def start(self, msg, r):
         """
@@ -56,6 +76,7 @@ class ACS(object):
         assert len(self._factory.promoters) == self._factory.config.n
 
         self._round = r
+        self._index = PromoterIndex(self._factory.promoters)
 
         for promoter in self._factory.promoters:
             logging.debug("ACS: adding promoter {}".format(b64encode(promoter)))
@@ -70,8 +91,26 @@ class ACS(object):
                         raise AssertionError("Invalid wrapper input")
                 return f
 
-            self._brachas[promoter] = Bracha(self._factory, msg_wrapper_f_factory(promoter, self._round))
-            self._mo14s[promoter] = Mo14(self._factory, msg_wrapper_f_factory(promoter, self._round))
+            def deliver_f_factory(_instance, _round):
+                return lambda _m: self._bracha_delivered_later(_instance, _round, _m)
+
+            def bcast_f_factory(_instance, _round):
+                return lambda _msg: self._bcast_vote(_instance, _round, _msg)
+
+            msg_wrapper_f = msg_wrapper_f_factory(self._index.index(promoter), self._round)
+            deliver_f = deliver_f_factory(promoter, self._round)
+            bcast_f = bcast_f_factory(promoter, self._round)
+            if self._free_brachas:
+                self._brachas[promoter] = self._free_brachas.pop()
+                self._brachas[promoter].reset(msg_wrapper_f, deliver_f)
+            else:
+                self._brachas[promoter] = Bracha(self._factory, msg_wrapper_f, deliver_f)
+            if self._free_mo14s:
+                self._mo14s[promoter] = self._free_mo14s.pop()
+                self._mo14s[promoter].reset(msg_wrapper_f, bcast_f)
+            else:
+                self._mo14s[promoter] = Mo14(self._factory, msg_wrapper_f, bcast_f)
+            self._not_provided.add(promoter)
 
         my_vk = self._factory.vk
         assert my_vk in self._brachas
@@ -82,25 +121,82 @@ class ACS(object):
                      .format(b64encode(my_vk), random.random() if self._factory.config.from_instruction else b64encode(msg)))
         self._brachas[my_vk].bcast_init(msg)
 
+        # messages of this round that arrived before we started can be handled now
+        self._factory.discard_acs(r - 1)
+        self._factory.release_acs(r)
+
     def reset_then_start(self, msg, r):
         self.reset()
         self.start(msg, r)
 
+    def _bcast_vote(self, instance, round, msg):
+        """
+        Broadcast a vote of one of our BA instances, when batching the votes of all the instances of a round that are
+        cast in one reactor iteration go out in one ACSBatch, the instances with the same vote share a bitmap
+        :param instance:
+        :param round:
+        :param msg: the Mo14 message
+        :return:
+        """
+        if not self._factory.config.batch_votes:
+            self._factory.promoter_cast(pb.ACS(instance=self._index.index(instance), round=round, mo14=msg))
+            return
+
+        key = (round, msg.ty, msg.r, msg.v)
+        if key not in self._votes:
+            self._votes[key] = bytearray((len(self._index) + 7) / 8)
+        i = self._index.index(instance)
+        self._votes[key][i >> 3] |= 1 << (i & 7)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            call_later(0, self._flush_votes)
+
+    def _flush_votes(self):
+        self._flush_scheduled = False
+        batches = OrderedDict()  # key: round, val: ACSBatch
+        for (round, ty, r, v), instances in self._votes.iteritems():
+            if round not in batches:
+                batches[round] = pb.ACSBatch(round=round)
+            batches[round].votes.add(ty=ty, r=r, v=v, instances=str(instances))
+        self._votes.clear()
+        for batch in batches.itervalues():
+            self._factory.promoter_cast(batch)
+
+    def unbatch(self, msg):
+        # type: (pb.ACSBatch) -> Union[List[pb.ACS], Replay]
+        """
+        Split a batch of votes into one ACS message per vote, which are then handled as usual
+        :param msg:
+        :return: the messages, or Replay if the round has not started, since the instances are the promoters of the round
+        """
+        if msg.round > self._round:
+            return Replay()
+        if msg.round < self._round:
+            return []
+
+        res = []
+        for votes in msg.votes:
+            mo14 = pb.Mo14(ty=votes.ty, r=votes.r, v=votes.v)
+            for i in self._index.positions(votes.instances):
+                res.append(pb.ACS(instance=i, round=msg.round, mo14=mo14))
+        return res
+
     def handle(self, msg, sender_vk):
         # type: (pb.ACS, str) -> Union[Handled, Replay]
         """
         Msg {
-            instance: String // vk
+            instance: u32 // position of the promoter, see PromoterIndex
             ty: u32
             round: u32 // this is not the same as the Mo14 'r'
             body: Bracha | Mo14 // defined by ty
         }
-        :param msg: acs header with vk followed by either a 'bracha' message or a 'mo14' message
+        :param msg: acs header with the instance followed by either a 'bracha' message or a 'mo14' message
         :param sender_vk: the vk of the sender
         :return: the agreed subset on completion otherwise None
         """
-        logging.debug("ACS: got msg (instance: {}, round: {}) from {}".format(b64encode(msg.instance),
-                                                                              msg.round, b64encode(sender_vk)))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("ACS: got msg (instance: {}, round: {}) from {}".format(msg.instance,
+                                                                                  msg.round, b64encode(sender_vk)))
 
         if msg.round < self._round:
             logging.debug("ACS: round already over, curr: {}, required: {}".format(self._round, msg.round))
@@ -114,7 +210,11 @@ class ACS(object):
             logging.debug("ACS: we're done, doing nothing")
             return Handled()
 
-        instance = msg.instance
+        try:
+            instance = self._index.vk(msg.instance)
+        except IndexError:
+            logging.debug("ACS: invalid instance {}".format(msg.instance))
+            return Handled()
         round = msg.round
         assert round == self._round
 
@@ -129,33 +229,36 @@ class ACS(object):
                 return Replay()
             res = self._brachas[instance].handle(msg.bracha, sender_vk)
             if isinstance(res, Handled) and res.m is not None:
-                logging.debug("ACS: Bracha delivered for {}, {}".format(b64encode(instance), res.m))
-                self._bracha_results[instance] = res.m
-                if instance not in self._mo14_provided:
-                    logging.debug("ACS: initiating BA for {}, {}".format(b64encode(instance), 1))
-                    self._mo14_provided[instance] = 1
-                    self._mo14s[instance].start(1)
+                self._bracha_delivered(instance, res.m)
 
         elif body_type == 'mo14':
             if instance in self._mo14_provided:
                 logging.debug("ACS: forwarding Mo14")
+                mo14_round = self._mo14s[instance].round
                 res = self._mo14s[instance].handle(msg.mo14, sender_vk)
-                if isinstance(res, Handled) and res.m is not None:
+                if self._mo14s[instance].round != mo14_round:
+                    # the BA moved to the next round, which may make replayed messages processable
+                    self._factory.release_acs(round, msg.instance)
+                if isinstance(res, Handled) and res.m is not None and instance not in self._mo14_results:
                     logging.debug("ACS: delivered Mo14 for {}, {}".format(b64encode(instance), res.m))
                     self._mo14_results[instance] = res.m
+                    if res.m == 1:
+                        self._ones += 1
+                        if instance not in self._bracha_results:
+                            self._undelivered_ones.add(instance)
                 elif isinstance(res, Replay):
                     # raise AssertionError("Impossible, our Mo14 instance already instantiated")
                     return Replay()
 
-            ones = [v for k, v in self._mo14_results.iteritems() if v == 1]
-            if len(ones) >= n - t:
-                difference = set(self._mo14s.keys()) - set(self._mo14_provided.keys())
+            if self._ones >= n - t and self._not_provided:
                 logging.debug("ACS: got n - t 1s")
-                logging.debug("difference = {}".format(difference))
-                for d in list(difference):
+                logging.debug("difference = {}".format(self._not_provided))
+                for d in list(self._not_provided):
                     logging.debug("ACS: initiating BA for {}, v {}".format(b64encode(d), 0))
                     self._mo14_provided[d] = 0
+                    self._not_provided.discard(d)
                     self._mo14s[d].start(0)
+                    self._factory.release_acs(round, self._index.index(d))
 
             if instance not in self._mo14_provided:
                 logging.debug("ACS: got BA before RBC...")
@@ -166,6 +269,36 @@ class ACS(object):
         else:
             raise AssertionError("ACS: invalid payload type")
 
+        return self._try_finish()
+
+    def _bracha_delivered(self, instance, m):
+        logging.debug("ACS: Bracha delivered for {}, {}".format(b64encode(instance), m))
+        self._bracha_results[instance] = m
+        self._undelivered_ones.discard(instance)
+        if instance not in self._mo14_provided:
+            logging.debug("ACS: initiating BA for {}, {}".format(b64encode(instance), 1))
+            self._mo14_provided[instance] = 1
+            self._not_provided.discard(instance)
+            self._mo14s[instance].start(1)
+            self._factory.release_acs(self._round, self._index.index(instance))
+
+    def _bracha_delivered_later(self, instance, round, m):
+        """
+        Called when a Bracha instance delivers after decoding on the thread pool rather than while handling a message,
+        so the result goes to the factory directly
+        :param instance:
+        :param round:
+        :param m: the delivered message
+        :return:
+        """
+        if round != self._round or self._done:
+            logging.debug("ACS: round {} is over, ignoring the late Bracha result".format(round))
+            return
+        self._bracha_delivered(instance, m)
+        self._factory.process_acs_res(self._try_finish(), None, None)
+
+    def _try_finish(self):
+        n = self._factory.config.n
         if len(self._mo14_results) >= n:
             # return the result if we're done, otherwise return None
             assert n == len(self._mo14_results)
@@ -183,11 +316,8 @@ class ACS(object):
         return Handled()
 
     def _collate_results(self):
-        key_of_ones = [k for k, v in self._mo14_results.iteritems() if v == 1]
-
-        if all(map(lambda _k: _k in self._bracha_results, key_of_ones)):
-            res = {k: self._bracha_results[k] for k in key_of_ones}
-            return res, self._round
-        else:
+        if self._undelivered_ones:
             return None, self._round
+        res = {k: self._bracha_results[k] for k, v in self._mo14_results.iteritems() if v == 1}
+        return res, self._round
 
@@ -2,12 +2,13 @@ import logging
 import random
 from base64 import b64encode
 
-import libnacl
 from enum import Enum
-from pyeclib.ec_iface import ECDriver
+from twisted.internet import threads
 
 import src.messages.messages_pb2 as pb
-from src.utils import Handled
+from src.utils import Handled, my_err_back
+from .erasure import ec_driver
+from .merkle import merkle_tree, merkle_root, merkle_branch, merkle_verify
 
 _BRACHA_STEP = Enum('_BRACHA_STEP', 'one two three')
 _INIT = pb.Bracha.Type.Value('INIT')
@@ -15,34 +16,82 @@ _ECHO = pb.Bracha.Type.Value('ECHO')
 _READY = pb.Bracha.Type.Value('READY')
 
 
+def _encode(driver, msg):
+    """
+    Runs on the thread pool when it is enabled
+    :param driver:
+    :param msg:
+    :return: the fragments and their Merkle tree
+    """
+    fragments = driver.encode(msg)
+    return fragments, merkle_tree(fragments)
+
+
+def _decode(driver, root, fragments):
+    """
+    Runs on the thread pool when it is enabled,
+    the fragments match the root but a Byzantine initiator may not have made them from one message,
+    or from any message at all, so we encode the result again,
+    all the correct nodes then deliver the same message or the empty string
+    :param driver:
+    :param root:
+    :param fragments: n - 2t verified fragments
+    :return: the message
+    """
+    try:
+        v = driver.decode(fragments)
+    except Exception as e:
+        logging.warning("Bracha: fragments of root {} cannot be decoded, {}".format(b64encode(root), e))
+        return ''
+    if merkle_root(merkle_tree(driver.encode(v))) != root:
+        logging.warning("Bracha: fragments of root {} are inconsistent".format(b64encode(root)))
+        return ''
+    return v
+
+
 class Bracha(object):
     """
     Bracha broadcast '87
     Implemented using state machine (BrachaStep)
+    The message is erasure coded, the digest is the Merkle root of the fragments and every fragment carries its
+    Merkle branch, so fragments that do not belong to the root are rejected when they arrive,
+    the message is decoded once from the first n - 2t verified fragments.
+    When config.ec_threads > 0 the encoding and decoding run on the reactor's thread pool, the state machine continues
+    when the result arrives, and a delivery that happens then is passed to deliver_f instead of being returned by handle.
     """
-    def __init__(self, factory, msg_wrapper_f=lambda _x: _x):
+    def __init__(self, factory, msg_wrapper_f=lambda _x: _x, deliver_f=lambda _m: None):
         self._factory = factory
+        self._n = self._factory.config.n
+        self._t = self._factory.config.t
+        self._fragments = {}  # key: index, val: verified fragment
+        self._echo_senders = set()
+        self._ec_driver = ec_driver(self._n - 2 * self._t, 2 * self._t, self._factory.config.ec_backend)
+        self._epoch = 0  # results of the thread pool from before the last reset are dropped
+        self.reset(msg_wrapper_f, deliver_f)
+        random.seed()
+
+    def reset(self, msg_wrapper_f=lambda _x: _x, deliver_f=lambda _m: None):
+        """
+        Clear the state so that the instance can be reused for another broadcast
+        :param msg_wrapper_f:
+        :param deliver_f: called with the message if it is delivered after decoding on the thread pool
+        :return:
+        """
+        self._epoch += 1
         self._step = _BRACHA_STEP.one
         self._init_count = 0
         self._echo_count = 0
         self._ready_count = 0
         self._root = None
-        self._fragments = {}
+        self._fragments.clear()
+        self._echo_senders.clear()
         self._v = None
+        self._decoding = False
         self._done = False
         self._msg_wrapper_f = msg_wrapper_f
-        self._n = self._factory.config.n
-        self._t = self._factory.config.t
+        self._deliver_f = deliver_f
         self._sent_ready = False
 
-        # NOTE: #define EC_MAX_FRAGMENTS 32
-        # https://github.com/openstack/liberasurecode/blob/master/include/erasurecode/erasurecode.h
-        k = self._n - 2 * self._t
-        m = 2 * self._t
-        logging.debug("Bracha: erasure code params k={}, m={}".format(k, m))
-        self._ec_driver = ECDriver(k=k, m=m, ec_type='liberasurecode_rs_vand')
-        random.seed()
-
     def handle(self, msg, sender_vk):
         # type: (pb.Bracha) -> Handled
         """
@@ -53,7 +102,7 @@ class Bracha(object):
             body: String,
         }
         :param msg: the input message to send
-        :return: the delivered message when completed, otherwise None
+        :return: the delivered message when completed, otherwise None, also None while the message is being decoded
         """
         if self._done:
             logging.debug("Bracha: done, doing nothing")
@@ -76,15 +125,22 @@ class Bracha(object):
                           .format(b64encode(self._root), b64encode(msg.digest)))
             return Handled()
 
+        if ty in (_INIT, _ECHO) and not merkle_verify(self._root, self._n, msg.index, msg.fragment, msg.branch):
+            logging.warning("Bracha: fragment {} from {} does not match root {}, discarding"
+                            .format(msg.index, b64encode(sender_vk), b64encode(self._root)))
+            return Handled()
+
         # here we update the state
         if ty == _INIT:
             self._init_count += 1
 
         elif ty == _ECHO:
-            self._fragments[sender_vk] = msg.fragment
+            if sender_vk in self._echo_senders:
+                logging.debug("Bracha: duplicate echo from {}, discarding".format(b64encode(sender_vk)))
+                return Handled()
+            self._echo_senders.add(sender_vk)
+            self._fragments[msg.index] = msg.fragment
             self._echo_count += 1
-            assert self._echo_count == len(self._fragments), \
-                "echo_count {} != fragment count {}".format(self._echo_count, len(self._fragments))
 
         elif ty == _READY:
             self._ready_count += 1
@@ -104,43 +160,79 @@ class Bracha(object):
 
         if ty == _ECHO:
             logging.debug("Bracha: got echo value, root = {}".format(b64encode(msg.digest)))
-            # TODO check Merkle branch
-            pass
 
-        if ty == _ECHO and self._echo_count >= self._n - self._t:
+        if ty == _ECHO and self._echo_count >= self._n - self._t and len(self._fragments) >= self._n - 2 * self._t:
             logging.debug("Bracha: got n - t echo values, root = {}".format(b64encode(msg.digest)))
             self._upon_n_minus_t_echo()
 
         if ty == _READY and self._ready_count >= self._t + 1:
             self._upon_t_plus_1_ready()
 
-        if self._ready_count >= 2 * self._t + 1 and self._echo_count >= self._n - 2*self._t:
-            res = self._upon_2t_plus_1_ready()
+        if self._ready_count >= 2 * self._t + 1 and len(self._fragments) >= self._n - 2 * self._t:
+            self._upon_2t_plus_1_ready()
+
+        return self._try_deliver()
 
-            # NOTE: we use a random value to trip up tests, since it shouldn't be viewed by tests
-            logging.info("Bracha: DELIVER {}"
-                         .format(random.random() if self._factory.config.from_instruction else b64encode(res)))
+    def _try_deliver(self):
+        if self._done or self._v is None or self._ready_count < 2 * self._t + 1:
+            return Handled()
 
-            self._done = True
-            return Handled(res)
+        # NOTE: we use a random value to trip up tests, since it shouldn't be viewed by tests
+        logging.info("Bracha: DELIVER {}"
+                     .format(random.random() if self._factory.config.from_instruction else b64encode(self._v)))
 
-        return Handled()
+        self._done = True
+        return Handled(self._v)
 
     def _upon_init(self, msg):
         assert isinstance(msg, pb.Bracha)
         msg.ty = _ECHO
+        if self._factory.config.failure == 'byzantine':
+            msg.fragment = random.choice([msg.fragment[::-1], 'not a fragment'])
         self.bcast(msg)
 
     def _decode_fragments(self):
-        fragments = random.sample(self._fragments.values(), self._n - 2 * self._t)
-        v = self._ec_driver.decode(fragments)
-        return v
+        """
+        Decode from the verified fragments with the lowest indices, which are the cheapest to decode,
+        on the thread pool if it is enabled, otherwise self._v is set when this returns.
+        If decoding on the thread pool fails, the next message that we handle tries again.
+        :return:
+        """
+        if self._v is not None or self._decoding:
+            return
+        indices = sorted(self._fragments.keys())[:self._n - 2 * self._t]
+        fragments = [self._fragments[i] for i in indices]
+        if self._factory.config.ec_threads > 0:
+            self._decoding = True
+            threads.deferToThread(_decode, self._ec_driver, self._root, fragments)\
+                .addCallbacks(self._decoded, self._decode_failed, callbackArgs=(self._epoch,),
+                              errbackArgs=(self._epoch,))\
+                .addErrback(my_err_back)
+        else:
+            self._set_v(_decode(self._ec_driver, self._root, fragments))
+
+    def _decoded(self, v, epoch):
+        if epoch != self._epoch:
+            logging.debug("Bracha: instance was reset, dropping the decoded msg")
+            return
+        self._decoding = False
+        self._set_v(v)
+        res = self._try_deliver()
+        if res.m is not None:
+            self._deliver_f(res.m)
+
+    def _decode_failed(self, failure, epoch):
+        logging.error("Bracha: decoding failed, {}".format(failure.getErrorMessage()))
+        if epoch == self._epoch:
+            self._decoding = False
+
+    def _set_v(self, v):
+        self._v = v
+        logging.debug("Bracha: erasure decoded msg v {}".format(b64encode(self._v)))
 
     def _upon_n_minus_t_echo(self):
-        v = self._decode_fragments()
-        assert libnacl.crypto_hash_sha256(v) == self._root
-        self._v = v
-        logging.debug("Bracha: erasure decoded msg v {}".format(b64encode(v)))
+        # the ready only depends on the root, so it does not wait for the decoding
+        self._decode_fragments()
 
         if not self._sent_ready:
             logging.debug("Bracha: broadcast ready 1, root = {}".format(b64encode(self._root)))
@@ -154,9 +246,7 @@ class Bracha(object):
             self._sent_ready = True
 
     def _upon_2t_plus_1_ready(self):
-        if self._v is None:
-            self._v = self._decode_fragments()
-        return self._v
+        self._decode_fragments()
 
     def bcast_init(self, msg="some test msg!!"):
         assert isinstance(msg, str)
@@ -164,19 +254,29 @@ class Bracha(object):
 
     def _bcast_init_fragments(self, msg):
         """
-        
+        Encode on the thread pool if it is enabled, the INIT messages are sent when the fragments are ready
         :param msg: some bytes
         :return: 
         """
-        fragments = self._ec_driver.encode(msg)
-        digest = libnacl.crypto_hash_sha256(msg)
+        if self._factory.config.ec_threads > 0:
+            threads.deferToThread(_encode, self._ec_driver, msg)\
+                .addCallback(self._encoded, self._epoch).addErrback(my_err_back)
+        else:
+            self._encoded(_encode(self._ec_driver, msg), self._epoch)
+
+    def _encoded(self, res, epoch):
+        if epoch != self._epoch:
+            logging.debug("Bracha: instance was reset, dropping the fragments")
+            return
+        fragments, tree = res
+        digest = merkle_root(tree)
 
         logging.info("Bracha: initiate erasure code with {} fragments, digest {}"
                      .format(len(fragments), b64encode(digest)))
 
         assert len(fragments) == len(self._factory.promoters)
-        for fragment, promoter in zip(fragments, self._factory.promoters):
-            m = pb.Bracha(ty=_INIT, digest=digest, fragment=fragment)
+        for i, (fragment, promoter) in enumerate(zip(fragments, self._factory.promoters)):
+            m = pb.Bracha(ty=_INIT, digest=digest, fragment=fragment, index=i, branch=merkle_branch(tree, i))
             self._factory.send(promoter, self._msg_wrapper_f(m))
 
     def bcast(self, msg):
@@ -0,0 +1,169 @@
+import logging
+from struct import Struct
+
+import numpy as np
+
+# every fragment starts with its index and the length of the encoded data
+_FRAGMENT = Struct("!BI")
+
+# GF(2^8) with the primitive polynomial x^8 + x^4 + x^3 + x^2 + 1
+_PRIMITIVE = 0x11d
+
+EC_BACKENDS = ('pyeclib', 'numpy')
+_ec_drivers = {}  # key: (k, m, backend), val: the driver
+
+
+def ec_driver(k, m, backend='pyeclib'):
+    """
+    The drivers are shared by every Bracha instance in the process, there is one for each set of parameters.
+    A driver has encode(data), which returns k + m fragments, and decode(fragments), which needs any k of them,
+    all the nodes must use the same backend
+    :param k: number of data fragments
+    :param m: number of parity fragments
+    :param backend: 'pyeclib' uses liberasurecode, which supports at most 32 fragments,
+        'numpy' uses ReedSolomon below, which supports up to 256
+    :return: the driver
+    """
+    key = (k, m, backend)
+    if key not in _ec_drivers:
+        logging.debug("EC: erasure code params k={}, m={}, backend {}".format(k, m, backend))
+        if backend == 'pyeclib':
+            # pyeclib is only needed by this backend
+            from pyeclib.ec_iface import ECDriver
+            # NOTE: #define EC_MAX_FRAGMENTS 32
+            # https://github.com/openstack/liberasurecode/blob/master/include/erasurecode/erasurecode.h
+            assert k + m <= 32, "liberasurecode supports at most 32 fragments, use the numpy backend"
+            _ec_drivers[key] = ECDriver(k=k, m=m, ec_type='liberasurecode_rs_vand')
+        elif backend == 'numpy':
+            _ec_drivers[key] = ReedSolomon(k, m)
+        else:
+            raise AssertionError("EC: invalid backend {}".format(backend))
+    return _ec_drivers[key]
+
+
+def _make_tables():
+    exp = np.zeros(512, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= _PRIMITIVE
+    exp[255:510] = exp[:255]
+
+    # mul[a, b] is the product of a and b
+    a = np.arange(256)
+    mul = exp[log[a][:, None] + log[a][None, :]]
+    mul[0, :] = 0
+    mul[:, 0] = 0
+    return exp, log, mul
+
+_EXP, _LOG, _MUL = _make_tables()
+
+
+def _inverse(a):
+    return int(_EXP[255 - _LOG[a]])
+
+
+def _mat_mul(a, b):
+    """
+    Matrix product over GF(2^8), one row of b at a time, the products of the row with the column of a are looked up
+    in the multiplication tables of the column's coefficients, which is much faster than indexing _MUL in 2D
+    :param a: (r, k) uint8
+    :param b: (k, l) uint8
+    :return: (r, l) uint8
+    """
+    res = np.zeros((a.shape[0], b.shape[1]), dtype=np.uint8)
+    for j in range(a.shape[1]):
+        res ^= _MUL[a[:, j]][:, b[j]]
+    return res
+
+
+def _mat_inv(a):
+    """
+    Gauss-Jordan elimination over GF(2^8), each step eliminates one column from all the rows at once
+    :param a: (k, k) uint8, invertible
+    :return: (k, k) uint8
+    """
+    k = a.shape[0]
+    m = np.concatenate([a, np.eye(k, dtype=np.uint8)], axis=1)
+    for col in range(k):
+        pivot = col + int(np.flatnonzero(m[col:, col])[0])
+        if pivot != col:
+            m[[col, pivot]] = m[[pivot, col]]
+        m[col] = _MUL[_inverse(m[col, col]), m[col]]
+        factors = m[:, col].copy()
+        factors[col] = 0
+        m ^= _MUL[factors[:, None], m[col][None, :]]
+    return m[:, k:]
+
+
+class ReedSolomon(object):
+    """
+    Systematic Reed-Solomon code over GF(2^8) in NumPy, it has the same interface as pyeclib's ECDriver.
+    The first k fragments are the data and the m parity fragments come from a Cauchy matrix,
+    so any k of the k + m fragments decode, for any k + m <= 256.
+    The inverse matrices are cached per subset of fragments, which repeat since the same promoters tend to be fast.
+    """
+    def __init__(self, k, m, cache_size=256):
+        assert k > 0 and m >= 0 and k + m <= 256
+        self.k = k
+        self.m = m
+        # rows are parity fragments, columns are data fragments, x_i = k + i and y_j = j are all distinct
+        cauchy = np.array([[_inverse((self.k + i) ^ j) for j in range(k)] for i in range(m)], dtype=np.uint8)
+        self._generator = np.concatenate([np.eye(k, dtype=np.uint8), cauchy.reshape(m, k)])
+        self._cache_size = cache_size
+        self._inverses = {}  # key: tuple of fragment indices, val: inverse of their rows of the generator
+
+    def encode(self, data):
+        # type: (str) -> list
+        """
+        :param data:
+        :return: k + m fragments
+        """
+        size = -(-len(data) // self.k) if data else 1
+        buf = np.zeros(self.k * size, dtype=np.uint8)
+        if data:
+            buf[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        shards = buf.reshape(self.k, size)
+        if self.m > 0:
+            shards = np.concatenate([shards, _mat_mul(self._generator[self.k:], shards)])
+        return [_FRAGMENT.pack(i, len(data)) + shard.tobytes() for i, shard in enumerate(shards)]
+
+    def decode(self, fragments):
+        # type: (list) -> str
+        """
+        :param fragments: at least k distinct fragments
+        :return: the data
+        """
+        by_index = {}
+        for fragment in fragments:
+            i, length = _FRAGMENT.unpack_from(fragment)
+            by_index[i] = fragment
+        if len(by_index) < self.k:
+            raise ValueError("need {} fragments, got {}".format(self.k, len(by_index)))
+
+        indices = tuple(sorted(by_index.keys())[:self.k])
+        shards = np.array([np.frombuffer(by_index[i], dtype=np.uint8, offset=_FRAGMENT.size) for i in indices])
+        if indices != tuple(range(self.k)):
+            # the data fragments that we have are copied, only the missing ones are computed
+            missing = [i for i in range(self.k) if i not in by_index]
+            data = np.empty_like(shards)
+            data[[i for i in indices if i < self.k]] = shards[:self.k - len(missing)]
+            data[missing] = _mat_mul(self._inverse_of(indices)[missing], shards)
+            shards = data
+        return shards.tobytes()[:length]
+
+    def _inverse_of(self, indices):
+        # this runs on the thread pool, another thread may clear the cache at any point,
+        # so we only look it up once and return our own reference, at worst two threads invert the same rows
+        inverse = self._inverses.get(indices)
+        if inverse is None:
+            if len(self._inverses) >= self._cache_size:
+                self._inverses.clear()
+            logging.debug("EC: inverting the generator for fragments {}".format(indices))
+            inverse = _mat_inv(self._generator[list(indices)])
+            self._inverses[indices] = inverse
+        return inverse
@@ -0,0 +1,77 @@
+import libnacl
+
+# leaves and inner nodes are hashed with different prefixes so that one cannot be passed off as the other
+_LEAF = '\x00'
+_NODE = '\x01'
+
+
+def _hash_leaf(leaf):
+    return libnacl.crypto_hash_sha256(_LEAF + leaf)
+
+
+def _hash_node(left, right):
+    return libnacl.crypto_hash_sha256(_NODE + left + right)
+
+
+def depth(count):
+    """
+    :param count: number of leaves
+    :return: the length of every branch of a tree with `count` leaves
+    """
+    d = 0
+    while (1 << d) < count:
+        d += 1
+    return d
+
+
+def merkle_tree(leaves):
+    """
+    The number of leaves is padded to a power of two with empty leaves
+    :param leaves: list of str
+    :return: the levels of the tree, from the hashes of the leaves to the root
+    """
+    level = [_hash_leaf(leaf) for leaf in leaves]
+    level += [_hash_leaf('')] * ((1 << depth(len(leaves))) - len(leaves))
+    levels = [level]
+    while len(level) > 1:
+        level = [_hash_node(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        levels.append(level)
+    return levels
+
+
+def merkle_root(levels):
+    return levels[-1][0]
+
+
+def merkle_branch(levels, index):
+    """
+    :param levels: from merkle_tree
+    :param index: of the leaf
+    :return: the siblings on the path from the leaf to the root
+    """
+    branch = []
+    for level in levels[:-1]:
+        branch.append(level[index ^ 1])
+        index >>= 1
+    return branch
+
+
+def merkle_verify(root, count, index, leaf, branch):
+    """
+    :param root:
+    :param count: number of leaves of the tree
+    :param index: of the leaf
+    :param leaf:
+    :param branch: from merkle_branch
+    :return: whether the leaf is at the index of the tree with the root
+    """
+    if not 0 <= index < count or len(branch) != depth(count):
+        return False
+    h = _hash_leaf(leaf)
+    for sibling in branch:
+        if index & 1:
+            h = _hash_node(sibling, h)
+        else:
+            h = _hash_node(h, sibling)
+        index >>= 1
+    return h == root
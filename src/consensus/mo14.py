@@ -37,16 +37,35 @@ class Mo14(object):
     Mostefaoui et el. '14
     Implemented using a state machine
     """
-    def __init__(self, factory, msg_wrapper_f=lambda _x: _x):
+    def __init__(self, factory, msg_wrapper_f=lambda _x: _x, bcast_f=None):
         self._factory = factory
-        self._r = 0
-        self._est = -1
-        self._state = _MO14_STATE.start
         self._est_values = {}  # key: r, val: [set(), set()], sets are vk
         self._aux_values = {}  # key: r, val: [set(), set()], sets are vk
         self._broadcasted = defaultdict(bool)  # key: r, val: boolean
         self._bin_values = defaultdict(set)  # key: r, val: binary set()
+        self.reset(msg_wrapper_f, bcast_f)
+
+    def reset(self, msg_wrapper_f=lambda _x: _x, bcast_f=None):
+        """
+        Clear the state so that the instance can be reused for another agreement
+        :param msg_wrapper_f:
+        :param bcast_f: sends our votes instead of promoter_cast, msg_wrapper_f is not applied then
+        :return:
+        """
+        self._r = 0
+        self._est = -1
+        self._state = _MO14_STATE.start
+        self._est_values.clear()
+        self._aux_values.clear()
+        self._broadcasted.clear()
+        self._bin_values.clear()
         self._msg_wrapper_f = msg_wrapper_f
+        self._bcast_f = bcast_f
+
+    @property
+    def round(self):
+        # type: () -> int
+        return self._r
 
     def start(self, v):
         assert v in (0, 1)
@@ -98,7 +117,10 @@ class Mo14(object):
         t = self._factory.config.t
         n = self._factory.config.n
 
-        logging.debug("Mo14: stored msg (ty: {}, v: {}, r: {}), from {}".format(ty, v, r, b64encode(sender_vk)))
+        # the arguments are only formatted when debugging, the sets of vks are as large as the population
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug:
+            logging.debug("Mo14: stored msg (ty: {}, v: {}, r: {}), from {}".format(ty, v, r, b64encode(sender_vk)))
         self._store_msg(msg, sender_vk)
 
         if r < self._r:
@@ -143,7 +165,8 @@ class Mo14(object):
         if self._state == _MO14_STATE.aux:
             logging.debug("Mo14: reached aux state")
             if self._r not in self._aux_values:
-                logging.debug("Mo14: self.r {} not in self.aux_values {}".format(self._r, self._aux_values))
+                if debug:
+                    logging.debug("Mo14: self.r {} not in self.aux_values {}".format(self._r, self._aux_values))
                 return Handled()
 
             def get_aux_vals(aux_value):
@@ -209,5 +232,8 @@ class Mo14(object):
         :param msg:
         :return:
         """
-        self._factory.promoter_cast(self._msg_wrapper_f(msg))
+        if self._bcast_f is not None:
+            self._bcast_f(msg)
+        else:
+            self._factory.promoter_cast(self._msg_wrapper_f(msg))
 
@@ -2,16 +2,22 @@ import argparse
 import logging
 import sys
 
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.internet.protocol import Factory
-from typing import Union, Dict
+from typing import Union, Dict, List
 
 import src.messages.messages_pb2 as pb
-from src.protobufreceiver import ProtobufReceiver
-from src.utils import set_logging, my_err_back, call_later
+from src.protobufreceiver import ProtobufReceiver, Frame
+from src.utils import set_logging, call_later
 
 return_code = 0
 
+# maximum number of nodes in one DiscoverReply
+_PAGE_SIZE = 512
+
+# the nodes that join within this many seconds are pushed to the subscribers together
+_PUSH_INTERVAL = 0.1
+
 
 class Discovery(ProtobufReceiver):
     """
@@ -24,8 +30,11 @@ class Discovery(ProtobufReceiver):
         self.addr = None
         self.state = 'SERVER'
         self.factory = factory  # this changes depending on whether it's a server or client
+        self.version = 0  # the membership version that we know as a client
 
     def connection_lost(self, reason):
+        if self.state == 'SERVER':
+            self.factory.unsubscribe(self)
         if self.vk in self.nodes:
             del self.nodes[self.vk]
             logging.debug("Discovery: deleted {}".format(self.vk))
@@ -37,8 +46,10 @@ class Discovery(ProtobufReceiver):
         :param obj:
         :return:
         """
-        logging.debug("Discovery: received msg {} from {}"
-                      .format(obj, self.transport.getPeer().host).replace('\n', ','))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            # formatting a reply with the whole membership is expensive
+            logging.debug("Discovery: received msg {} from {}"
+                          .format(obj, self.transport.getPeer().host).replace('\n', ','))
 
         if self.state == 'SERVER':
             if isinstance(obj, pb.Discover):
@@ -46,12 +57,16 @@ class Discovery(ProtobufReceiver):
                 self.addr = self.transport.getPeer().host + ":" + str(obj.port)
 
                 # TODO check addr to be in the form host:port
+                assert isinstance(self.factory, DiscoveryFactory)
                 if self.vk not in self.nodes:
                     logging.debug("Discovery: added node {} {}".format(self.vk, self.addr))
                     self.nodes[self.vk] = (self.addr, self)
+                    self.factory.added(self.vk, self.addr)
 
-                assert isinstance(self.factory, DiscoveryFactory)
-                self.send_obj(pb.DiscoverReply(nodes=self.factory.make_nodes_dict()))
+                for reply in self.factory.make_replies(obj.version):
+                    self.send_obj(reply)
+                if obj.subscribe:
+                    self.factory.subscribe(self)
 
             else:
                 raise AssertionError("Discovery: invalid payload type on SERVER")
@@ -60,6 +75,7 @@ class Discovery(ProtobufReceiver):
             if isinstance(obj, pb.DiscoverReply):
                 logging.debug("Discovery: making new clients...")
                 self.factory.new_connection_if_not_exist(obj.nodes)
+                self.version = obj.version
 
             elif isinstance(obj, pb.Instruction):
                 self.factory.handle_instruction(obj)
@@ -67,17 +83,30 @@ class Discovery(ProtobufReceiver):
             else:
                 raise AssertionError("Discovery: invalid payload type on CLIENT")
 
-    def say_hello(self, vk, port):
+    def say_hello(self, vk, port, subscribe=False):
+        """
+        Ask for the nodes that we don't know yet
+        :param vk:
+        :param port:
+        :param subscribe: whether the server should push the nodes that join later
+        :return:
+        """
         self.state = 'CLIENT'
-        self.send_obj(pb.Discover(vk=vk, port=port))
+        self.send_obj(pb.Discover(vk=vk, port=port, version=self.version, subscribe=subscribe))
         logging.debug("Discovery: discovery sent {} {}".format(vk, port))
 
 
 class DiscoveryFactory(Factory):
     def __init__(self, n, t, m, inst):
-        self.nodes = {}  # key = vk, val = addr
+        self.nodes = {}  # key = vk, val = (addr, proto)
         self.timeout_called = False
 
+        # the membership is versioned, the version is the number of nodes that joined,
+        # the nodes that joined after version v are log[v:] and the subscribers receive every new node
+        self.log = []  # type: List[str]
+        self.subscribers = set()
+        self.delta = {}  # the nodes that are not pushed yet, key = vk, val = addr
+
         def has_sufficient_instruction_params():
             return n is not None and \
                    t is not None and \
@@ -95,17 +124,51 @@ class DiscoveryFactory(Factory):
             self.inst_inst = inst[1]
             self.inst_param = None if len(inst) < 3 else inst[2]
 
-            self.lc = task.LoopingCall(self.send_instruction_when_ready)
-            self.lc.start(5).addErrback(my_err_back)
-
+            # the instruction is sent when the last node joins
             self.sent = False
 
         else:
             logging.info("Insufficient params to send instructions")
+            self.sent = True
+
+    def make_replies(self, version):
+        """
+        The nodes that joined after `version` and are still here, in pages of at most _PAGE_SIZE nodes
+        :param version:
+        :return: a list of DiscoverReply, there is at least one
+        """
+        vks = [vk for vk in self.log[version:] if vk in self.nodes]
+        pages = [vks[i:i + _PAGE_SIZE] for i in range(0, len(vks), _PAGE_SIZE)] or [[]]
+        return [pb.DiscoverReply(nodes={vk: self.nodes[vk][0] for vk in page},
+                                 version=len(self.log), more=i < len(pages) - 1)
+                for i, page in enumerate(pages)]
 
-    def make_nodes_dict(self):
-        msg = {k: v[0] for k, v in self.nodes.iteritems()}
-        return msg
+    def added(self, vk, addr):
+        """
+        Record a new node, it is pushed to the subscribers after _PUSH_INTERVAL
+        :param vk:
+        :param addr:
+        :return:
+        """
+        self.log.append(vk)
+        if not self.delta:
+            call_later(_PUSH_INTERVAL, self.push)
+        self.delta[vk] = addr
+        if not self.sent:
+            self.send_instruction_when_ready()
+
+    def push(self):
+        if self.subscribers:
+            frame = Frame(pb.DiscoverReply(nodes=self.delta, version=len(self.log)))
+            for proto in self.subscribers:
+                proto.send_frame(frame)
+        self.delta = {}
+
+    def subscribe(self, proto):
+        self.subscribers.add(proto)
+
+    def unsubscribe(self, proto):
+        self.subscribers.discard(proto)
 
     def send_instruction_when_ready(self):
 
@@ -126,7 +189,6 @@ class DiscoveryFactory(Factory):
             msg = pb.Instruction(instruction=self.inst_inst, delay=self.inst_delay, param=self.inst_param)
             logging.debug("Broadcasting instruction - {}".format(msg).replace('\n', ','))
             self.bcast(msg)
-            self.lc.stop()
             self.sent = True
         else:
             logging.debug("Instruction not ready ({} / {})...".format(len(self.nodes), self.m))
@@ -140,8 +202,8 @@ class DiscoveryFactory(Factory):
             proto.send_obj(msg)
 
 
-def got_discovery(p, id, port):
-    p.say_hello(id, port)
+def got_discovery(p, id, port, subscribe=False):
+    p.say_hello(id, port, subscribe)
 
 
 def run(port, n, t, m, inst):
@@ -176,7 +238,8 @@ if __name__ == '__main__':
     parser.add_argument(
         '--inst',
         metavar='INST',
-        help='the instruction to send after all nodes are connected',
+        help='the instruction to send after all nodes are connected, DELAY INSTRUCTION [PARAM], '
+             'the nodes wait for DELAY seconds after they have handshaken with each other',
         nargs='*'
     )
     args = parser.parse_args()
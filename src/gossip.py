@@ -0,0 +1,96 @@
+import logging
+import random
+from base64 import b64encode
+from collections import OrderedDict, defaultdict
+from struct import Struct
+
+import libnacl
+
+import src.messages.messages_pb2 as pb
+from src.protobufreceiver import Frame, _PB_TAG_TO_TUPLE, _PB_NAME_TO_TAG
+
+_TAG = Struct("!H")
+
+# the only types that are gossiped, their handlers are safe to run more than once and do not trust the forwarder,
+# anything else in a Gossip message is dropped so it cannot bypass the duplicate filter and the priority classes
+_GOSSIPED_TAGS = frozenset(_PB_NAME_TO_TAG[name] for name in ('Cons', 'SigWithRound'))
+
+
+class GossipOverlay(object):
+    """
+    Population-wide dissemination over random subsets of the peers instead of the full mesh.
+    A published message is wrapped in a Gossip message with an id and a TTL and sent to `fan_out` random peers,
+    every node that sees the id for the first time handles the message and forwards it to `fan_out` other peers
+    while the TTL lasts, copies with an id that we have seen are dropped.
+    The ids are derived from the content, so identical messages published by many nodes, e.g. Cons from every
+    promoter, are only forwarded once.
+    """
+    def __init__(self, factory, ttl, capacity=8192):
+        """
+        :param factory: MyFactory, used for the members, sending and the handler registry
+        :param ttl: the number of hops, including the first one
+        :param capacity: number of recent ids to remember
+        """
+        assert ttl > 0
+        self._factory = factory
+        self._ttl = ttl
+        self._capacity = capacity
+        self._seen = OrderedDict()  # keys are ids, ordered from oldest to newest
+        self.dropped = defaultdict(long)  # key: message name, val: number of duplicates
+        self.forwarded = defaultdict(long)  # key: message name, val: number of forwarded messages
+        self.rejected = defaultdict(long)  # key: tag, val: number of received messages of a type that is not gossiped
+
+    def _is_new(self, msg_id):
+        if msg_id in self._seen:
+            return False
+        self._seen[msg_id] = None
+        if len(self._seen) > self._capacity:
+            self._seen.popitem(last=False)
+        return True
+
+    def publish(self, msg):
+        """
+        Handle the message locally and start gossiping it
+        :param msg: a protobuf object, a ProtobufWrapper or a Frame
+        :return:
+        """
+        frame = Frame.of(msg)
+        assert frame.tag in _GOSSIPED_TAGS, "{} is not gossiped".format(frame.name)
+        _, body = frame.payload()
+        msg_id = libnacl.crypto_generichash(_TAG.pack(frame.tag) + body)
+        if not self._is_new(msg_id):
+            logging.debug("GOSSIP: already seen {}".format(b64encode(msg_id)))
+            return
+
+        self._factory.send_loopback(frame)
+        self._forward(pb.Gossip(id=msg_id, ttl=self._ttl, tag=frame.tag, body=body), frame.name, None)
+
+    def handle(self, msg, remote_vk):
+        # type: (pb.Gossip, str) -> None
+        if msg.tag not in _GOSSIPED_TAGS:
+            logging.warning("GOSSIP: dropping message with tag {} from {}".format(msg.tag, b64encode(remote_vk)))
+            self.rejected[msg.tag] += 1
+            return
+
+        name, cls = _PB_TAG_TO_TUPLE[msg.tag]
+        if not self._is_new(msg.id):
+            self.dropped[name] += 1
+            return
+
+        obj = cls()
+        obj.ParseFromString(msg.body)
+        self._factory.handlers.dispatch(msg.tag, obj, remote_vk)
+
+        if msg.ttl > 1:
+            self._forward(pb.Gossip(id=msg.id, ttl=msg.ttl - 1, tag=msg.tag, body=msg.body), name, remote_vk)
+
+    def _forward(self, msg, name, remote_vk):
+        candidates = [vk for vk in self._factory.members if vk != self._factory.vk and vk != remote_vk]
+        frame = Frame(msg)
+        for node in random.sample(candidates, min(self._factory.config.fan_out, len(candidates))):
+            self._factory.send(node, frame)
+        self.forwarded[name] += 1
+
+    @property
+    def stats(self):
+        return {"dropped": self.dropped, "forwarded": self.forwarded, "rejected": self.rejected}
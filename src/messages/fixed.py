@@ -0,0 +1,131 @@
+"""
+Fixed layouts of the small consensus messages that are sent O(n^2) times per round, packing them with struct is faster
+than the pure Python protobuf implementation, but not than its C++ one, see scripts/fixed_codec_benchmark.py.
+A frame in a fixed layout has the tag of the layout, see protobufreceiver, and the receiver turns it back into the
+protobuf message. Only the messages of the exact shape of a layout can use it, e.g. a Bracha READY with a 32 byte
+digest, every other message is sent as protobuf.
+"""
+from struct import Struct
+
+from typing import Union
+
+import src.messages.messages_pb2 as pb
+
+_READY = pb.Bracha.Type.Value('READY')
+_DIGEST_SIZE = 32
+
+
+def _mo14_fits(msg):
+    # type: (pb.Mo14) -> bool
+    return 0 <= msg.ty <= 0xff and 0 <= msg.r <= 0xffff and 0 <= msg.v <= 0xff
+
+
+def _ready_fits(msg):
+    # type: (pb.Bracha) -> bool
+    return msg.ty == _READY and len(msg.digest) == _DIGEST_SIZE and not msg.fragment and msg.index == 0 \
+        and not msg.branch
+
+
+def _acs_fits(msg):
+    # type: (pb.ACS) -> bool
+    return 0 <= msg.round <= 0x7fffffff and 0 <= msg.instance <= 0xffff
+
+
+class FixedCodec(object):
+    """
+    The layout of the messages of one protobuf type that have a given shape
+    """
+    cls = None  # the protobuf message class
+    _layout = None  # type: Struct
+
+    def fits(self, msg):
+        """
+        :param msg: a message of type cls
+        :return: whether the message can be encoded in the layout without losing anything
+        """
+        raise NotImplementedError
+
+    def encode(self, msg):
+        # type: (...) -> str
+        """
+        :param msg: a message of type cls that fits
+        :return:
+        """
+        raise NotImplementedError
+
+    def decode(self, payload):
+        # type: (Union[str, buffer]) -> object
+        """
+        Throws IOError if the payload does not have the size of the layout
+        :param payload:
+        :return: a message of type cls
+        """
+        if len(payload) != self._layout.size:
+            raise IOError("Invalid {} payload, len: {}".format(self.__class__.__name__, len(payload)))
+        return self._build(*self._layout.unpack_from(payload))
+
+    def _build(self, *fields):
+        raise NotImplementedError
+
+
+class Mo14Codec(FixedCodec):
+    cls = pb.Mo14
+    _layout = Struct("!BHB")  # ty, r, v
+
+    def fits(self, msg):
+        return _mo14_fits(msg)
+
+    def encode(self, msg):
+        return self._layout.pack(msg.ty, msg.r, msg.v)
+
+    def _build(self, ty, r, v):
+        return pb.Mo14(ty=ty, r=r, v=v)
+
+
+class BrachaReadyCodec(FixedCodec):
+    cls = pb.Bracha
+    _layout = Struct("!{}s".format(_DIGEST_SIZE))  # digest
+
+    def fits(self, msg):
+        return _ready_fits(msg)
+
+    def encode(self, msg):
+        return msg.digest
+
+    def _build(self, digest):
+        return pb.Bracha(ty=_READY, digest=digest)
+
+
+class ACSMo14Codec(FixedCodec):
+    cls = pb.ACS
+    _layout = Struct("!IHBHB")  # round, instance, ty, r, v
+
+    def fits(self, msg):
+        return _acs_fits(msg) and msg.WhichOneof('body') == 'mo14' and _mo14_fits(msg.mo14)
+
+    def encode(self, msg):
+        return self._layout.pack(msg.round, msg.instance, msg.mo14.ty, msg.mo14.r, msg.mo14.v)
+
+    def _build(self, round, instance, ty, r, v):
+        msg = pb.ACS(round=round, instance=instance)
+        msg.mo14.ty = ty
+        msg.mo14.r = r
+        msg.mo14.v = v
+        return msg
+
+
+class ACSBrachaReadyCodec(FixedCodec):
+    cls = pb.ACS
+    _layout = Struct("!IH{}s".format(_DIGEST_SIZE))  # round, instance, digest
+
+    def fits(self, msg):
+        return _acs_fits(msg) and msg.WhichOneof('body') == 'bracha' and _ready_fits(msg.bracha)
+
+    def encode(self, msg):
+        return self._layout.pack(msg.round, msg.instance, msg.bracha.digest)
+
+    def _build(self, round, instance, digest):
+        msg = pb.ACS(round=round, instance=instance)
+        msg.bracha.ty = _READY
+        msg.bracha.digest = digest
+        return msg
@@ -19,7 +19,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   name='messages.proto',
   package='',
   syntax='proto3',
-  serialized_pb=_b('\n\x0emessages.proto\"\x12\n\x05\x44ummy\x12\t\n\x01m\x18\x01 \x01(\t\"$\n\x08\x44iscover\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"g\n\rDiscoverReply\x12(\n\x05nodes\x18\x01 \x03(\x0b\x32\x19.DiscoverReply.NodesEntry\x1a,\n\nNodesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"@\n\x0bInstruction\x12\x13\n\x0binstruction\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lay\x18\x02 \x01(\x05\x12\r\n\x05param\x18\x03 \x01(\t\" \n\x04Ping\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\" \n\x04Pong\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\"k\n\x06\x42racha\x12\x18\n\x02ty\x18\x01 \x01(\x0e\x32\x0c.Bracha.Type\x12\x0e\n\x06\x64igest\x18\x02 \x01(\x0c\x12\x10\n\x08\x66ragment\x18\x03 \x01(\x0c\"%\n\x04Type\x12\x08\n\x04INIT\x10\x00\x12\x08\n\x04\x45\x43HO\x10\x01\x12\t\n\x05READY\x10\x02\"N\n\x04Mo14\x12\x16\n\x02ty\x18\x01 \x01(\x0e\x32\n.Mo14.Type\x12\t\n\x01r\x18\x02 \x01(\x05\x12\t\n\x01v\x18\x03 \x01(\x05\"\x18\n\x04Type\x12\x07\n\x03\x45ST\x10\x00\x12\x07\n\x03\x41UX\x10\x01\"`\n\x03\x41\x43S\x12\x10\n\x08instance\x18\x01 \x01(\x0c\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x19\n\x06\x62racha\x18\x03 \x01(\x0b\x32\x07.BrachaH\x00\x12\x15\n\x04mo14\x18\x04 \x01(\x0b\x32\x05.Mo14H\x00\x42\x06\n\x04\x62ody\"\x93\x01\n\x07TxBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1aR\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x63ounterparty\x18\x03 \x01(\x0c\x12\r\n\x05nonce\x18\x04 \x01(\x0c\x12\t\n\x01m\x18\x05 \x01(\t\"\x1d\n\x05TxReq\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\"+\n\x06TxResp\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\x12\x0b\n\x03seq\x18\x02 \x01(\x05\"\xa8\x01\n\x07\x43pBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.CpBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1ag\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\r\n\x05round\x18\x03 \x01(\x05\x12\x11\n\tcons_hash\x18\x04 \x01(\x0c\x12\x16\n\x02ss\x18\x05 \x03(\x0b\x32\n.Signature\x12\t\n\x01p\x18\x06 \x01(\x05\"!\n\x08\x43pBlocks\x12\x15\n\x03\x63ps\x18\x01 \x03(\x0b\x32\x08.CpBlock\"0\n\tSignature\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x17\n\x0fsigned_document\x18\x02 \x01(\x0c\"0\n\x0cSigWithRound\x12\x15\n\x01s\x18\x01 \x01(\x0b\x32\n.Signature\x12\t\n\x01r\x18\x02 \x01(\x05\"/\n\x04\x43ons\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x18\n\x06\x62locks\x18\x02 \x03(\x0b\x32\x08.CpBlock\"\x14\n\x07\x41skCons\x12\t\n\x01r\x18\x01 \x01(\x05\"+\n\rValidationReq\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\"|\n\x0c\x43ompactBlock\x12\"\n\x05inner\x18\x01 \x01(\x0b\x32\x13.CompactBlock.Inner\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x61greed_round\x18\x03 \x01(\x05\x1a%\n\x05Inner\x12\x0e\n\x06\x64igest\x18\x01 \x01(\x0c\x12\x0c\n\x04prev\x18\x02 \x01(\x0c\"K\n\x0eValidationResp\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12\x1d\n\x06pieces\x18\x03 \x03(\x0b\x32\r.CompactBlockb\x06proto3')
+  serialized_pb=_b('\n\x0emessages.proto\"\x12\n\x05\x44ummy\x12\t\n\x01m\x18\x01 \x01(\t\"H\n\x08\x44iscover\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\x12\x0f\n\x07version\x18\x03 \x01(\x05\x12\x11\n\tsubscribe\x18\x04 \x01(\x08\"\x86\x01\n\rDiscoverReply\x12(\n\x05nodes\x18\x01 \x03(\x0b\x32\x19.DiscoverReply.NodesEntry\x12\x0f\n\x07version\x18\x02 \x01(\x05\x12\x0c\n\x04more\x18\x03 \x01(\x08\x1a,\n\nNodesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\t:\x02\x38\x01\"@\n\x0bInstruction\x12\x13\n\x0binstruction\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lay\x18\x02 \x01(\x05\x12\r\n\x05param\x18\x03 \x01(\t\"2\n\x04Ping\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\x12\x10\n\x08\x66\x65\x61tures\x18\x03 \x01(\x05\"2\n\x04Pong\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x0c\n\x04port\x18\x02 \x01(\x05\x12\x10\n\x08\x66\x65\x61tures\x18\x03 \x01(\x05\"\x8a\x01\n\x06\x42racha\x12\x18\n\x02ty\x18\x01 \x01(\x0e\x32\x0c.Bracha.Type\x12\x0e\n\x06\x64igest\x18\x02 \x01(\x0c\x12\x10\n\x08\x66ragment\x18\x03 \x01(\x0c\x12\r\n\x05index\x18\x04 \x01(\x05\x12\x0e\n\x06\x62ranch\x18\x05 \x03(\x0c\"%\n\x04Type\x12\x08\n\x04INIT\x10\x00\x12\x08\n\x04\x45\x43HO\x10\x01\x12\t\n\x05READY\x10\x02\"N\n\x04Mo14\x12\x16\n\x02ty\x18\x01 \x01(\x0e\x32\n.Mo14.Type\x12\t\n\x01r\x18\x02 \x01(\x05\x12\t\n\x01v\x18\x03 \x01(\x05\"\x18\n\x04Type\x12\x07\n\x03\x45ST\x10\x00\x12\x07\n\x03\x41UX\x10\x01\"f\n\x03\x41\x43S\x12\r\n\x05round\x18\x02 \x01(\x05\x12\x10\n\x08instance\x18\x05 \x01(\x05\x12\x19\n\x06\x62racha\x18\x03 \x01(\x0b\x32\x07.BrachaH\x00\x12\x15\n\x04mo14\x18\x04 \x01(\x0b\x32\x05.Mo14H\x00\x42\x06\n\x04\x62odyJ\x04\x08\x01\x10\x02\"\x83\x01\n\x08\x41\x43SBatch\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x1e\n\x05votes\x18\x02 \x03(\x0b\x32\x0f.ACSBatch.Votes\x1aH\n\x05Votes\x12\x16\n\x02ty\x18\x01 \x01(\x0e\x32\n.Mo14.Type\x12\t\n\x01r\x18\x02 \x01(\x05\x12\t\n\x01v\x18\x03 \x01(\x05\x12\x11\n\tinstances\x18\x04 \x01(\x0c\"\x93\x01\n\x07TxBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.TxBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1aR\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x63ounterparty\x18\x03 \x01(\x0c\x12\r\n\x05nonce\x18\x04 \x01(\x0c\x12\t\n\x01m\x18\x05 \x01(\t\"\x1d\n\x05TxReq\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\"+\n\x06TxResp\x12\x14\n\x02tx\x18\x01 \x01(\x0b\x32\x08.TxBlock\x12\x0b\n\x03seq\x18\x02 \x01(\x05\"\xb5\x01\n\x07\x43pBlock\x12\x1d\n\x05inner\x18\x01 \x01(\x0b\x32\x0e.CpBlock.Inner\x12\x15\n\x01s\x18\x02 \x01(\x0b\x32\n.Signature\x1at\n\x05Inner\x12\x0c\n\x04prev\x18\x01 \x01(\x0c\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\r\n\x05round\x18\x03 \x01(\x05\x12\x11\n\tcons_hash\x18\x04 \x01(\x0c\x12\t\n\x01p\x18\x06 \x01(\x05\x12\x0f\n\x07signers\x18\x07 \x01(\x0c\x12\x0c\n\x04sigs\x18\x08 \x03(\x0cJ\x04\x08\x05\x10\x06\"!\n\x08\x43pBlocks\x12\x15\n\x03\x63ps\x18\x01 \x03(\x0b\x32\x08.CpBlock\"0\n\tSignature\x12\n\n\x02vk\x18\x01 \x01(\x0c\x12\x17\n\x0fsigned_document\x18\x02 \x01(\x0c\"<\n\x0cSigWithRound\x12\t\n\x01r\x18\x02 \x01(\x05\x12\x0e\n\x06signer\x18\x03 \x01(\x05\x12\x0b\n\x03sig\x18\x04 \x01(\x0cJ\x04\x08\x01\x10\x02\"/\n\x04\x43ons\x12\r\n\x05round\x18\x01 \x01(\x05\x12\x18\n\x06\x62locks\x18\x02 \x03(\x0b\x32\x08.CpBlock\"\x14\n\x07\x41skCons\x12\t\n\x01r\x18\x01 \x01(\x05\"*\n\x0c\x41skConsRange\x12\r\n\x05start\x18\x01 \x01(\x05\x12\x0b\n\x03\x65nd\x18\x02 \x01(\x05\"+\n\rValidationReq\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\"|\n\x0c\x43ompactBlock\x12\"\n\x05inner\x18\x01 \x01(\x0b\x32\x13.CompactBlock.Inner\x12\x0b\n\x03seq\x18\x02 \x01(\x05\x12\x14\n\x0c\x61greed_round\x18\x03 \x01(\x05\x1a%\n\x05Inner\x12\x0e\n\x06\x64igest\x18\x01 \x01(\x0c\x12\x0c\n\x04prev\x18\x02 \x01(\x0c\"K\n\x0eValidationResp\x12\x0b\n\x03seq\x18\x01 \x01(\x05\x12\r\n\x05seq_r\x18\x02 \x01(\x05\x12\x1d\n\x06pieces\x18\x03 \x03(\x0b\x32\r.CompactBlock\"<\n\x06Gossip\x12\n\n\x02id\x18\x01 \x01(\x0c\x12\x0b\n\x03ttl\x18\x02 \x01(\x05\x12\x0b\n\x03tag\x18\x03 \x01(\x05\x12\x0c\n\x04\x62ody\x18\x04 \x01(\x0c\x62\x06proto3')
 )
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
@@ -46,8 +46,8 @@ _BRACHA_TYPE = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   options=None,
-  serialized_start=385,
-  serialized_end=422,
+  serialized_start=521,
+  serialized_end=558,
 )
 _sym_db.RegisterEnumDescriptor(_BRACHA_TYPE)
 
@@ -68,8 +68,8 @@ _MO14_TYPE = _descriptor.EnumDescriptor(
   ],
   containing_type=None,
   options=None,
-  serialized_start=478,
-  serialized_end=502,
+  serialized_start=614,
+  serialized_end=638,
 )
 _sym_db.RegisterEnumDescriptor(_MO14_TYPE)
 
@@ -126,6 +126,20 @@ _DISCOVER = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='version', full_name='Discover.version', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='subscribe', full_name='Discover.subscribe', index=3,
+      number=4, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -139,7 +153,7 @@ _DISCOVER = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=38,
-  serialized_end=74,
+  serialized_end=110,
 )
 
 
@@ -176,8 +190,8 @@ _DISCOVERREPLY_NODESENTRY = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=135,
-  serialized_end=179,
+  serialized_start=203,
+  serialized_end=247,
 )
 
 _DISCOVERREPLY = _descriptor.Descriptor(
@@ -194,6 +208,20 @@ _DISCOVERREPLY = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='version', full_name='DiscoverReply.version', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='more', full_name='DiscoverReply.more', index=2,
+      number=3, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -206,8 +234,8 @@ _DISCOVERREPLY = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=76,
-  serialized_end=179,
+  serialized_start=113,
+  serialized_end=247,
 )
 
 
@@ -251,8 +279,8 @@ _INSTRUCTION = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=181,
-  serialized_end=245,
+  serialized_start=249,
+  serialized_end=313,
 )
 
 
@@ -277,6 +305,13 @@ _PING = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='features', full_name='Ping.features', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -289,8 +324,8 @@ _PING = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=247,
-  serialized_end=279,
+  serialized_start=315,
+  serialized_end=365,
 )
 
 
@@ -315,6 +350,13 @@ _PONG = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='features', full_name='Pong.features', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -327,8 +369,8 @@ _PONG = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=281,
-  serialized_end=313,
+  serialized_start=367,
+  serialized_end=417,
 )
 
 
@@ -360,6 +402,20 @@ _BRACHA = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='index', full_name='Bracha.index', index=3,
+      number=4, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='branch', full_name='Bracha.branch', index=4,
+      number=5, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -373,8 +429,8 @@ _BRACHA = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=315,
-  serialized_end=422,
+  serialized_start=420,
+  serialized_end=558,
 )
 
 
@@ -419,8 +475,8 @@ _MO14 = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=424,
-  serialized_end=502,
+  serialized_start=560,
+  serialized_end=638,
 )
 
 
@@ -432,15 +488,15 @@ _ACS = _descriptor.Descriptor(
   containing_type=None,
   fields=[
     _descriptor.FieldDescriptor(
-      name='instance', full_name='ACS.instance', index=0,
-      number=1, type=12, cpp_type=9, label=1,
-      has_default_value=False, default_value=_b(""),
+      name='round', full_name='ACS.round', index=0,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
     _descriptor.FieldDescriptor(
-      name='round', full_name='ACS.round', index=1,
-      number=2, type=5, cpp_type=1, label=1,
+      name='instance', full_name='ACS.instance', index=1,
+      number=5, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
@@ -474,8 +530,97 @@ _ACS = _descriptor.Descriptor(
       name='body', full_name='ACS.body',
       index=0, containing_type=None, fields=[]),
   ],
-  serialized_start=504,
-  serialized_end=600,
+  serialized_start=640,
+  serialized_end=742,
+)
+
+
+_ACSBATCH_VOTES = _descriptor.Descriptor(
+  name='Votes',
+  full_name='ACSBatch.Votes',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='ty', full_name='ACSBatch.Votes.ty', index=0,
+      number=1, type=14, cpp_type=8, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='r', full_name='ACSBatch.Votes.r', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='v', full_name='ACSBatch.Votes.v', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='instances', full_name='ACSBatch.Votes.instances', index=3,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=804,
+  serialized_end=876,
+)
+
+_ACSBATCH = _descriptor.Descriptor(
+  name='ACSBatch',
+  full_name='ACSBatch',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='round', full_name='ACSBatch.round', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='votes', full_name='ACSBatch.votes', index=1,
+      number=2, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[_ACSBATCH_VOTES, ],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=745,
+  serialized_end=876,
 )
 
 
@@ -533,8 +678,8 @@ _TXBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=668,
-  serialized_end=750,
+  serialized_start=944,
+  serialized_end=1026,
 )
 
 _TXBLOCK = _descriptor.Descriptor(
@@ -570,8 +715,8 @@ _TXBLOCK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=603,
-  serialized_end=750,
+  serialized_start=879,
+  serialized_end=1026,
 )
 
 
@@ -601,8 +746,8 @@ _TXREQ = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=752,
-  serialized_end=781,
+  serialized_start=1028,
+  serialized_end=1057,
 )
 
 
@@ -639,8 +784,8 @@ _TXRESP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=783,
-  serialized_end=826,
+  serialized_start=1059,
+  serialized_end=1102,
 )
 
 
@@ -680,16 +825,23 @@ _CPBLOCK_INNER = _descriptor.Descriptor(
       is_extension=False, extension_scope=None,
       options=None),
     _descriptor.FieldDescriptor(
-      name='ss', full_name='CpBlock.Inner.ss', index=4,
-      number=5, type=11, cpp_type=10, label=3,
-      has_default_value=False, default_value=[],
+      name='p', full_name='CpBlock.Inner.p', index=4,
+      number=6, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
     _descriptor.FieldDescriptor(
-      name='p', full_name='CpBlock.Inner.p', index=5,
-      number=6, type=5, cpp_type=1, label=1,
-      has_default_value=False, default_value=0,
+      name='signers', full_name='CpBlock.Inner.signers', index=5,
+      number=7, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='sigs', full_name='CpBlock.Inner.sigs', index=6,
+      number=8, type=12, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
@@ -705,8 +857,8 @@ _CPBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=894,
-  serialized_end=997,
+  serialized_start=1170,
+  serialized_end=1286,
 )
 
 _CPBLOCK = _descriptor.Descriptor(
@@ -742,8 +894,8 @@ _CPBLOCK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=829,
-  serialized_end=997,
+  serialized_start=1105,
+  serialized_end=1286,
 )
 
 
@@ -773,8 +925,8 @@ _CPBLOCKS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=999,
-  serialized_end=1032,
+  serialized_start=1288,
+  serialized_end=1321,
 )
 
 
@@ -811,8 +963,8 @@ _SIGNATURE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1034,
-  serialized_end=1082,
+  serialized_start=1323,
+  serialized_end=1371,
 )
 
 
@@ -824,19 +976,26 @@ _SIGWITHROUND = _descriptor.Descriptor(
   containing_type=None,
   fields=[
     _descriptor.FieldDescriptor(
-      name='s', full_name='SigWithRound.s', index=0,
-      number=1, type=11, cpp_type=10, label=1,
-      has_default_value=False, default_value=None,
+      name='r', full_name='SigWithRound.r', index=0,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
     _descriptor.FieldDescriptor(
-      name='r', full_name='SigWithRound.r', index=1,
-      number=2, type=5, cpp_type=1, label=1,
+      name='signer', full_name='SigWithRound.signer', index=1,
+      number=3, type=5, cpp_type=1, label=1,
       has_default_value=False, default_value=0,
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       options=None),
+    _descriptor.FieldDescriptor(
+      name='sig', full_name='SigWithRound.sig', index=2,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
   ],
   extensions=[
   ],
@@ -849,8 +1008,8 @@ _SIGWITHROUND = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1084,
-  serialized_end=1132,
+  serialized_start=1373,
+  serialized_end=1433,
 )
 
 
@@ -887,8 +1046,8 @@ _CONS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1134,
-  serialized_end=1181,
+  serialized_start=1435,
+  serialized_end=1482,
 )
 
 
@@ -918,8 +1077,46 @@ _ASKCONS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1183,
-  serialized_end=1203,
+  serialized_start=1484,
+  serialized_end=1504,
+)
+
+
+_ASKCONSRANGE = _descriptor.Descriptor(
+  name='AskConsRange',
+  full_name='AskConsRange',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='start', full_name='AskConsRange.start', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='end', full_name='AskConsRange.end', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1506,
+  serialized_end=1548,
 )
 
 
@@ -956,8 +1153,8 @@ _VALIDATIONREQ = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1205,
-  serialized_end=1248,
+  serialized_start=1550,
+  serialized_end=1593,
 )
 
 
@@ -994,8 +1191,8 @@ _COMPACTBLOCK_INNER = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1337,
-  serialized_end=1374,
+  serialized_start=1682,
+  serialized_end=1719,
 )
 
 _COMPACTBLOCK = _descriptor.Descriptor(
@@ -1038,8 +1235,8 @@ _COMPACTBLOCK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1250,
-  serialized_end=1374,
+  serialized_start=1595,
+  serialized_end=1719,
 )
 
 
@@ -1083,8 +1280,60 @@ _VALIDATIONRESP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1376,
-  serialized_end=1451,
+  serialized_start=1721,
+  serialized_end=1796,
+)
+
+
+_GOSSIP = _descriptor.Descriptor(
+  name='Gossip',
+  full_name='Gossip',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='id', full_name='Gossip.id', index=0,
+      number=1, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='ttl', full_name='Gossip.ttl', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='tag', full_name='Gossip.tag', index=2,
+      number=3, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+    _descriptor.FieldDescriptor(
+      name='body', full_name='Gossip.body', index=3,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      options=None),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1798,
+  serialized_end=1858,
 )
 
 _DISCOVERREPLY_NODESENTRY.containing_type = _DISCOVERREPLY
@@ -1101,17 +1350,18 @@ _ACS.fields_by_name['bracha'].containing_oneof = _ACS.oneofs_by_name['body']
 _ACS.oneofs_by_name['body'].fields.append(
   _ACS.fields_by_name['mo14'])
 _ACS.fields_by_name['mo14'].containing_oneof = _ACS.oneofs_by_name['body']
+_ACSBATCH_VOTES.fields_by_name['ty'].enum_type = _MO14_TYPE
+_ACSBATCH_VOTES.containing_type = _ACSBATCH
+_ACSBATCH.fields_by_name['votes'].message_type = _ACSBATCH_VOTES
 _TXBLOCK_INNER.containing_type = _TXBLOCK
 _TXBLOCK.fields_by_name['inner'].message_type = _TXBLOCK_INNER
 _TXBLOCK.fields_by_name['s'].message_type = _SIGNATURE
 _TXREQ.fields_by_name['tx'].message_type = _TXBLOCK
 _TXRESP.fields_by_name['tx'].message_type = _TXBLOCK
-_CPBLOCK_INNER.fields_by_name['ss'].message_type = _SIGNATURE
 _CPBLOCK_INNER.containing_type = _CPBLOCK
 _CPBLOCK.fields_by_name['inner'].message_type = _CPBLOCK_INNER
 _CPBLOCK.fields_by_name['s'].message_type = _SIGNATURE
 _CPBLOCKS.fields_by_name['cps'].message_type = _CPBLOCK
-_SIGWITHROUND.fields_by_name['s'].message_type = _SIGNATURE
 _CONS.fields_by_name['blocks'].message_type = _CPBLOCK
 _COMPACTBLOCK_INNER.containing_type = _COMPACTBLOCK
 _COMPACTBLOCK.fields_by_name['inner'].message_type = _COMPACTBLOCK_INNER
@@ -1125,6 +1375,7 @@ DESCRIPTOR.message_types_by_name['Pong'] = _PONG
 DESCRIPTOR.message_types_by_name['Bracha'] = _BRACHA
 DESCRIPTOR.message_types_by_name['Mo14'] = _MO14
 DESCRIPTOR.message_types_by_name['ACS'] = _ACS
+DESCRIPTOR.message_types_by_name['ACSBatch'] = _ACSBATCH
 DESCRIPTOR.message_types_by_name['TxBlock'] = _TXBLOCK
 DESCRIPTOR.message_types_by_name['TxReq'] = _TXREQ
 DESCRIPTOR.message_types_by_name['TxResp'] = _TXRESP
@@ -1134,9 +1385,11 @@ DESCRIPTOR.message_types_by_name['Signature'] = _SIGNATURE
 DESCRIPTOR.message_types_by_name['SigWithRound'] = _SIGWITHROUND
 DESCRIPTOR.message_types_by_name['Cons'] = _CONS
 DESCRIPTOR.message_types_by_name['AskCons'] = _ASKCONS
+DESCRIPTOR.message_types_by_name['AskConsRange'] = _ASKCONSRANGE
 DESCRIPTOR.message_types_by_name['ValidationReq'] = _VALIDATIONREQ
 DESCRIPTOR.message_types_by_name['CompactBlock'] = _COMPACTBLOCK
 DESCRIPTOR.message_types_by_name['ValidationResp'] = _VALIDATIONRESP
+DESCRIPTOR.message_types_by_name['Gossip'] = _GOSSIP
 
 Dummy = _reflection.GeneratedProtocolMessageType('Dummy', (_message.Message,), dict(
   DESCRIPTOR = _DUMMY,
@@ -1209,6 +1462,21 @@ ACS = _reflection.GeneratedProtocolMessageType('ACS', (_message.Message,), dict(
   ))
 _sym_db.RegisterMessage(ACS)
 
+ACSBatch = _reflection.GeneratedProtocolMessageType('ACSBatch', (_message.Message,), dict(
+
+  Votes = _reflection.GeneratedProtocolMessageType('Votes', (_message.Message,), dict(
+    DESCRIPTOR = _ACSBATCH_VOTES,
+    __module__ = 'messages_pb2'
+    # @@protoc_insertion_point(class_scope:ACSBatch.Votes)
+    ))
+  ,
+  DESCRIPTOR = _ACSBATCH,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:ACSBatch)
+  ))
+_sym_db.RegisterMessage(ACSBatch)
+_sym_db.RegisterMessage(ACSBatch.Votes)
+
 TxBlock = _reflection.GeneratedProtocolMessageType('TxBlock', (_message.Message,), dict(
 
   Inner = _reflection.GeneratedProtocolMessageType('Inner', (_message.Message,), dict(
@@ -1288,6 +1556,13 @@ AskCons = _reflection.GeneratedProtocolMessageType('AskCons', (_message.Message,
   ))
 _sym_db.RegisterMessage(AskCons)
 
+AskConsRange = _reflection.GeneratedProtocolMessageType('AskConsRange', (_message.Message,), dict(
+  DESCRIPTOR = _ASKCONSRANGE,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:AskConsRange)
+  ))
+_sym_db.RegisterMessage(AskConsRange)
+
 ValidationReq = _reflection.GeneratedProtocolMessageType('ValidationReq', (_message.Message,), dict(
   DESCRIPTOR = _VALIDATIONREQ,
   __module__ = 'messages_pb2'
@@ -1317,6 +1592,13 @@ ValidationResp = _reflection.GeneratedProtocolMessageType('ValidationResp', (_me
   ))
 _sym_db.RegisterMessage(ValidationResp)
 
+Gossip = _reflection.GeneratedProtocolMessageType('Gossip', (_message.Message,), dict(
+  DESCRIPTOR = _GOSSIP,
+  __module__ = 'messages_pb2'
+  # @@protoc_insertion_point(class_scope:Gossip)
+  ))
+_sym_db.RegisterMessage(Gossip)
+
 
 _DISCOVERREPLY_NODESENTRY.has_options = True
 _DISCOVERREPLY_NODESENTRY._options = _descriptor._ParseOptions(descriptor_pb2.MessageOptions(), _b('8\001'))
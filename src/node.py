@@ -1,10 +1,10 @@
-import Queue
 import argparse
 import logging
 import random
 import sys
 import json
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
 from base64 import b64encode, b64decode
 
 from twisted.internet import reactor, task, error
@@ -13,13 +13,47 @@ from twisted.internet.protocol import Factory
 from typing import Dict, Tuple
 
 import src.messages.messages_pb2 as pb
-from src.protobufreceiver import ProtobufReceiver
+from src.protobufreceiver import ProtobufReceiver, DuplicateFilter, MessageRegistry, Frame, CompressionStats, \
+    LaneStats, FEATURE_COMPRESSION, FEATURE_BATCH, FEATURE_CHUNK, FEATURE_FIXED, FIXED_TAG_TO_TAG, _PB_NAME_TO_TAG
 from src.consensus.acs import ACS
 from src.consensus.bracha import Bracha
+from src.consensus.erasure import EC_BACKENDS
 from src.consensus.mo14 import Mo14
+from src.trustchain.trustchain import ProtobufWrapper
 from src.trustchain.trustchain_runner import TrustChainRunner
-from src.utils import Replay, Handled, set_logging, my_err_back, call_later, stop_reactor
+from src.utils import Replay, Handled, FutureBuffer, Readiness, set_logging, my_err_back, call_later, stop_reactor
 from src.discovery import Discovery, got_discovery
+from src.scheduler import Scheduler
+from src.gossip import GossipOverlay
+from src.connection_pool import ConnectionPool
+
+# handling a second copy of these messages has no effect, so duplicates are dropped before decoding
+_IDEMPOTENT_MESSAGES = ('Cons', 'CpBlock', 'SigWithRound')
+
+# maximum number of ACS messages kept until they can be handled
+_FUTURE_CAPACITY = 64 * 1024
+
+# seconds after which we start even if some of the expected peers are missing
+_READY_TIMEOUT = 60
+
+# inbound messages are handled in order of priority, the index is the priority,
+# messages that are not listed are handled as soon as they arrive,
+# outbound messages use the same classes as lanes, those that are not listed go to the first lane
+_PRIORITY_CLASSES = [
+    ('consensus', ('ACS', 'ACSBatch', 'Bracha', 'Mo14', 'Dummy')),
+    ('checkpoint', ('CpBlock', 'Cons', 'SigWithRound', 'AskCons', 'AskConsRange', 'Gossip')),
+    ('transaction', ('TxReq', 'TxResp')),
+    ('validation', ('ValidationReq', 'ValidationResp')),
+]
+_TAG_PRIORITIES = {_PB_NAME_TO_TAG[name]: priority
+                   for priority, (_, names) in enumerate(_PRIORITY_CLASSES) for name in names}
+# the fixed layouts of a message have the priority of the message
+_TAG_PRIORITIES.update({_tag: _TAG_PRIORITIES[_type_tag] for _tag, _type_tag in FIXED_TAG_TO_TAG.iteritems()
+                        if _type_tag in _TAG_PRIORITIES})
+
+_PING_TAG = _PB_NAME_TO_TAG['Ping']
+_PONG_TAG = _PB_NAME_TO_TAG['Pong']
+_FEATURES = FEATURE_COMPRESSION | FEATURE_BATCH | FEATURE_CHUNK
 
 
 class MyProto(ProtobufReceiver):
@@ -33,13 +67,24 @@ class MyProto(ProtobufReceiver):
         self.vk = factory.vk
         self.peers = factory.peers
         self.remote_vk = None
+        self.dial_vk = None  # the node that we expect to reach if we dialed
+        self.last_active = time.time()
         self.state = 'SERVER'
+        self.duplicate_filter = factory.duplicate_filter
+        self.flush_threshold = self.config.flush_threshold
+        self.compression_threshold = self.config.compression_threshold
+        self.compression_stats = factory.compression_stats
+        self.lane_names = [name for name, _ in _PRIORITY_CLASSES]
+        self.tag_lanes = _TAG_PRIORITIES
+        self.lane_stats = factory.lane_stats
+        self.chunk_size = self.config.chunk_size
+        self.features = _FEATURES | (FEATURE_FIXED if self.config.fixed_codec else 0)
 
     def connection_lost(self, reason):
         """
         We don't try to test churn for this experiment, so there's no reason to continue running the node when some.
         If a node is deleted, it means either some error occurred, or the experiment is completed.
-        Thus we stop the current reactor too.
+        Thus we stop the current reactor too, unless connections are opened on demand and closed when idle.
         :param reason: 
         :return: 
         """
@@ -51,110 +96,60 @@ class MyProto(ProtobufReceiver):
         else:
             logging.debug("NODE: deleting peer {}, reason {}".format(peer, reason))
 
-        try:
+        if self.remote_vk is None:
+            if self.dial_vk is not None:
+                self.factory.pool.lost(self.dial_vk, reason)
+        elif self.remote_vk in self.peers and self.peers[self.remote_vk][2] is self:
             del self.peers[self.remote_vk]
-        except KeyError:
-            logging.warning("NODE: peer {} already deleted".format(b64encode(self.remote_vk)))
+        else:
+            logging.debug("NODE: peer {} already deleted".format(peer))
 
-        stop_reactor()
+        if self.config.max_connections == 0:
+            stop_reactor()
 
-    def obj_received(self, obj):
+    def payload_received(self, flags, tag, payload):
         """
-        first we handle the items in the queue
-        then we handle the received message
-        :param obj:
+        Decoding and handling is deferred to the scheduler of the factory when the message has a priority class
+        :param flags:
+        :param tag:
+        :param payload:
         :return:
         """
-
-        # TODO do something like handler registry
-
-        if isinstance(obj, pb.Ping):
-            self.handle_ping(obj)
-
-        elif isinstance(obj, pb.Pong):
-            self.handle_pong(obj)
-
-        elif isinstance(obj, pb.ACS):
-            if self.factory.config.failure != 'omission':
-                res = self.factory.acs.handle(obj, self.remote_vk)
-                self.process_acs_res(res, obj)
-
-        elif isinstance(obj, pb.TxReq):
-            self.factory.tc_runner.handle_tx_req(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.TxResp):
-            self.factory.tc_runner.handle_tx_resp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.ValidationReq):
-            self.factory.tc_runner.handle_validation_req(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.ValidationResp):
-            self.factory.tc_runner.handle_validation_resp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.SigWithRound):
-            self.factory.tc_runner.handle_sig(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.CpBlock):
-            self.factory.tc_runner.handle_cp(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Cons):
-            self.factory.tc_runner.handle_cons(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.AskCons):
-            self.factory.tc_runner.handle_ask_cons(obj, self.remote_vk)
-
-        # NOTE messages below are for testing, bracha/mo14 is normally handled by acs
-
-        elif isinstance(obj, pb.Bracha):
-            if self.factory.config.failure != 'omission':
-                self.factory.bracha.handle(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Mo14):
-            if self.factory.config.failure != 'omission':
-                self.factory.mo14.handle(obj, self.remote_vk)
-
-        elif isinstance(obj, pb.Dummy):
-            logging.info("NODE: got dummy message from {}".format(b64encode(self.remote_vk)))
-
+        priority = _TAG_PRIORITIES.get(tag)
+        if priority is None or self.factory.scheduler is None:
+            self.decode_payload(flags, tag, payload)
         else:
-            raise AssertionError("invalid message type {}".format(obj))
+            self.factory.scheduler.submit(priority, self.decode_payload, flags, tag, str(payload))
 
-        self.factory.recv_message_log[obj.__class__.__name__] += obj.ByteSize()
-
-    def send_obj(self, obj):
+    def tagged_obj_received(self, tag, obj):
         """
-        Wrapper around ProtobufReceiver.send_obj for logging
+        Ping and Pong are handled by the connection itself, everything else goes to the handler registry of the factory
+        :param tag:
         :param obj:
         :return:
         """
-        ProtobufReceiver.send_obj(self, obj)
-        self.factory.sent_message_log[obj.__class__.__name__] += obj.ByteSize()
+        if tag == _PING_TAG:
+            self.handle_ping(obj)
+        elif tag == _PONG_TAG:
+            self.handle_pong(obj)
+        else:
+            self.factory.handlers.dispatch(tag, obj, self.remote_vk)
+
+        self.factory.recv_message_log[obj.__class__.__name__] += obj.ByteSize()
+        self.last_active = time.time()
 
-    def process_acs_res(self, o, m):
+    def send_frame(self, frame):
         """
-        This function checks whether the result is Replay or Handled.
-        If it's the former, the message is placed into factory.q and then we replay it (factory.process_queue).
-        :param o: the object we're processing
-        :param m: the original message
+        Wrapper around ProtobufReceiver.send_frame for logging
+        :param frame:
         :return:
         """
-        assert o is not None
-
-        if isinstance(o, Replay):
-            logging.debug("NODE: putting {} into msg queue".format(m))
-            self.factory.q.put((self.remote_vk, m))
-        elif isinstance(o, Handled):
-            if self.factory.config.test == 'acs':
-                logging.debug("NODE: testing ACS, not handling the result")
-                return
-            if o.m is not None:
-                logging.debug("NODE: attempting to handle ACS result")
-                self.factory.tc_runner.handle_cons_from_acs(o.m)
-        else:
-            raise AssertionError("instance is not Replay or Handled")
+        frame = ProtobufReceiver.send_frame(self, frame)
+        self.factory.sent_message_log[frame.name] += frame.size
+        self.last_active = time.time()
 
     def send_ping(self):
-        self.send_obj(pb.Ping(vk=self.vk, port=self.config.port))
+        self.send_obj(pb.Ping(vk=self.vk, port=self.config.port, features=self.features))
         logging.debug("NODE: sent ping")
         self.state = 'CLIENT'
 
@@ -162,23 +157,39 @@ class MyProto(ProtobufReceiver):
         # type: (pb.Ping) -> None
         logging.debug("NODE: got ping, {}".format(msg))
         assert (self.state == 'SERVER')
-        if msg.vk in self.peers.keys():
+        if msg.vk in self.peers:
             logging.debug("NODE: ping found myself in peers.keys")
         self.peers[msg.vk] = (self.transport.getPeer().host, msg.port, self)
         self.remote_vk = msg.vk
-        self.send_obj(pb.Pong(vk=self.vk, port=self.config.port))
+        self.remote_compression = bool(msg.features & FEATURE_COMPRESSION)
+        self.remote_batch = bool(msg.features & FEATURE_BATCH)
+        self.remote_chunk = bool(msg.features & FEATURE_CHUNK)
+        self.remote_fixed = self.config.fixed_codec and bool(msg.features & FEATURE_FIXED)
+        self.send_obj(pb.Pong(vk=self.vk, port=self.config.port, features=self.features))
         logging.debug("sent pong")
+        self.factory.pool.add(msg.vk, self.transport.getPeer().host, msg.port)
+        self.factory.pool.connected(msg.vk, self)
+        self.factory.check_peers_ready()
 
     def handle_pong(self, msg):
         # type: (pb.Pong) -> None
         logging.debug("NODE: got pong, {}".format(msg))
         assert (self.state == 'CLIENT')
-        if msg.vk in self.peers.keys():
+        if msg.vk in self.peers:
             logging.debug("NODE: pong: found myself in peers.keys")
             # self.transport.loseConnection()
         self.peers[msg.vk] = (self.transport.getPeer().host, msg.port, self)
         self.remote_vk = msg.vk
+        self.remote_compression = bool(msg.features & FEATURE_COMPRESSION)
+        self.remote_batch = bool(msg.features & FEATURE_BATCH)
+        self.remote_chunk = bool(msg.features & FEATURE_CHUNK)
+        self.remote_fixed = self.config.fixed_codec and bool(msg.features & FEATURE_FIXED)
         logging.debug("NODE: done pong")
+        if self.dial_vk is not None and self.dial_vk != msg.vk:
+            self.factory.pool.lost(self.dial_vk, "reached {} instead".format(b64encode(msg.vk)))
+        self.factory.pool.add(msg.vk, self.transport.getPeer().host, msg.port)
+        self.factory.pool.connected(msg.vk, self)
+        self.factory.check_peers_ready()
 
 
 class MyFactory(Factory):
@@ -187,7 +198,7 @@ class MyFactory(Factory):
     """
     def __init__(self, config):
         # type: (Config) -> None
-        self.peers = {}  # type: Dict[str, Tuple[str, int, MyProto]]
+        self.peers = {}  # type: Dict[str, Tuple[str, int, MyProto]], the connected nodes
         self.promoters = []
         self.config = config
         self.bracha = Bracha(self)  # just for testing
@@ -195,15 +206,44 @@ class MyFactory(Factory):
         self.acs = ACS(self)
         self.tc_runner = TrustChainRunner(self)
         self.vk = self.tc_runner.tc.vk
-        self.q = Queue.Queue()  # (str, msg)
+        self.pool = ConnectionPool(self, config.max_connections)
+        if config.max_connections > 0:
+            # connections that were busy when they were opened are closed once they become idle
+            self.evict_lc = task.LoopingCall(self.pool.evict)
+            self.evict_lc.start(5, False).addErrback(my_err_back)
+        self.peers_ready = Readiness("all expected peers handshaken")
+
+        self.handlers = MessageRegistry()
+        self.handlers.register(pb.ACS, self.handle_acs)
+        self.handlers.register(pb.ACSBatch, self.handle_acs_batch)
+        self.handlers.register(pb.Dummy, self.handle_dummy)
+        # NOTE bracha/mo14 is normally handled by acs, these messages are for testing
+        self.handlers.register(pb.Bracha, self.handle_bracha)
+        self.handlers.register(pb.Mo14, self.handle_mo14)
+        self.tc_runner.register_handlers(self.handlers)
+
+        if config.gossip_ttl > 0:
+            self.gossip_overlay = GossipOverlay(self, config.gossip_ttl)
+            self.handlers.register(pb.Gossip, self.gossip_overlay.handle)
+        else:
+            self.gossip_overlay = None
+
+        self.future_msgs = FutureBuffer(_FUTURE_CAPACITY)  # ACS messages to replay, (remote_vk, msg)
+        self.duplicate_filter = DuplicateFilter(_IDEMPOTENT_MESSAGES)
+        self.compression_stats = CompressionStats()
+        self.lane_stats = LaneStats()
+        if config.sched_budget > 0:
+            self.scheduler = Scheduler([name for name, _ in _PRIORITY_CLASSES], config.sched_budget)
+        else:
+            self.scheduler = None
         self.first_disconnect_logged = False
 
         self._neighbour = None
         self._sorted_peer_keys = None
 
-        # start looping call on the queue
-        self.lc = task.LoopingCall(self.process_queue)
-        self.lc.start(1).addErrback(my_err_back)
+        # messages to ourselves, (tag, obj, size) in the order they were sent
+        self._loopback = deque()
+        self._loopback_scheduled = False
 
         # logging message size
         self.recv_message_log = defaultdict(long)
@@ -213,100 +253,283 @@ class MyFactory(Factory):
         task.LoopingCall(self.log_communication_costs).start(5, False).addErrback(my_err_back)
 
     def log_communication_costs(self, heading="NODE:"):
-        logging.info('{} messages info {{ "sent": {}, "recv": {} }}'
-                     .format(heading, json.dumps(self.sent_message_log), json.dumps(self.recv_message_log)))
-
-    def process_queue(self):
-        # we use counter to stop this routine from running forever,
-        # because self.json_received can put item back into the queue
-        logging.debug("NODE: processing queue, size {}".format(self.q.qsize()))
-        qsize = self.q.qsize()
-        ctr = 0
-        while ctr < qsize:
-            ctr += 1
-            node, m = self.q.get()
-            self.peers[node][2].obj_received(m)
+        logging.info('{} messages info {{ "sent": {}, "recv": {}, "dropped": {}, "compression": {}, "future": {} }}'
+                     .format(heading, json.dumps(self.sent_message_log), json.dumps(self.recv_message_log),
+                             json.dumps(self.duplicate_filter.dropped), json.dumps(self.compression_stats.stats),
+                             json.dumps(self.future_msgs.dropped)))
+        logging.info('{} handlers info {}'.format(heading, json.dumps(self.handlers.stats)))
+        logging.info('{} lanes info {}'.format(heading, json.dumps(self.lane_stats.stats)))
+        if self.gossip_overlay is not None:
+            logging.info('{} gossip info {}'.format(heading, json.dumps(self.gossip_overlay.stats)))
+        logging.info('{} connections info {}'.format(heading, json.dumps(self.pool.stats)))
+        if self.scheduler is not None:
+            logging.info('{} scheduler info {}'.format(heading, json.dumps(self.scheduler.stats)))
+
+    def handle_acs(self, msg, remote_vk):
+        # type: (pb.ACS, str) -> None
+        if self.config.failure != 'omission':
+            res = self.acs.handle(msg, remote_vk)
+            self.process_acs_res(res, msg, remote_vk)
+
+    def handle_acs_batch(self, msg, remote_vk):
+        # type: (pb.ACSBatch, str) -> None
+        if self.config.failure != 'omission':
+            res = self.acs.unbatch(msg)
+            if isinstance(res, Replay):
+                logging.debug("NODE: keeping the batch of round {} for later".format(msg.round))
+                if not self.future_msgs.add(msg.round, None, (remote_vk, msg)):
+                    logging.debug("NODE: future message buffer is full, dropped the batch of round {}"
+                                  .format(msg.round))
+                return
+            for m in res:
+                self.process_acs_res(self.acs.handle(m, remote_vk), m, remote_vk)
+
+    def handle_bracha(self, msg, remote_vk):
+        # type: (pb.Bracha, str) -> None
+        if not self.peers_ready.is_ready:
+            # the promoters are set when we're ready, otherwise our replies would go to nobody
+            self.peers_ready.then(self.handle_bracha, msg, remote_vk)
+        elif self.config.failure != 'omission':
+            self.bracha.handle(msg, remote_vk)
+
+    def handle_mo14(self, msg, remote_vk):
+        # type: (pb.Mo14, str) -> None
+        if not self.peers_ready.is_ready:
+            self.peers_ready.then(self.handle_mo14, msg, remote_vk)
+        elif self.config.failure != 'omission':
+            self.mo14.handle(msg, remote_vk)
+
+    def handle_dummy(self, msg, remote_vk):
+        # type: (pb.Dummy, str) -> None
+        logging.info("NODE: got dummy message from {}".format(b64encode(remote_vk)))
+
+    def process_acs_res(self, o, m, remote_vk):
+        """
+        This function checks whether the result is Replay or Handled.
+        If it's the former, the message is kept in self.future_msgs until ACS releases it (self.release_acs).
+        :param o: the object we're processing
+        :param m: the original message
+        :param remote_vk: the sender of the original message
+        :return:
+        """
+        assert o is not None
+
+        if isinstance(o, Replay):
+            logging.debug("NODE: keeping {} for later".format(m))
+            if not self.future_msgs.add(m.round, m.instance, (remote_vk, m)):
+                logging.debug("NODE: future message buffer is full, dropped {}".format(m))
+        elif isinstance(o, Handled):
+            if self.config.test == 'acs':
+                logging.debug("NODE: testing ACS, not handling the result")
+                return
+            if o.m is not None:
+                logging.debug("NODE: attempting to handle ACS result")
+                self.tc_runner.handle_cons_from_acs(o.m)
+        else:
+            raise AssertionError("instance is not Replay or Handled")
+
+    def release_acs(self, round, instance=None):
+        """
+        Replay the kept messages of an ACS round, or of one instance of it, in the next reactor iteration
+        :param round:
+        :param instance: all the instances if None
+        :return:
+        """
+        msgs = self.future_msgs.release(round, instance)
+        if msgs:
+            logging.debug("NODE: replaying {} messages of round {}".format(len(msgs), round))
+            call_later(0, self._replay_acs, msgs)
+
+    def discard_acs(self, round):
+        """
+        Drop the kept messages of ACS rounds up to and including `round`
+        :param round:
+        :return:
+        """
+        self.future_msgs.discard(round)
+
+    def _replay_acs(self, msgs):
+        for remote_vk, m in msgs:
+            if isinstance(m, pb.ACSBatch):
+                self.handle_acs_batch(m, remote_vk)
+            else:
+                self.handle_acs(m, remote_vk)
 
     def buildProtocol(self, addr):
         return MyProto(self)
 
     def new_connection_if_not_exist(self, nodes):
+        """
+        Add the nodes to the address book, and connect to them unless connections are opened on demand
+        :param nodes: key: b64 encoded vk, val: host:port
+        :return:
+        """
         for _vk, addr in nodes.iteritems():
             vk = b64decode(_vk)
-            if vk not in self.peers.keys() and vk != self.vk:
-                host, port = addr.split(":")
-                self.make_new_connection(host, int(port))
+            host, port = addr.split(":")
+            self.pool.add(vk, host, int(port))
+            if self.config.max_connections == 0 and vk not in self.peers and vk != self.vk:
+                self.pool.connect(vk)
             else:
-                logging.debug("NODE: client {},{} already exist".format(b64encode(vk), addr))
+                logging.debug("NODE: client {},{} already exist or not needed yet".format(b64encode(vk), addr))
+        self.check_peers_ready()
+
+    def check_peers_ready(self):
+        """
+        With full-mesh connections we're ready when we have handshaken with the whole population,
+        otherwise it's enough to know the whole population since the connections are opened on demand
+        :return:
+        """
+        if self.peers_ready.is_ready:
+            return
+        if self.config.max_connections == 0:
+            known = len(self.peers)
+        else:
+            known = len(self.pool.address_book)
+        if known >= self.config.population:
+            self.peers_ready.set()
+
+    def peers_ready_timeout(self):
+        if not self.peers_ready.is_ready:
+            logging.warning("NODE: only {} peers and {} members after {} s, starting anyway"
+                            .format(len(self.peers), len(self.members), _READY_TIMEOUT))
+            self.peers_ready.set()
+
+    @property
+    def members(self):
+        """
+        The verification keys of all the known nodes, including myself, connected or not
+        :return:
+        """
+        return self.pool.members
 
-    def make_new_connection(self, host, port):
+    def make_new_connection(self, host, port, vk=None):
+        """
+        :param host:
+        :param port:
+        :param vk: the node we expect to reach, if given the caller handles connection failures
+        :return: the Deferred of the connection
+        """
         logging.debug("NODE: making client connection {}:{}".format(host, port))
         point = TCP4ClientEndpoint(reactor, host, port, timeout=90)
         proto = MyProto(self)
+        proto.dial_vk = vk
         d = connectProtocol(point, proto)
-        d.addCallback(got_protocol).addErrback(my_err_back)
+        d.addCallback(got_protocol)
+        if vk is None:
+            d.addErrback(my_err_back)
+        return d
 
     def bcast(self, msg):
         """
-        Broadcast a message to all nodes in self.peers, the list should include myself
+        Broadcast a message to all the members, including myself.
+        The functions that send to more than one node serialize the message only once.
         :param msg:
         :return:
         """
-        for k, v in self.peers.iteritems():
-            proto = v[2]
-            proto.send_obj(msg)
+        frame = Frame.of(msg)
+        for node in self.members:
+            self.send(node, frame)
 
     def promoter_cast(self, msg):
+        frame = Frame.of(msg)
         for promoter in self.promoters:
-            self.send(promoter, msg)
+            self.send(promoter, frame)
 
     def promoter_cast_t(self, msg):
+        frame = Frame.of(msg)
         for promoter in random.sample(self.promoters, self.config.t + 1):
-            self.send(promoter, msg)
+            self.send(promoter, frame)
 
     def non_promoter_cast(self, msg):
-        for node in set(self.peers.keys()) - set(self.promoters):
-            self.send(node, msg)
+        frame = Frame.of(msg)
+        for node in set(self.members) - set(self.promoters):
+            self.send(node, frame)
 
     def gossip(self, msg):
         """
-        Receivers of the gossiped currently needs to manually decide whether it wants to forward it.
-        TODO create a special gossip message type and do the gossiping/forwarding on the base class.
-        :param msg: 
-        :return: 
+        Disseminate a message to the whole population, including myself, through the gossip overlay,
+        the receivers forward it so it must be safe to handle it more than once.
+        Falls back to bcast if gossip is disabled.
+        :param msg:
+        :return:
         """
-        fan_out = min(self.config.fan_out, len(self.peers.keys()))
-        for node in random.sample(self.peers.keys(), fan_out):
-            self.send(node, msg)
+        if self.gossip_overlay is None:
+            self.bcast(msg)
+        else:
+            self.gossip_overlay.publish(msg)
 
     def gossip_except(self, exception, msg):
-        new_set = set(self.peers.keys()) - set(exception)
+        frame = Frame.of(msg)
+        new_set = set(self.members) - set(exception)
         fan_out = min(self.config.fan_out, len(new_set))
         nodes = random.sample(new_set, fan_out)
         for node in nodes:
-            self.send(node, msg)
+            self.send(node, frame)
 
     def multicast(self, nodes, msg):
+        frame = Frame.of(msg)
         for node in nodes:
-            self.send(node, msg)
+            self.send(node, frame)
 
     def send(self, node, msg):
-        proto = self.peers[node][2]
-        proto.send_obj(msg)
+        """
+        :param node: the vk of the receiver
+        :param msg: a protobuf object, a ProtobufWrapper or a Frame
+        :return:
+        """
+        if node == self.vk:
+            self.send_loopback(msg)
+            return
+        peer = self.peers.get(node)
+        if peer is None:
+            self.pool.send(node, Frame.of(msg))
+        else:
+            peer[2].send_frame(Frame.of(msg))
+
+    def send_loopback(self, msg):
+        """
+        Deliver a message to our own handlers on the next reactor iteration without serializing it,
+        the TCP connection to ourselves is only used for the membership.
+        The sizes are still recorded in the message logs as if the message went through the network.
+        :param msg: a protobuf object, a ProtobufWrapper or a Frame
+        :return:
+        """
+        if isinstance(msg, Frame):
+            obj, size = msg.obj, msg.size
+        else:
+            obj, size = msg, msg.ByteSize()
+        if isinstance(obj, ProtobufWrapper):
+            obj = obj.pb
+
+        name = obj.__class__.__name__
+        self.sent_message_log[name] += size
+        self._loopback.append((_PB_NAME_TO_TAG[name], obj, size))
+        if not self._loopback_scheduled:
+            self._loopback_scheduled = True
+            call_later(0, self._deliver_loopback)
+
+    def _deliver_loopback(self):
+        self._loopback_scheduled = False
+        # messages that the handlers send to ourselves are delivered in the next iteration
+        for _ in xrange(len(self._loopback)):
+            tag, obj, size = self._loopback.popleft()
+            self.handlers.dispatch(tag, obj, self.vk)
+            self.recv_message_log[obj.__class__.__name__] += size
 
     def overwrite_promoters(self):
         """
         sets all peers to promoters, only use this method for testing
         :return:
         """
-        logging.debug("NODE: overwriting promoters {}".format(len(self.peers)))
-        self.promoters = self.peers.keys()
+        logging.debug("NODE: overwriting promoters {}".format(len(self.members)))
+        self.promoters = list(self.members)
 
     @property
     def random_node(self):
-        node = random.choice(self.peers.keys())
+        node = random.choice(self.members)
         while node == self.vk:
-            node = random.choice(self.peers.keys())
+            node = random.choice(self.members)
         return node
 
     @property
@@ -323,12 +546,12 @@ class MyFactory(Factory):
     @property
     def sorted_peer_keys(self):
         if self._sorted_peer_keys is None:
-            self._sorted_peer_keys = sorted(self.peers.keys())
+            self._sorted_peer_keys = sorted(self.members)
         return self._sorted_peer_keys
 
     def handle_instruction(self, msg):
         """
-        The msg.delay need to be long enough such that the ping/pong messages are finished
+        The msg.delay counts from when the expected peers are ready, 0 starts as soon as they are
         :param msg: 
         :return: 
         """
@@ -336,7 +559,10 @@ class MyFactory(Factory):
         logging.info("NODE: handling instruction - {}".format(msg).replace('\n', ','))
         self.config.from_instruction = True
 
-        call_later(msg.delay, self.tc_runner.bootstrap_promoters)
+        def later(delay, f, *args):
+            self.peers_ready.then(call_later, delay, f, *args)
+
+        later(msg.delay, self.tc_runner.bootstrap_promoters)
 
         if msg.instruction == 'bootstrap-only':
             pass
@@ -344,32 +570,31 @@ class MyFactory(Factory):
         elif msg.instruction == 'tx':
             rate = float(msg.param)
             interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, False)
+            later(msg.delay, self.tc_runner.make_tx, interval, False)
 
         elif msg.instruction == 'tx-validate':
             rate = float(msg.param)
             interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, False)
-            call_later(msg.delay + 10, self.tc_runner.make_validation, interval)
+            later(msg.delay, self.tc_runner.make_tx, interval, False)
+            later(msg.delay + 10, self.tc_runner.make_validation, interval)
 
         elif msg.instruction == 'tx-random':
             rate = float(msg.param)
             interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, True)
+            later(msg.delay, self.tc_runner.make_tx, interval, True)
 
         elif msg.instruction == 'tx-random-validate':
             rate = float(msg.param)
             interval = 1.0 / rate
-            call_later(msg.delay, self.tc_runner.make_tx, interval, True)
-            call_later(msg.delay + 10, self.tc_runner.make_validation, interval)
+            later(msg.delay, self.tc_runner.make_tx, interval, True)
+            later(msg.delay + 10, self.tc_runner.make_validation, interval)
 
         else:
             raise AssertionError("Invalid instruction msg {}".format(msg))
 
 
 def got_protocol(p):
-    # this needs to be lower than the deferLater in `run`
-    call_later(1, p.send_ping)
+    p.send_ping()
 
 
 class Config(object):
@@ -378,7 +603,9 @@ class Config(object):
     Should be singleton
     """
     def __init__(self, port, n, t, population, test, value, failure, tx_rate, fan_out, validate,
-                 ignore_promoter, auto_byzantine):
+                 ignore_promoter, auto_byzantine, cons_horizon=0, flush_threshold=0,
+                 compression_threshold=0, sched_budget=0.0, chunk_size=0, gossip_ttl=0, max_connections=0,
+                 ec_backend='pyeclib', ec_threads=0, batch_votes=False, fixed_codec=False):
         """
         This only stores the config necessary at runtime, so not necessarily all the information from argparse
         :param port:
@@ -390,6 +617,17 @@ class Config(object):
         :param failure:
         :param tx_rate:
         :param auto_byzantine:
+        :param cons_horizon: number of recent consensus results kept in full, older ones are compacted, 0 disables
+        :param flush_threshold: coalesce outgoing frames until there are this many bytes, 0 disables
+        :param compression_threshold: compress messages of at least this many bytes, 0 disables
+        :param sched_budget: seconds per reactor iteration spent on prioritised inbound messages, 0 disables
+        :param chunk_size: send messages larger than this many bytes in chunks, 0 disables
+        :param gossip_ttl: number of hops of gossiped messages, 0 disables gossip and uses bcast instead
+        :param max_connections: open connections on demand and close idle ones above this many, 0 uses a full mesh
+        :param ec_backend: the erasure coding library of Bracha, every node must use the same one
+        :param ec_threads: erasure code on a pool of this many threads instead of the reactor thread, 0 disables
+        :param batch_votes: send the BA votes of ACS that are cast in one reactor iteration in one message
+        :param fixed_codec: send the small consensus messages in their fixed layouts to the peers that support them
         """
         self.port = port
         self.n = n
@@ -417,10 +655,45 @@ class Config(object):
 
         self.auto_byzantine = auto_byzantine
 
+        assert cons_horizon >= 0
+        self.cons_horizon = cons_horizon
+
+        assert flush_threshold >= 0
+        self.flush_threshold = flush_threshold
+
+        assert compression_threshold >= 0
+        self.compression_threshold = compression_threshold
+
+        assert sched_budget >= 0
+        self.sched_budget = sched_budget
+
+        assert chunk_size >= 0
+        self.chunk_size = chunk_size
+
+        assert gossip_ttl >= 0
+        self.gossip_ttl = gossip_ttl
+
+        assert max_connections >= 0
+        self.max_connections = max_connections
+
+        assert ec_backend in EC_BACKENDS
+        assert ec_backend != 'pyeclib' or n <= 32, "pyeclib supports at most 32 promoters"
+        self.ec_backend = ec_backend
+
+        assert ec_threads >= 0
+        self.ec_threads = ec_threads
+
+        self.batch_votes = batch_votes
+
+        self.fixed_codec = fixed_codec
+
 
 def run(config, bcast, discovery_addr):
     f = MyFactory(config)
 
+    if config.ec_threads > 0:
+        reactor.suggestThreadPoolSize(config.ec_threads)
+
     try:
         port = reactor.listenTCP(config.port, f)
         config.port = port.getHost().port
@@ -431,34 +704,37 @@ def run(config, bcast, discovery_addr):
     # connect to discovery server
     point = TCP4ClientEndpoint(reactor, discovery_addr, 8123, timeout=90)
     d = connectProtocol(point, Discovery({}, f))
-    d.addCallback(got_discovery, b64encode(f.vk), config.port).addErrback(my_err_back)
+    # with full-mesh connections the nodes that join later connect to us, otherwise we need to learn about them
+    d.addCallback(got_discovery, b64encode(f.vk), config.port, config.max_connections > 0).addErrback(my_err_back)
 
     # connect to myself
     point = TCP4ClientEndpoint(reactor, "localhost", config.port, timeout=90)
     d = connectProtocol(point, MyProto(f))
     d.addCallback(got_protocol).addErrback(my_err_back)
 
+    call_later(_READY_TIMEOUT, f.peers_ready_timeout)
+
     if bcast:
-        call_later(5, f.overwrite_promoters)
+        f.peers_ready.first(f.overwrite_promoters)
 
     # optionally run tests, args.test == None implies reactive node
-    # we use call later to wait until the nodes are registered
+    # we wait until the nodes are registered, the functions run in the order in which they are added
     if config.test == 'dummy':
-        call_later(5, f.bcast, pb.Dummy(m='z'))
+        f.peers_ready.then(f.bcast, pb.Dummy(m='z'))
     elif config.test == 'bracha':
-        call_later(6, f.bracha.bcast_init)
+        f.peers_ready.then(f.bracha.bcast_init)
     elif config.test == 'mo14':
-        call_later(6, f.mo14.start, config.value)
+        f.peers_ready.then(f.mo14.start, config.value)
     elif config.test == 'acs':
         # use port number (unique on local network) as test message
-        call_later(6, f.acs.start, str(config.port), 1)
+        f.peers_ready.then(f.acs.start, str(config.port), 1)
     elif config.test == 'tc':
-        call_later(5, f.tc_runner.make_tx, 1.0 / config.tx_rate, True)
+        f.peers_ready.then(f.tc_runner.make_tx, 1.0 / config.tx_rate, True)
         # optionally use validate
         if config.validate:
-            call_later(10, f.tc_runner.make_validation)
+            f.peers_ready.then(call_later, 5, f.tc_runner.make_validation)
     elif config.test == 'bootstrap':
-        call_later(5, f.tc_runner.bootstrap_promoters)
+        f.peers_ready.then(f.tc_runner.bootstrap_promoters)
 
     logging.info("NODE: reactor starting on port {}".format(config.port))
     reactor.run()
@@ -515,6 +791,44 @@ if __name__ == '__main__':
         default=10,
         help='fan-out parameter for gossiping'
     )
+    parser.add_argument(
+        '--gossip-ttl',
+        type=int,
+        metavar='HOPS',
+        default=6,
+        help='disseminate consensus results and signatures by gossip for at most HOPS hops, 0 uses broadcast'
+    )
+    parser.add_argument(
+        '--max-connections',
+        type=int,
+        metavar='N',
+        default=0,
+        help='connect to peers on demand and close idle connections above N, 0 connects to every node'
+    )
+    parser.add_argument(
+        '--ec-backend',
+        choices=EC_BACKENDS,
+        default='pyeclib',
+        help='the erasure coding library, numpy supports more than 32 promoters, all nodes must use the same one'
+    )
+    parser.add_argument(
+        '--ec-threads',
+        type=int,
+        metavar='THREADS',
+        default=2,
+        help='erasure code on a pool of THREADS threads so that the reactor keeps handling messages, 0 disables'
+    )
+    parser.add_argument(
+        '--no-batch-votes',
+        dest='batch_votes',
+        action='store_false',
+        help='send every BA vote of ACS in its own message instead of batching the votes of one reactor iteration'
+    )
+    parser.add_argument(
+        '--fixed-codec',
+        action='store_true',
+        help='send the small consensus messages in fixed struct layouts, faster only with the pure Python protobuf'
+    )
     parser.add_argument(
         '--ignore-promoter',
         action='store_true',
@@ -536,6 +850,41 @@ if __name__ == '__main__':
         help='automatically become Byzantine during experiment',
         action='store_true'
     )
+    parser.add_argument(
+        '--cons-horizon',
+        type=int,
+        metavar='ROUNDS',
+        default=10,
+        help='keep the consensus results of the last ROUNDS rounds in full, compact older ones, 0 disables'
+    )
+    parser.add_argument(
+        '--flush-threshold',
+        type=int,
+        metavar='BYTES',
+        default=64 * 1024,
+        help='coalesce the frames sent in one reactor iteration until there are BYTES bytes, 0 disables'
+    )
+    parser.add_argument(
+        '--compression-threshold',
+        type=int,
+        metavar='BYTES',
+        default=16 * 1024,
+        help='compress messages of at least BYTES bytes when the peer supports it, 0 disables'
+    )
+    parser.add_argument(
+        '--sched-budget',
+        type=float,
+        metavar='SECONDS',
+        default=0.02,
+        help='handle inbound messages in order of priority, for at most SECONDS per reactor iteration, 0 disables'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        metavar='BYTES',
+        default=64 * 1024,
+        help='send messages larger than BYTES bytes in chunks when the peer supports it, 0 disables'
+    )
     parser.add_argument(
         '--test',
         choices=['dummy', 'bracha', 'mo14', 'acs', 'tc', 'bootstrap'],
@@ -576,7 +925,10 @@ if __name__ == '__main__':
 
     def _run():
         run(Config(args.port, args.n, args.t, args.population, args.test, args.value, args.failure, args.tx_rate,
-                   args.fan_out, args.validate, args.ignore_promoter, args.auto_byzantine),
+                   args.fan_out, args.validate, args.ignore_promoter, args.auto_byzantine, args.cons_horizon,
+                   args.flush_threshold, args.compression_threshold, args.sched_budget, args.chunk_size,
+                   args.gossip_ttl, args.max_connections, args.ec_backend, args.ec_threads,
+                   args.batch_votes, args.fixed_codec),
             args.broadcast, args.discovery)
 
     if args.timeout != 0:
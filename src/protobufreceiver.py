@@ -1,27 +1,555 @@
-from struct import pack, unpack
+import time
+import zlib
+from collections import OrderedDict, defaultdict, deque
+from struct import Struct
 
-from twisted.protocols.basic import Int32StringReceiver
+import libnacl
+from twisted.internet import reactor
+from twisted.internet.protocol import Protocol
+from typing import Dict, List, Tuple, Union
 
-from google.protobuf.message import Message
 import src.messages.messages_pb2 as pb
+from src.messages import fixed
 
-_PB_PAIRS = [(k, v) for k, v in vars(pb).iteritems() if isinstance(v, type) and issubclass(v, Message)]
-_PB_TAG_TO_TUPLE = {_tag: _v for _tag, _v in enumerate(_PB_PAIRS)}
-_PB_NAME_TO_TAG = {_v[0]:  _tag for _tag, _v in _PB_TAG_TO_TUPLE.iteritems()}
-assert len(_PB_PAIRS) == 21
+# the type tags are part of the wire format, so they are assigned explicitly,
+# a tag must never be reused or renumbered, new message types get new tags
+_PB_TAGS = [
+    (1, pb.Dummy),
+    (2, pb.Discover),
+    (3, pb.DiscoverReply),
+    (4, pb.Instruction),
+    (5, pb.Ping),
+    (6, pb.Pong),
+    (7, pb.Bracha),
+    (8, pb.Mo14),
+    (9, pb.ACS),
+    (10, pb.TxBlock),
+    (11, pb.TxReq),
+    (12, pb.TxResp),
+    (13, pb.CpBlock),
+    (14, pb.CpBlocks),
+    (15, pb.Signature),
+    (16, pb.SigWithRound),
+    (17, pb.Cons),
+    (18, pb.AskCons),
+    (19, pb.AskConsRange),
+    (20, pb.ValidationReq),
+    (21, pb.CompactBlock),
+    (22, pb.ValidationResp),
+    (23, pb.Gossip),
+    (24, pb.ACSBatch),
+]
+_PB_TAG_TO_TUPLE = {_tag: (_cls.__name__, _cls) for _tag, _cls in _PB_TAGS}
+_PB_NAME_TO_TAG = {_v[0]: _tag for _tag, _v in _PB_TAG_TO_TUPLE.iteritems()}
+assert len(_PB_TAG_TO_TUPLE) == len(_PB_NAME_TO_TAG) == len(_PB_TAGS)
 
+# the fixed layouts of some small messages also have tags, a frame with one of these tags carries a message of the
+# codec's type in the layout, the receiver decodes it and handles it as if it had the tag of that type,
+# the layouts are tried in order and the first one that fits is used
+_FIXED_TAGS = [
+    (25, fixed.Mo14Codec()),
+    (26, fixed.BrachaReadyCodec()),
+    (27, fixed.ACSMo14Codec()),
+    (28, fixed.ACSBrachaReadyCodec()),
+]
+_FIXED_TAG_TO_CODEC = dict(_FIXED_TAGS)
+FIXED_TAG_TO_TAG = {_tag: _PB_NAME_TO_TAG[_codec.cls.__name__] for _tag, _codec in _FIXED_TAGS}
+_TAG_TO_FIXED = defaultdict(list)  # key: tag of a type, val: [(fixed tag, codec)]
+for _tag, _codec in _FIXED_TAGS:
+    _TAG_TO_FIXED[_PB_NAME_TO_TAG[_codec.cls.__name__]].append((_tag, _codec))
+assert len(_FIXED_TAG_TO_CODEC) == len(_FIXED_TAGS) and not set(_FIXED_TAG_TO_CODEC) & set(_PB_TAG_TO_TUPLE)
 
-class ProtobufReceiver(Int32StringReceiver):
+# every frame is prefixed by its length, which does not include the prefix
+_PREFIX = Struct("!I")
+
+# every frame starts with a header byte, the upper 4 bits are the version and the lower 4 bits are flags,
+# followed by the type tag and then the payload
+_HEADER = Struct("!BH")
+_FRAME_VERSION = 2
+_FLAG_COMPRESSED = 0x1
+_FLAG_BATCH = 0x2
+_FLAG_CHUNK = 0x4
+_FLAG_FINAL = 0x8
+
+# a batch frame has the tag 0 and its payload is a sequence of entries,
+# every entry is the flags and the type tag of one message, the length of its payload and then the payload,
+# the entry header is smaller than a frame header so that batching small messages also saves bytes
+_BATCH_TAG = 0
+_ENTRY = Struct("!BHH")
+_MAX_ENTRY_LENGTH = 0xffff
+assert _BATCH_TAG not in _PB_TAG_TO_TUPLE and _BATCH_TAG not in _FIXED_TAG_TO_CODEC
+
+# a large message can be split into chunk frames, they have the tag of the message and the CHUNK flag,
+# the last one also has the FINAL flag and the COMPRESSED flag applies to the reassembled payload,
+# the payload of a chunk frame is the stream, i.e. the sender's lane, followed by the data
+_CHUNK = Struct("!B")
+
+# bits of the features field in Ping and Pong
+FEATURE_COMPRESSION = 0x1
+FEATURE_BATCH = 0x2
+FEATURE_CHUNK = 0x4
+FEATURE_FIXED = 0x8
+
+_COMPRESSION_LEVEL = 1
+
+
+class DuplicateFilter(object):
+    """
+    Bounded cache of the digests of recently received frames, it is meant to be shared by all the connections.
+    Only message types whose handlers are idempotent should be filtered,
+    i.e. types where a second identical copy, possibly from another sender, has no effect.
+    """
+    def __init__(self, names, capacity=8192):
+        self._tags = {_PB_NAME_TO_TAG[name] for name in names}
+        self._capacity = capacity
+        self._seen = OrderedDict()  # keys are (tag, digest), ordered from oldest to newest
+        self.dropped = defaultdict(long)  # key: message name, val: number of dropped frames
+
+    def is_duplicate(self, tag, frame):
+        # type: (int, Union[str, buffer]) -> bool
+        """
+        Check whether we have recently seen the frame, remember it if we haven't.
+        :param tag: the decoded type tag
+        :param frame: the raw payload, a string or a buffer into the receive buffer
+        :return: True if the frame should be dropped
+        """
+        if tag not in self._tags:
+            return False
+
+        key = (tag, libnacl.crypto_generichash(str(frame)))
+        if key in self._seen:
+            self.dropped[_PB_TAG_TO_TUPLE[tag][0]] += 1
+            return True
+
+        self._seen[key] = None
+        if len(self._seen) > self._capacity:
+            self._seen.popitem(last=False)
+        return False
+
+
+class MessageRegistry(object):
+    """
+    Table of message handlers indexed by type tag, subsystems register a handler for every message type they handle.
+    Handlers are called with the message and the vk of the sender,
+    the number of calls and the cumulative time is collected per message type.
+    """
+    def __init__(self):
+        self._handlers = {}  # key: tag, val: handler
+        self.calls = defaultdict(long)  # key: message name, val: number of calls
+        self.time = defaultdict(float)  # key: message name, val: cumulative time in seconds
+
+    def register(self, cls, f):
+        """
+        :param cls: the protobuf message class
+        :param f: the handler, called as f(msg, remote_vk)
+        :return:
+        """
+        tag = _PB_NAME_TO_TAG[cls.__name__]
+        assert tag not in self._handlers, "handler for {} already registered".format(cls.__name__)
+        self._handlers[tag] = f
+
+    def dispatch(self, tag, obj, remote_vk):
+        if tag not in self._handlers:
+            raise AssertionError("invalid message type {}".format(obj))
+
+        start = time.time()
+        self._handlers[tag](obj, remote_vk)
+
+        name = _PB_TAG_TO_TUPLE[tag][0]
+        self.calls[name] += 1
+        self.time[name] += time.time() - start
+
+    @property
+    def stats(self):
+        return {k: {"calls": v, "time": self.time[k]} for k, v in self.calls.iteritems()}
+
+
+class CompressionStats(object):
+    """
+    Size and CPU time of the compressed frames per message type
+    """
+    def __init__(self):
+        self._raw = defaultdict(long)
+        self._compressed = defaultdict(long)
+        self._compress_time = defaultdict(float)
+        self._decompress_time = defaultdict(float)
+
+    def add_compress(self, name, raw, compressed, elapsed):
+        self._raw[name] += raw
+        self._compressed[name] += compressed
+        self._compress_time[name] += elapsed
+
+    def add_decompress(self, name, elapsed):
+        self._decompress_time[name] += elapsed
+
+    @property
+    def stats(self):
+        return {k: {"ratio": float(self._compressed[k]) / v if v > 0 else 1.0,
+                    "compress_time": self._compress_time[k],
+                    "decompress_time": self._decompress_time[k]}
+                for k, v in self._raw.iteritems()}
+
+
+class LaneStats(object):
+    """
+    Head-of-line blocking of the outbound lanes, i.e. how long frames wait in their lane until they start to be
+    written, it is meant to be shared by all the connections.
+    """
+    def __init__(self):
+        self._frames = defaultdict(long)  # key: lane name
+        self._total = defaultdict(float)  # key: lane name, val: seconds
+        self._max = defaultdict(float)  # key: lane name, val: seconds
+
+    def add(self, lane, delay):
+        self._frames[lane] += 1
+        self._total[lane] += delay
+        self._max[lane] = max(self._max[lane], delay)
+
+    @property
+    def stats(self):
+        return {k: {"frames": v, "mean_blocking": self._total[k] / v, "max_blocking": self._max[k]}
+                for k, v in self._frames.iteritems()}
+
+
+class Frame(object):
+    """
+    A message that is serialized and framed only once, the same frame can then be written to many connections.
+    The message can be a protobuf object or a ProtobufWrapper, the latter reuses its cached serialization.
+    The compressed form and the fixed layout are also computed at most once.
+    """
+    def __init__(self, obj, tag=None, payload=None):
+        """
+        :param obj:
+        :param tag: the tag of a fixed layout, the type's tag if None
+        :param payload: the message in the fixed layout, it's serialized if None
+        """
+        self.obj = obj
+        self.name = obj.__class__.__name__
+        self.tag = _PB_NAME_TO_TAG[self.name] if tag is None else tag
+        self._payload = obj.SerializeToString() if payload is None else payload
+        self.size = len(self._payload)  # same as obj.ByteSize() unless it's a fixed layout, excludes the framing
+        self._data = None
+        self._compressed_payload = None
+        self._compressed_data = None
+        self._fixed = None if tag is None else self
+
+    def fixed(self):
+        # type: () -> Frame
+        """
+        :return: the frame of the message in the first fixed layout that fits, or this frame if none does
+        """
+        if self._fixed is None:
+            self._fixed = self
+            for tag, codec in _TAG_TO_FIXED.get(self.tag, ()):
+                if codec.fits(self.obj):
+                    self._fixed = Frame(self.obj, tag, codec.encode(self.obj))
+                    break
+        return self._fixed
+
+    def _frame(self, flags, payload):
+        return ''.join([_PREFIX.pack(len(payload) + _HEADER.size),
+                        _HEADER.pack(_FRAME_VERSION << 4 | flags, self.tag),
+                        payload])
+
+    def _compress(self, stats):
+        if self._compressed_payload is None:
+            start = time.time()
+            payload = zlib.compress(self._payload, _COMPRESSION_LEVEL)
+            if stats is not None:
+                stats.add_compress(self.name, self.size, min(len(payload), self.size), time.time() - start)
+            # keep the uncompressed payload if compression does not make it smaller
+            self._compressed_payload = payload if len(payload) < self.size else self._payload
+
+    def payload(self, compress=False, stats=None):
+        # type: (bool, CompressionStats) -> Tuple[int, str]
+        """
+        The flags and the payload without any framing, used for the entries of a batch frame
+        :param compress: whether to compress the payload
+        :param stats: optionally record the compression ratio and time
+        :return:
+        """
+        if compress:
+            self._compress(stats)
+            if self._compressed_payload is not self._payload:
+                return _FLAG_COMPRESSED, self._compressed_payload
+        return 0, self._payload
+
+    @property
+    def data(self):
+        # type: () -> str
+        if self._data is None:
+            self._data = self._frame(0, self._payload)
+        return self._data
+
+    def compressed_data(self, stats=None):
+        # type: (CompressionStats) -> str
+        """
+        The frame with a compressed payload, or the uncompressed frame if compression does not make it smaller
+        :param stats: optionally record the compression ratio and time
+        :return:
+        """
+        if self._compressed_data is None:
+            flags, payload = self.payload(True, stats)
+            self._compressed_data = self._frame(flags, payload) if flags else self.data
+        return self._compressed_data
+
+    @classmethod
+    def of(cls, msg):
+        """
+        Frame the message unless it is a frame already
+        :param msg:
+        :return:
+        """
+        if isinstance(msg, Frame):
+            return msg
+        return cls(msg)
+
+
+def batch_frame(entries, stats=None):
+    # type: (List[Tuple[Frame, bool]], CompressionStats) -> str
+    """
+    Pack many messages into one batch frame, i.e. under a single length prefix and header
+    :param entries: the frames and whether they should be compressed, the payloads must fit in _MAX_ENTRY_LENGTH
+    :param stats: optionally record the compression ratio and time
+    :return:
+    """
+    parts = [None, None]
+    for frame, compress in entries:
+        flags, payload = frame.payload(compress, stats)
+        parts.append(_ENTRY.pack(flags, frame.tag, len(payload)))
+        parts.append(payload)
+    length = _HEADER.size + sum(len(part) for part in parts[2:])
+    parts[0] = _PREFIX.pack(length)
+    parts[1] = _HEADER.pack(_FRAME_VERSION << 4 | _FLAG_BATCH, _BATCH_TAG)
+    return ''.join(parts)
+
+
+def chunk_frame(tag, flags, stream, data):
+    # type: (int, int, int, str) -> str
+    """
+    Frame one chunk of a large message
+    :param tag: the type tag of the message
+    :param flags: the flags of the message, CHUNK is always added
+    :param stream: identifies the message that the chunk belongs to, at most one message per stream is in flight
+    :param data:
+    :return:
+    """
+    return ''.join([_PREFIX.pack(_HEADER.size + _CHUNK.size + len(data)),
+                    _HEADER.pack(_FRAME_VERSION << 4 | flags | _FLAG_CHUNK, tag),
+                    _CHUNK.pack(stream),
+                    data])
+
+
+class ProtobufReceiver(Protocol):
+    """
+    Length prefixed protobuf messages, see Frame for the wire format.
+    Partial frames are accumulated in a single bytearray and every complete frame is parsed straight from the
+    received data or from that bytearray, so a frame is never copied by the framing layer after it is buffered,
+    no matter how many reads it takes to arrive.
+    """
 
     MAX_LENGTH = 20 * 1024 * 1024  # in bytes
 
+    duplicate_filter = None  # type: DuplicateFilter
+
+    # frames with a payload of at least compression_threshold bytes are compressed if the remote supports it,
+    # 0 disables compression
+    compression_threshold = 0
+    remote_compression = False
+    compression_stats = None  # type: CompressionStats
+
+    # whether the remote accepts batch frames, they are used when coalescing
+    remote_batch = False
+
+    # whether the remote decodes the fixed layouts, they are then used for the messages that fit
+    remote_fixed = False
+
+    # frames sent in the same reactor iteration are coalesced into one write until there are flush_threshold bytes,
+    # 0 disables coalescing
+    flush_threshold = 0
+    _flush_call = None
+
+    # outbound frames wait in lanes, tag_lanes maps a type tag to a lane, lane 0 has the highest priority and
+    # it is also used for the tags that are not in tag_lanes,
+    # the lanes are emptied into the transport in order of priority for as long as the transport accepts data
+    lane_names = ('default',)
+    tag_lanes = {}
+    lane_stats = None  # type: LaneStats
+    _lanes = None  # type: List[deque]
+    _queued = 0
+    _paused = False
+
+    # messages larger than chunk_size bytes are sent in chunks if the remote supports it, so that frames of a higher
+    # priority lane can be written between the chunks, 0 disables chunking
+    chunk_size = 0
+    remote_chunk = False
+    _chunk_offsets = None  # type: List[int]
+
+    _buffer = None  # type: bytearray
+    _chunks = None  # type: Dict[int, List[str]]
+
+    def connectionMade(self):
+        # the transport tells us when its buffer is full, frames are kept in the lanes until then
+        self.transport.registerProducer(self, True)
+
     def connectionLost(self, reason):
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
         self.connection_lost(reason)
 
+    def pauseProducing(self):
+        self._paused = True
+
+    def resumeProducing(self):
+        self._paused = False
+        self._write_lanes()
+
+    def stopProducing(self):
+        self._paused = True
+
+    def dataReceived(self, data):
+        # without a partial frame from an earlier read the frames are parsed from data directly
+        if self._buffer is None:
+            buf = data
+        else:
+            buf = self._buffer
+            buf.extend(data)
+
+        # parse every complete frame before the processed bytes are discarded
+        offset = 0
+        end = len(buf)
+        while end - offset >= _PREFIX.size:
+            length, = _PREFIX.unpack_from(buf, offset)
+            if length > self.MAX_LENGTH:
+                self.lengthLimitExceeded(length)
+            if end - offset - _PREFIX.size < length:
+                break
+            offset += _PREFIX.size
+            self._frame_received(buf, offset, offset + length)
+            offset += length
+
+        if offset == end:
+            self._buffer = None
+        elif self._buffer is None:
+            self._buffer = bytearray(buffer(buf, offset))
+        elif offset > 0:
+            del buf[:offset]
+
     def stringReceived(self, string):
-        tag, = unpack("H", string[:2])
+        """
+        Handle one frame without the length prefix
+        :param string:
+        :return:
+        """
+        self._frame_received(string, 0, len(string))
+
+    def _frame_received(self, data, start, end):
+        # type: (Union[str, bytearray], int, int) -> None
+        """
+        Decode the frame data[start:end], the payloads are handed to protobuf as buffers so they are not copied
+        :param data:
+        :param start:
+        :param end:
+        :return:
+        """
+        if end - start < _HEADER.size:
+            raise IOError("Truncated frame, len: {}".format(end - start))
+        header, tag = _HEADER.unpack_from(data, start)
+        if header >> 4 != _FRAME_VERSION:
+            raise IOError("Unsupported frame version {}".format(header >> 4))
+
+        offset = start + _HEADER.size
+        if header & _FLAG_CHUNK:
+            self._chunk_received(header, tag, data, offset, end)
+        elif header & _FLAG_BATCH:
+            # all the entries are decoded in one pass over the frame
+            while offset < end:
+                if offset + _ENTRY.size > end:
+                    raise IOError("Truncated batch entry header")
+                flags, tag, length = _ENTRY.unpack_from(data, offset)
+                offset += _ENTRY.size
+                if offset + length > end:
+                    raise IOError("Truncated batch entry, len: {}".format(length))
+                self._payload_received(flags, tag, buffer(data, offset, length))
+                offset += length
+        else:
+            self._payload_received(header & 0xf, tag, buffer(data, offset, end - offset))
+
+    def _chunk_received(self, header, tag, data, start, end):
+        if end - start < _CHUNK.size:
+            raise IOError("Truncated chunk")
+        stream, = _CHUNK.unpack_from(data, start)
+        start += _CHUNK.size
+
+        if self._chunks is None:
+            self._chunks = {}
+        # the chunk is copied because it is kept after the receive buffer changes
+        chunks = self._chunks.setdefault(stream, [])
+        chunks.append(str(buffer(data, start, end - start)))
+        length = sum(len(chunk) for chunk in chunks)
+        if length > self.MAX_LENGTH:
+            self.lengthLimitExceeded(length)
+
+        if header & _FLAG_FINAL:
+            del self._chunks[stream]
+            self._payload_received(header & _FLAG_COMPRESSED, tag, ''.join(chunks))
+
+    def _payload_received(self, flags, tag, payload):
+        # type: (int, int, buffer) -> None
+        if self.duplicate_filter is not None and self.duplicate_filter.is_duplicate(tag, payload):
+            return
+        self.payload_received(flags, tag, payload)
+
+    def payload_received(self, flags, tag, payload):
+        # type: (int, int, buffer) -> None
+        """
+        Called with the raw payload of every message that is not a duplicate, override this to defer the decoding.
+        The payload may point into the receive buffer, so it must be copied if it's used after this call returns.
+        :param flags:
+        :param tag:
+        :param payload:
+        :return:
+        """
+        self.decode_payload(flags, tag, payload)
+
+    def decode_payload(self, flags, tag, payload):
+        # type: (int, int, Union[str, buffer]) -> None
+        """
+        Parse the payload and pass the object on to tagged_obj_received
+        :param flags:
+        :param tag:
+        :param payload:
+        :return:
+        """
+        if tag in _FIXED_TAG_TO_CODEC:
+            obj = _FIXED_TAG_TO_CODEC[tag].decode(self._decompress(payload) if flags & _FLAG_COMPRESSED else payload)
+            self.tagged_obj_received(FIXED_TAG_TO_TAG[tag], obj)
+            return
+
         obj = _PB_TAG_TO_TUPLE[tag][1]()
-        obj.ParseFromString(string[2:])
+        if flags & _FLAG_COMPRESSED:
+            start = time.time()
+            obj.ParseFromString(self._decompress(payload))
+            if self.compression_stats is not None:
+                self.compression_stats.add_decompress(_PB_TAG_TO_TUPLE[tag][0], time.time() - start)
+        else:
+            obj.ParseFromString(payload)
+        self.tagged_obj_received(tag, obj)
+
+    def _decompress(self, payload):
+        d = zlib.decompressobj()
+        res = d.decompress(payload, self.MAX_LENGTH)
+        if d.unconsumed_tail:
+            self.lengthLimitExceeded(self.MAX_LENGTH + len(d.unconsumed_tail))
+        return res
+
+    def tagged_obj_received(self, tag, obj):
+        """
+        Same as obj_received but also gives the type tag, override this to avoid looking up the type again
+        :param tag:
+        :param obj:
+        :return:
+        """
         self.obj_received(obj)
 
     def obj_received(self, obj):
@@ -41,8 +569,120 @@ class ProtobufReceiver(Int32StringReceiver):
         :param obj: 
         :return: 
         """
-        msg = pack("H", _PB_NAME_TO_TAG[obj.__class__.__name__]) + obj.SerializeToString()
-        self.sendString(msg)
+        self.send_frame(Frame(obj))
+
+    def send_frame(self, frame):
+        # type: (Frame) -> Frame
+        """
+        Queue a frame that is already serialized in its lane, the lanes are written at the end of the reactor
+        iteration or as soon as flush_threshold bytes are queued.
+        :param frame:
+        :return: the frame that is queued, which is in a fixed layout if the remote supports one that fits
+        """
+        if self._lanes is None:
+            self._lanes = [deque() for _ in self.lane_names]
+            self._chunk_offsets = [0 for _ in self.lane_names]
+
+        lane = self.tag_lanes.get(frame.tag, 0)
+        if self.remote_fixed:
+            frame = frame.fixed()
+        compress = self.remote_compression and 0 < self.compression_threshold <= frame.size
+        self._lanes[lane].append((frame, compress, time.time()))
+        self._queued += frame.size
+
+        if self._queued >= self.flush_threshold:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = reactor.callLater(0, self.flush)
+        return frame
+
+    def flush(self):
+        """
+        Write the queued frames, unless the transport has asked us to pause
+        :return:
+        """
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        self._write_lanes()
+
+    def _write_lanes(self):
+        if not self._lanes:
+            return
+        # writing may pause us
+        while not self._paused:
+            for lane, q in enumerate(self._lanes):
+                if q:
+                    self._write_lane(lane)
+                    break
+            else:
+                return
+
+    def _write_lane(self, lane):
+        """
+        Write the next chunk of the first frame in the lane if it is chunked. Otherwise write the small frames at the
+        start of the lane in one go, as a single batch frame if the remote supports it, at most chunk_size bytes of
+        them if chunking is enabled and otherwise as much as fits in the remote's MAX_LENGTH.
+        Large frames that are not chunked are written on their own so they're never copied.
+        :param lane:
+        :return:
+        """
+        q = self._lanes[lane]
+        chunking = self.remote_chunk and self.chunk_size > 0
+        if chunking and q[0][0].size > self.chunk_size:
+            self._write_chunk(lane)
+            return
+
+        # the payload of a batch frame is the entries with their headers, compression never makes an entry larger
+        limit, overhead = (self.chunk_size, 0) if chunking else (self.MAX_LENGTH - _HEADER.size, _ENTRY.size)
+        entries = []
+        size = 0
+        batch_size = 0
+        now = time.time()
+        while q:
+            frame, compress, enqueued_at = q[0]
+            large = frame.size > _MAX_ENTRY_LENGTH
+            if entries and (large or batch_size + overhead + frame.size > limit):
+                break
+            q.popleft()
+            self._record(lane, now - enqueued_at)
+            entries.append((frame, compress))
+            size += frame.size
+            batch_size += overhead + frame.size
+            if large:
+                break
+        self._queued -= size
+
+        if len(entries) == 1:
+            frame, compress = entries[0]
+            self.transport.write(frame.compressed_data(self.compression_stats) if compress else frame.data)
+        elif self.remote_batch:
+            self.transport.write(batch_frame(entries, self.compression_stats))
+        else:
+            self.transport.write(''.join(frame.compressed_data(self.compression_stats) if compress else frame.data
+                                         for frame, compress in entries))
+
+    def _write_chunk(self, lane):
+        frame, compress, enqueued_at = self._lanes[lane][0]
+        flags, payload = frame.payload(compress, self.compression_stats)
+        start = self._chunk_offsets[lane]
+        if start == 0:
+            self._record(lane, time.time() - enqueued_at)
+
+        end = min(start + self.chunk_size, len(payload))
+        if end == len(payload):
+            flags |= _FLAG_FINAL
+            self._lanes[lane].popleft()
+            self._queued -= frame.size
+            self._chunk_offsets[lane] = 0
+        else:
+            self._chunk_offsets[lane] = end
+        self.transport.write(chunk_frame(frame.tag, flags, lane, payload[start:end]))
+
+    def _record(self, lane, delay):
+        if self.lane_stats is not None:
+            self.lane_stats.add(self.lane_names[lane], delay)
 
     def lengthLimitExceeded(self, length):
         raise IOError("Line length exceeded, len: {}".format(length))
@@ -0,0 +1,90 @@
+import logging
+import time
+from collections import deque, defaultdict
+
+from typing import List
+
+from src.utils import call_later
+
+
+class Scheduler(object):
+    """
+    Inbound work queued by priority class, the classes are served strictly in order of priority.
+    Queued work runs in the next reactor iteration, at most `budget` seconds of it per iteration,
+    whatever is left waits for the next iteration so that network I/O is not starved and new high priority work
+    can overtake it.
+    """
+    def __init__(self, classes, budget):
+        # type: (List[str], float) -> None
+        """
+        :param classes: the names of the priority classes, from the highest to the lowest priority
+        :param budget: in seconds
+        """
+        assert budget > 0
+        self._classes = classes
+        self._queues = [deque() for _ in classes]  # items are (enqueued_at, f, args)
+        self._budget = budget
+        self._scheduled = False
+
+        # key: class name, val: [number of tasks, total queueing delay, maximum queueing delay]
+        self._delay = defaultdict(lambda: [0, 0.0, 0.0])
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues)
+
+    def submit(self, priority, f, *args):
+        """
+        Queue f(*args)
+        :param priority: index into the classes
+        :param f:
+        :param args:
+        :return:
+        """
+        self._queues[priority].append((time.time(), f, args))
+        if not self._scheduled:
+            self._scheduled = True
+            call_later(0, self._run)
+
+    def _run(self):
+        self._scheduled = False
+        start = time.time()
+        while True:
+            priority = self._next_priority()
+            if priority is None:
+                return
+
+            enqueued_at, f, args = self._queues[priority].popleft()
+            self._record(priority, time.time() - enqueued_at)
+            try:
+                f(*args)
+            except Exception:
+                # a failing task must not stall the ones behind it, nothing would schedule them again
+                logging.exception("NODE: scheduled task {} failed".format(getattr(f, '__name__', f)))
+
+            if time.time() - start >= self._budget:
+                if self._next_priority() is not None and not self._scheduled:
+                    self._scheduled = True
+                    call_later(0, self._run)
+                return
+
+    def _next_priority(self):
+        for priority, q in enumerate(self._queues):
+            if q:
+                return priority
+        return None
+
+    def _record(self, priority, delay):
+        d = self._delay[self._classes[priority]]
+        d[0] += 1
+        d[1] += delay
+        d[2] = max(d[2], delay)
+
+    @property
+    def stats(self):
+        res = {}
+        for priority, name in enumerate(self._classes):
+            if name in self._delay:
+                tasks, total, maximum = self._delay[name]
+                res[name] = {"tasks": tasks, "mean_delay": total / tasks, "max_delay": maximum,
+                             "queued": len(self._queues[priority])}
+        return res
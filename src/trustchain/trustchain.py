@@ -2,14 +2,17 @@ import libnacl
 import copy
 import logging
 from base64 import b64encode
+from collections import OrderedDict
 from typing import List, Union, Dict, Tuple, Optional
 from enum import Enum
 
-from src.utils import hash_pointers_ok, GrowingList, encode_n
+from src.utils import hash_pointers_ok, GrowingList, PromoterIndex, encode_n
 import src.messages.messages_pb2 as pb
 
 VALIDITY_ENUM = Enum('VALIDITY_ENUM', 'Valid Invalid Unknown')
 
+COMPACTED_CONS_CACHE = 256  # number of compacted rounds whose serialized result is kept for the nodes that lag behind
+
 
 class ProtobufWrapper(object):
     def __init__(self, x):
@@ -38,6 +41,10 @@ class ProtobufWrapper(object):
     def __str__(self):
         return str(self.pb)
 
+    def ByteSize(self):
+        # type: () -> int
+        return len(self.SerializeToString())
+
     @property
     def hash(self):
         # type: () -> str
@@ -62,6 +69,26 @@ class Signature(ProtobufWrapper):
         # type: (str, str, str) -> Signature
         return cls(pb.Signature(vk=vk, signed_document=libnacl.crypto_sign(msg, sk)))
 
+    @classmethod
+    def from_detached(cls, vk, sig, msg):
+        # type: (str, str, str) -> Signature
+        """
+        The inverse of detached, for when the receiver knows the vk and the message
+        :param vk:
+        :param sig: the detached signature
+        :param msg:
+        :return:
+        """
+        return cls(pb.Signature(vk=vk, signed_document=sig + msg))
+
+    @property
+    def detached(self):
+        # type: () -> str
+        """
+        :return: the signature without the message
+        """
+        return self._signed_document[:libnacl.crypto_sign_BYTES]
+
     def verify(self, vk, msg):
         # type: (str, str) -> None
         """
@@ -175,17 +202,32 @@ class CpBlock(ProtobufWrapper):
         :param t:
         """
         assert p in (0, 1)
-        inner = pb.CpBlock.Inner(prev=prev, seq=seq, round=cons.round, cons_hash=cons.hash, ss=[s.pb for s in ss], p=p)
-
-        if cons.round != 0 or len(ss) != 0 or len(vks) != 0 or inner.seq != 0:
-            _verify_signatures(inner.cons_hash, ss, vks, t)
+        if cons.round != 0 or len(ss) != 0 or len(vks) != 0 or seq != 0:
+            _verify_signatures(cons.hash, ss, vks, t)
         else:
             # if this is executed, it means this is a genesis block
             pass
+
+        # the signers are stored as a bitmap of the promoters and only the signatures themselves are kept
+        index = PromoterIndex(vks)
+        signed = sorted((index.index(s.vk), s.detached) for s in ss if s.vk in index)
+        inner = pb.CpBlock.Inner(prev=prev, seq=seq, round=cons.round, cons_hash=cons.hash, p=p,
+                                 signers=index.bitmap(index.vk(i) for i, _ in signed),
+                                 sigs=[sig for _, sig in signed])
         s = Signature.new(vk, sk, libnacl.crypto_hash_sha256(inner.SerializeToString()))
 
         return cls(pb.CpBlock(inner=inner, s=s.pb))
 
+    def signatures(self, vks):
+        # type: (List[str]) -> List[Signature]
+        """
+        :param vks: all verification keys of the promoters that signed, as given to new
+        :return: the signatures of the promoters on the consensus result
+        """
+        index = PromoterIndex(vks)
+        return [Signature.from_detached(index.vk(i), sig, self.inner.cons_hash)
+                for i, sig in zip(index.positions(self.inner.signers), self.inner.sigs)]
+
     @property
     def luck(self):
         # type: () -> str
@@ -263,6 +305,7 @@ class Cons(ProtobufWrapper):
         self.round = self.pb.round
         self.blocks = [CpBlock(blk) for blk in self.pb.blocks]  # convert to TrustChain type
         self._promoters = []
+        self._compact_hashes = None
 
     @classmethod
     def new(cls, round, blocks):
@@ -275,6 +318,12 @@ class Cons(ProtobufWrapper):
         """
         return cls(pb.Cons(round=round, blocks=blocks))
 
+    def has_compact_hash(self, h):
+        # type: (str) -> bool
+        if self._compact_hashes is None:
+            self._compact_hashes = frozenset(b.compact.hash for b in self.blocks)
+        return h in self._compact_hashes
+
     def get_promoters(self, n):
         # type: () -> List[str]
         if not self._promoters:
@@ -289,6 +338,38 @@ class Cons(ProtobufWrapper):
         return len(self.blocks)
 
 
+class CompactCons(object):
+    """
+    The compacted form of an old consensus result, it is not a protobuf wrapper and cannot be sent over the network.
+    Only the compact hashes of the agreed blocks and the promoters are kept, which is all that validation needs.
+    TrustChain keeps the serialized results of the most recently used compacted rounds, see full_consensus.
+    """
+    def __init__(self, round, compact_hashes, promoters, count):
+        # type: (int, frozenset, List[str], int) -> None
+        self.round = round
+        self._compact_hashes = compact_hashes
+        self._promoters = promoters
+        self._count = count
+
+    @classmethod
+    def from_cons(cls, cons, n):
+        # type: (Cons, int) -> CompactCons
+        return cls(cons.round, frozenset(b.compact.hash for b in cons.blocks), cons.get_promoters(n), cons.count)
+
+    def has_compact_hash(self, h):
+        # type: (str) -> bool
+        return h in self._compact_hashes
+
+    def get_promoters(self, n):
+        # type: (int) -> List[str]
+        return self._promoters
+
+    @property
+    def count(self):
+        # type: () -> int
+        return self._count
+
+
 def generate_genesis_block(vk, sk):
     # type: (str, str) -> CpBlock
     prev = libnacl.crypto_hash_sha256('0')
@@ -461,7 +542,9 @@ class TrustChain(object):
         self.vk, self._sk = libnacl.crypto_sign_keypair()
         self._other_chains = {}  # type: Dict[str, GrowingList]
         self.my_chain = Chain(self.vk, self._sk)
-        self.consensus = {}  # type: Dict[int, Cons]
+        self.consensus = {}  # type: Dict[int, Union[Cons, CompactCons]]
+        # key: round, val: serialized result of a compacted round, ordered from the least to the most recently used
+        self._compacted_cons = OrderedDict()  # type: OrderedDict
         logging.info("TC: my VK is {}".format(b64encode(self.vk)))
 
     def new_tx(self, counterparty, m, nonce=None):
@@ -561,7 +644,7 @@ class TrustChain(object):
         assert isinstance(cp, CpBlock)
         for r in range(cp.round, self.my_chain.latest_round + 1):
             if r in self.consensus:
-                if any(map(lambda b: b.hash == cp.hash, self.consensus[r].blocks)):
+                if self.consensus[r].has_compact_hash(cp.compact.hash):
                     return r
         return -1
 
@@ -569,8 +652,45 @@ class TrustChain(object):
         # type: (CompactBlock) -> bool
         if r not in self.consensus:
             return False
-        cons = self.consensus[r]
-        return any(map(lambda b: b.compact.hash == cp.hash, cons.blocks))
+        return self.consensus[r].has_compact_hash(cp.hash)
+
+    def compact_consensus(self, horizon, n, cache_size=COMPACTED_CONS_CACHE):
+        # type: (int, int, int) -> int
+        """
+        Replace the consensus results that are more than `horizon` rounds older than the latest round by CompactCons,
+        the serialized results of at most `cache_size` compacted rounds are kept, see full_consensus.
+        :param horizon: number of recent rounds to keep in full
+        :param n: number of promoters, needed to keep the promoters of the compacted rounds
+        :param cache_size:
+        :return: number of compacted rounds
+        """
+        rounds = sorted(r for r, cons in self.consensus.iteritems()
+                        if r < self.latest_round - horizon and isinstance(cons, Cons))
+        for r in rounds:
+            cons = self.consensus[r]
+            self.consensus[r] = CompactCons.from_cons(cons, n)
+            self._compacted_cons[r] = cons.SerializeToString()
+        while len(self._compacted_cons) > cache_size:
+            self._compacted_cons.popitem(last=False)
+        return len(rounds)
+
+    def full_consensus(self, r):
+        # type: (int) -> Optional[Cons]
+        """
+        :param r:
+        :return: the consensus result of round r if we have it in full or the round's serialized result is still kept,
+        otherwise None
+        """
+        cons = self.consensus.get(r)
+        if isinstance(cons, Cons):
+            return cons
+        data = self._compacted_cons.pop(r, None)
+        if data is None:
+            return None
+        self._compacted_cons[r] = data
+        cons = Cons(pb.Cons.FromString(data))
+        cons._str = data
+        return cons
 
     def pieces(self, seq):
         # type: (int) -> List[CompactBlock]
@@ -5,16 +5,48 @@ from base64 import b64encode
 from collections import defaultdict
 
 from twisted.internet import task
+from typing import List
 
 import src.messages.messages_pb2 as pb
 from src.trustchain.trustchain import TrustChain, TxBlock, CpBlock, Signature, Cons, CompactBlock
-from src.utils import collate_cp_blocks, my_err_back, encode_n
+from src.utils import collate_cp_blocks, my_err_back, encode_n, Readiness, PromoterIndex
+
+MAX_CONS_RANGE = 64  # maximum number of consensus results sent for one AskConsRange
+ASK_CONS_TIMEOUT = 5  # seconds before asking again for consensus results that did not arrive
+
+
+def _strip_endpoints(tx):
+    # type: (TxBlock) -> pb.TxBlock
+    """
+    A tx in TxReq or TxResp is signed by the sender and its counterparty is the receiver, both are known from the
+    connection, so their vks are left out on the wire and put back by _restore_endpoints before the tx is used
+    :param tx:
+    :return: a copy of the tx without the vks
+    """
+    res = pb.TxBlock()
+    res.CopyFrom(tx.pb)
+    res.inner.ClearField('counterparty')
+    res.s.ClearField('vk')
+    return res
+
+
+def _restore_endpoints(tx, sender, receiver):
+    # type: (pb.TxBlock, str, str) -> None
+    """
+    The signature of the tx covers the counterparty, so a tx that was meant for someone else does not verify
+    :param tx: from _strip_endpoints
+    :param sender:
+    :param receiver:
+    :return:
+    """
+    tx.inner.counterparty = receiver
+    tx.s.vk = sender
 
 
 class RoundState(object):
     def __init__(self):
         self.received_cons = None
-        self.received_sigs = {}
+        self.received_sigs = {}  # key: position of the signer in the promoters of the previous round, val: detached sig
         self.received_cps = []
         self.start_time = int(time.time())
         self.asked = False
@@ -34,21 +66,33 @@ class RoundState(object):
         assert cons == self.received_cons
         return False
 
-    def new_sig(self, s):
-        # type: (Signature) -> bool
+    def new_sig(self, signer, sig):
+        # type: (int, str) -> bool
         """
-        :param s: 
+        :param signer: position of the signer in the promoters of the previous round
+        :param sig: detached signature of the consensus result
         :return: True if it is new, otherwise False
         """
-        assert isinstance(s, Signature)
-        if s.vk not in self.received_sigs:
-            self.received_sigs[s.vk] = s
+        if signer not in self.received_sigs:
+            self.received_sigs[signer] = sig
             return True
 
         # TODO we should handle this
-        assert self.received_sigs[s.vk] == s
+        assert self.received_sigs[signer] == sig
         return False
 
+    def signatures(self, promoters):
+        # type: (List[str]) -> List[Signature]
+        """
+        The signers are only known by their position, so the signatures are made whole once we know the promoters,
+        positions that are not promoters are ignored
+        :param promoters: the promoters of the previous round
+        :return:
+        """
+        index = PromoterIndex(promoters)
+        return [Signature.from_detached(index.vk(i), sig, self.received_cons.hash)
+                for i, sig in self.received_sigs.iteritems() if 0 <= i < len(index)]
+
     def new_cp(self, cp):
         # type: (CpBlock) -> None
         assert isinstance(cp, CpBlock)
@@ -73,7 +117,7 @@ class TrustChainRunner(object):
         self.log_tx_count_lc = task.LoopingCall(self._log_info)
         self.log_tx_count_lc.start(5, False).addErrback(my_err_back)
 
-        self.bootstrap_lc = None
+        self.genesis_ready = Readiness("genesis CPs collected")
 
         self.random_node_for_tx = False
 
@@ -82,13 +126,28 @@ class TrustChainRunner(object):
 
         self._initial_promoters = []
 
+        self._asked_cons = None  # (end, time) of the latest AskConsRange
+
         random.seed()
 
+    def register_handlers(self, registry):
+        registry.register(pb.TxReq, self.handle_tx_req)
+        registry.register(pb.TxResp, self.handle_tx_resp)
+        registry.register(pb.ValidationReq, self.handle_validation_req)
+        registry.register(pb.ValidationResp, self.handle_validation_resp)
+        registry.register(pb.SigWithRound, self.handle_sig)
+        registry.register(pb.CpBlock, self.handle_cp)
+        registry.register(pb.Cons, self.handle_cons)
+        registry.register(pb.AskCons, self.handle_ask_cons)
+        registry.register(pb.AskConsRange, self.handle_ask_cons_range)
+
     def _log_info(self):
         logging.info("TC: current tx count {}, validated {}".format(self.tc.tx_count, len(self.tc.get_validated_txs())))
 
     def _sufficient_sigs(self, r):
-        if len(self.round_states[r].received_sigs) > self.factory.config.t:
+        # only the positions of promoters count
+        n = self.factory.config.n
+        if sum(1 for i in self.round_states[r].received_sigs if 0 <= i < n) > self.factory.config.t:
             return True
         return False
 
@@ -99,6 +158,11 @@ class TrustChainRunner(object):
                 del self.round_states[k]
         # logging.info("TC: states - {}".format(self.round_states))
 
+        if self.factory.config.cons_horizon > 0:
+            compacted = self.tc.compact_consensus(self.factory.config.cons_horizon, self.factory.config.n)
+            if compacted > 0:
+                logging.debug("TC: compacted {} consensus results".format(compacted))
+
     def _latest_promoters(self):
         r = self.tc.latest_round
         return self._promoter_of_round(r)
@@ -130,9 +194,10 @@ class TrustChainRunner(object):
             self.round_states[r].new_cons(cons)
 
             s = Signature.new(self.tc.vk, self.tc._sk, cons.hash)
+            signer = PromoterIndex(self._promoter_of_round(r - 1)).index(self.tc.vk)
 
-            self.factory.bcast(cons.pb)
-            self.factory.bcast(pb.SigWithRound(s=s.pb, r=r))
+            self.factory.gossip(cons.pb)
+            self.factory.gossip(pb.SigWithRound(r=r, signer=signer, sig=s.detached))
 
             # we also try to add the CP here because we may receive the signatures before the actual CP
             self._try_add_cp(r)
@@ -152,10 +217,13 @@ class TrustChainRunner(object):
         assert isinstance(msg, pb.SigWithRound)
         logging.debug("TC: received SigWithRound {} from {}".format(msg, b64encode(remote_vk)))
 
-        sig = Signature(msg.s)
+        if not 0 <= msg.signer < self.factory.config.n:
+            logging.info("TC: round {}, ignoring signature of invalid signer {} from {}"
+                         .format(msg.r, msg.signer, b64encode(remote_vk)))
+            return
 
         if msg.r >= self.tc.latest_round:
-            is_new = self.round_states[msg.r].new_sig(sig)
+            is_new = self.round_states[msg.r].new_sig(msg.signer, msg.sig)
             if is_new:
                 self._try_add_cp(msg.r)
 
@@ -176,6 +244,8 @@ class TrustChainRunner(object):
         if cp.round >= self.tc.latest_round:
             assert cp.s.vk == remote_vk
             self.round_states[cp.round].new_cp(cp)
+            if cp.round == 0 and len(self.round_states[0].received_cps) >= self.factory.config.n:
+                self.genesis_ready.set()
 
     def handle_cons(self, msg, remote_vk):
         # type: (pb.Cons, str) -> None
@@ -206,8 +276,42 @@ class TrustChainRunner(object):
         :return: 
         """
         assert isinstance(msg, pb.AskCons)
-        if msg.r in self.tc.consensus:
-            self.send(remote_vk, self.tc.consensus[msg.r].pb)
+        self._send_cons(remote_vk, msg.r)
+
+    def handle_ask_cons_range(self, msg, remote_vk):
+        # type: (pb.AskConsRange, str) -> None
+        """
+        Send all the consensus results that we have in the range, in order, so that a lagging node catches up in one go.
+        At most MAX_CONS_RANGE results are sent per request, and none after our latest round,
+        requests that are empty once clamped are ignored.
+        :param msg:
+        :param remote_vk:
+        :return:
+        """
+        assert isinstance(msg, pb.AskConsRange)
+        logging.debug("TC: received AskConsRange [{}, {}] from {}".format(msg.start, msg.end, b64encode(remote_vk)))
+        start = max(msg.start, 0)
+        end = min(msg.end, self.tc.latest_round)
+        if end < start:
+            logging.debug("TC: ignoring AskConsRange [{}, {}], latest round is {}"
+                          .format(msg.start, msg.end, self.tc.latest_round))
+            return
+        for r in xrange(start, min(end, start + MAX_CONS_RANGE - 1) + 1):
+            self._send_cons(remote_vk, r)
+
+    def _send_cons(self, node, r):
+        # type: (str, int) -> None
+        """
+        Send the consensus result of round r if we still have it, see TrustChain.full_consensus,
+        the Cons object is sent as is such that its cached serialization is reused.
+        If we don't, the requester asks another promoter after ASK_CONS_TIMEOUT.
+        :param node:
+        :param r:
+        :return:
+        """
+        cons = self.tc.full_consensus(r)
+        if cons is not None:
+            self.send(node, cons)
 
     def _try_add_cp(self, r):
         # type: (int) -> None
@@ -238,11 +342,26 @@ class TrustChainRunner(object):
         try:
             self._promoter_of_round(r - 1)
         except KeyError:
-            self.send(random.choice(self.factory.promoters), pb.AskCons(r=r-1))
+            # ask for every round that we're missing, the missing CPs are added as the results arrive
+            # the rounds that we asked for recently are still on their way, so we only ask for the ones after them
+            start = self.tc.latest_round + 1
+            if self._asked_cons is not None:
+                asked_end, asked_time = self._asked_cons
+                if time.time() - asked_time < ASK_CONS_TIMEOUT:
+                    start = max(start, asked_end + 1)
+            end = min(r - 1, start + MAX_CONS_RANGE - 1)
+            if start <= end:
+                logging.debug("TC: round {}, asking for consensus results [{}, {}]".format(r, start, end))
+                self.send(random.choice(self.factory.promoters), pb.AskConsRange(start=start, end=end))
+                self._asked_cons = (end, time.time())
             return
 
         self._add_cp(r)
 
+        # we may have been waiting for this CP to add the next ones
+        if r + 1 in self.round_states:
+            self._try_add_cp(r + 1)
+
     def _add_cp(self, r):
         # type: (int) -> None
         """
@@ -252,10 +371,11 @@ class TrustChainRunner(object):
         # here we create a new CP from the consensus result (both of round r)
         logging.debug("TC: adding CP in round {}".format(r))
         _prev_cp = self.tc.latest_cp.compact  # this is just for logging
+        promoters = self._promoter_of_round(r - 1)
         self.tc.new_cp(1,
                        self.round_states[r].received_cons,
-                       self.round_states[r].received_sigs.values(),
-                       self._promoter_of_round(r - 1),
+                       self.round_states[r].signatures(promoters),
+                       promoters,
                        self.factory.config.t)
         if not self.tc.compact_cp_in_consensus(_prev_cp, self.tc.latest_round):
             logging.info("TC: round {}, my previous CP not in consensus".format(r))
@@ -381,23 +501,23 @@ class TrustChainRunner(object):
         # type: (pb.TxReq, str) -> None
         assert isinstance(msg, pb.TxReq)
 
+        _restore_endpoints(msg.tx, remote_vk, self.tc.vk)
         nonce = msg.tx.inner.nonce
         m = msg.tx.inner.m
 
-        assert remote_vk == msg.tx.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.tx.s.vk))
         self.tc.new_tx(remote_vk, m, nonce)
 
         # new_tx cannot be a CpBlock because we just called new_tx
         new_tx = self.tc.my_chain.chain[-1]
         new_tx.add_other_half(TxBlock(msg.tx))
-        self.send(remote_vk, pb.TxResp(seq=msg.tx.inner.seq, tx=new_tx.pb))
+        self.send(remote_vk, pb.TxResp(seq=msg.tx.inner.seq, tx=_strip_endpoints(new_tx)))
         logging.debug("TC: added tx (received) {}, from {}"
                       .format(encode_n(new_tx.other_half.hash), encode_n(remote_vk)))
 
     def handle_tx_resp(self, msg, remote_vk):
         # type: (pb.TxResp, str) -> None
         assert isinstance(msg, pb.TxResp)
-        assert remote_vk == msg.tx.s.vk, "{} != {}".format(b64encode(remote_vk), b64encode(msg.tx.s.vk))
+        _restore_endpoints(msg.tx, remote_vk, self.tc.vk)
         # TODO index access not safe
         tx = self.tc.my_chain.chain[msg.seq]
         tx.add_other_half(TxBlock(msg.tx))
@@ -437,7 +557,7 @@ class TrustChainRunner(object):
         # create the tx and send the request
         self.tc.new_tx(node, m)
         tx = self.tc.my_chain.chain[-1]
-        self.send(node, pb.TxReq(tx=tx.pb))
+        self.send(node, pb.TxReq(tx=_strip_endpoints(tx)))
         logging.debug("TC: added tx {}, from {}".format(encode_n(tx.hash), encode_n(self.tc.vk)))
 
     def make_validation(self, interval):
@@ -475,23 +595,21 @@ class TrustChainRunner(object):
         :return:
         """
         n = self.factory.config.n
-        self.factory.promoters = sorted(self.factory.peers.keys())[:n]
+        self.factory.promoters = sorted(self.factory.members)[:n]
         self.factory.promoter_cast(self.tc.genesis.pb)
 
         self._initial_promoters = self.factory.promoters
 
-        def bootstrap_when_ready():
-            if self.factory.vk in self.factory.promoters:
-                logging.info("TC: bootstrap_lc, got {} CPs".format(len(self.round_states[0].received_cps)))
-                # collect CPs of round 0, from it, create consensus result of round 1
-                if len(self.round_states[0].received_cps) >= n:
-                    msg = pb.CpBlocks(cps=[cp.pb for cp in self.round_states[0].received_cps])
-                    self.factory.acs.start(msg.SerializeToString(), 1)
-                    self.bootstrap_lc.stop()
-            else:
-                logging.info(
-                    "TC: bootstrap_lc, not promoter, got {} CPs".format(len(self.round_states[0].received_cps)))
-                self.bootstrap_lc.stop()
+        if self.factory.vk in self.factory.promoters:
+            self.genesis_ready.then(self._bootstrap_acs)
+        else:
+            logging.info("TC: bootstrap, not promoter, got {} CPs".format(len(self.round_states[0].received_cps)))
 
-        self.bootstrap_lc = task.LoopingCall(bootstrap_when_ready)
-        self.bootstrap_lc.start(5, False).addErrback(my_err_back)
+    def _bootstrap_acs(self):
+        """
+        Collect CPs of round 0, from it, create consensus result of round 1
+        :return:
+        """
+        logging.info("TC: bootstrap, got {} CPs".format(len(self.round_states[0].received_cps)))
+        msg = pb.CpBlocks(cps=[cp.pb for cp in self.round_states[0].received_cps])
+        self.factory.acs.start(msg.SerializeToString(), 1)
@@ -1,9 +1,12 @@
 from twisted.internet import reactor, task, error
 from base64 import b64encode
+from collections import defaultdict
 
 import logging
 import sys
+import time
 import libnacl
+from typing import Iterable, List
 
 
 def byteify(inp):
@@ -47,6 +50,174 @@ class Handled(object):
         self.m = m
 
 
+class FutureBuffer(object):
+    """
+    Messages that were replayed by the consensus algorithm because they arrived too early,
+    indexed by (round, instance) so that they can be released exactly when they become processable.
+    The total number of messages is bounded, messages that do not fit are dropped.
+    """
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._msgs = defaultdict(list)  # key: (round, instance), val: list of messages
+        self._size = 0
+        self.dropped = defaultdict(long)  # key: reason, val: number of dropped messages
+
+    def __len__(self):
+        return self._size
+
+    def add(self, round, instance, msg):
+        """
+        :param round:
+        :param instance:
+        :param msg:
+        :return: False if the buffer is full and the message is dropped
+        """
+        if self._size >= self._capacity:
+            self.dropped['full'] += 1
+            return False
+        self._msgs[(round, instance)].append(msg)
+        self._size += 1
+        return True
+
+    def release(self, round, instance=None):
+        """
+        Remove and return the messages of one instance, or of every instance when instance is None
+        :param round:
+        :param instance:
+        :return: the messages in the order they were added, per instance
+        """
+        if instance is None:
+            keys = [k for k in self._msgs.iterkeys() if k[0] == round]
+        else:
+            keys = [(round, instance)] if (round, instance) in self._msgs else []
+
+        res = []
+        for k in keys:
+            res.extend(self._msgs.pop(k))
+        self._size -= len(res)
+        return res
+
+    def discard(self, round):
+        """
+        Drop the messages of round `round` and the ones before it, they can never be processed
+        :param round:
+        :return:
+        """
+        for k in [k for k in self._msgs.iterkeys() if k[0] <= round]:
+            dropped = len(self._msgs.pop(k))
+            self._size -= dropped
+            self.dropped['stale'] += dropped
+
+
+class PromoterIndex(object):
+    """
+    The promoters of a round in sorted order, every node derives the same numbering from the same promoters,
+    so messages can refer to a promoter by its position instead of its vk, and to a set of them by a bitmap.
+    In a bitmap, bit i counting from the lowest bit of the first byte is the promoter at position i.
+    """
+    def __init__(self, promoters):
+        # type: (List[str]) -> None
+        self._vks = sorted(promoters)
+        self._positions = {vk: i for i, vk in enumerate(self._vks)}
+
+    def __len__(self):
+        return len(self._vks)
+
+    def __contains__(self, vk):
+        return vk in self._positions
+
+    def index(self, vk):
+        # type: (str) -> int
+        """
+        Throws KeyError if vk is not a promoter
+        """
+        return self._positions[vk]
+
+    def vk(self, i):
+        # type: (int) -> str
+        """
+        Throws IndexError if there is no promoter at position i
+        """
+        if not 0 <= i < len(self._vks):
+            raise IndexError("no promoter at position {}".format(i))
+        return self._vks[i]
+
+    def bitmap(self, vks):
+        # type: (Iterable[str]) -> str
+        """
+        :param vks: promoters
+        :return: the bitmap of their positions
+        """
+        res = bytearray((len(self._vks) + 7) / 8)
+        for vk in vks:
+            i = self._positions[vk]
+            res[i >> 3] |= 1 << (i & 7)
+        return str(res)
+
+    def positions(self, bitmap):
+        # type: (str) -> List[int]
+        """
+        :param bitmap:
+        :return: the positions of the bits that are set in increasing order, bits beyond the promoters are ignored
+        """
+        bitmap = bytearray(bitmap)
+        return [i for i in range(min(len(self._vks), len(bitmap) * 8)) if bitmap[i >> 3] >> (i & 7) & 1]
+
+
+class Readiness(object):
+    """
+    A condition that the next phase of the node waits for, e.g. all the expected peers have handshaken.
+    The waiting functions run in the next reactor iteration after the condition holds instead of after a fixed delay.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.created_at = time.time()
+        self.ready_at = None
+        self._waiters = []  # items are (f, args)
+        self._first = []  # items are (f, args)
+
+    @property
+    def is_ready(self):
+        return self.ready_at is not None
+
+    def then(self, f, *args):
+        """
+        Run f(*args) when ready, or soon if we're ready already
+        :param f:
+        :param args:
+        :return:
+        """
+        if self.is_ready:
+            call_later(0, f, *args)
+        else:
+            self._waiters.append((f, args))
+
+    def first(self, f, *args):
+        """
+        Run f(*args) as part of set, before anything can observe that we're ready,
+        for the state that the handlers of the next messages depend on
+        :param f:
+        :param args:
+        :return:
+        """
+        if self.is_ready:
+            f(*args)
+        else:
+            self._first.append((f, args))
+
+    def set(self):
+        if self.is_ready:
+            return
+        for f, args in self._first:
+            f(*args)
+        self._first = []
+        self.ready_at = time.time()
+        logging.info("NODE: ready - {} after {:.3f} s".format(self.name, self.ready_at - self.created_at))
+        for f, args in self._waiters:
+            call_later(0, f, *args)
+        self._waiters = []
+
+
 def set_logging(lvl, stream=sys.stdout):
     logging.basicConfig(stream=stream, level=lvl, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -0,0 +1,260 @@
+import os
+
+from twisted.internet.defer import Deferred
+
+import src.messages.messages_pb2 as pb
+from src.consensus import bracha
+from src.consensus.acs import ACS
+from src.consensus.bracha import Bracha
+from src.consensus.erasure import ec_driver
+from src.consensus.merkle import merkle_tree, merkle_root, merkle_branch
+from src.utils import Replay, PromoterIndex
+
+
+class Config(object):
+    n = 4
+    t = 1
+    from_instruction = False
+    ec_backend = 'numpy'
+    ec_threads = 0
+    batch_votes = False
+    failure = None
+
+
+class Factory(object):
+    def __init__(self):
+        self.config = Config()
+        self.promoters = [os.urandom(32) for _ in range(self.config.n)]
+        self.vk = self.promoters[0]
+        self.msgs = []
+
+    def send(self, node, msg):
+        self.msgs.append(msg)
+
+    def promoter_cast(self, msg):
+        self.msgs.append(msg)
+
+    def discard_acs(self, r):
+        pass
+
+    def release_acs(self, r, instance=None):
+        pass
+
+
+def test_instances_reused():
+    assert ec_driver(2, 2) is ec_driver(2, 2)
+
+    factory = Factory()
+    acs = ACS(factory)
+    acs.start('round 1', 1)
+    brachas = set(map(id, acs._brachas.values()))
+    assert all(m.round == 1 for m in factory.msgs)
+
+    del factory.msgs[:]
+    acs.reset_then_start('round 2', 2)
+    assert set(map(id, acs._brachas.values())) == brachas
+    assert len(factory.msgs) == factory.config.n
+    assert all(m.round == 2 and m.bracha.fragment for m in factory.msgs)
+
+
+def test_bracha_rejects_bad_fragments():
+    factory = Factory()
+    sender = Bracha(factory)
+    sender.bcast_init('some message')
+    inits = list(factory.msgs)
+
+    receiver = Bracha(factory)
+    echoes = []
+    for vk, init in zip(factory.promoters, inits):
+        echo = pb.Bracha()
+        echo.CopyFrom(init)
+        echo.ty = pb.Bracha.ECHO
+        echoes.append((echo, vk))
+
+    bad = pb.Bracha()
+    bad.CopyFrom(echoes[0][0])
+    bad.fragment = 'not a fragment'
+    receiver.handle(bad, echoes[0][1])
+    assert receiver._echo_count == 0
+
+    # n - t = 3 echoes are needed, the bad one was not counted
+    for echo, vk in echoes[1:]:
+        receiver.handle(echo, vk)
+    assert receiver._echo_count == 3
+    assert receiver._v == 'some message'
+
+    ready = pb.Bracha(ty=pb.Bracha.READY, digest=inits[0].digest)
+    res = [receiver.handle(ready, vk).m for vk in factory.promoters[:3]]
+    assert res == [None, None, 'some message']
+
+
+def test_bracha_undecodable_fragments():
+    factory = Factory()
+    n, t = factory.config.n, factory.config.t
+
+    # a Byzantine initiator gives every fragment the same index, they match the root but cannot be decoded
+    fragments = ec_driver(n - 2 * t, 2 * t, factory.config.ec_backend).encode('some message')
+    fragments = [fragments[0][:1] + fragment[1:] for fragment in fragments]
+    tree = merkle_tree(fragments)
+    digest = merkle_root(tree)
+
+    receiver = Bracha(factory)
+    for i, vk in enumerate(factory.promoters):
+        echo = pb.Bracha(ty=pb.Bracha.ECHO, digest=digest, fragment=fragments[i], index=i,
+                         branch=merkle_branch(tree, i))
+        receiver.handle(echo, vk)
+    assert receiver._echo_count == n
+    assert receiver._v == ''
+
+    ready = pb.Bracha(ty=pb.Bracha.READY, digest=digest)
+    res = [receiver.handle(ready, vk).m for vk in factory.promoters[:2 * t + 1]]
+    assert res == [None, None, '']
+
+
+def test_bracha_decodes_on_thread_pool(monkeypatch):
+    jobs = []
+
+    def defer_to_thread(f, *args):
+        d = Deferred()
+        jobs.append((d, f, args))
+        return d
+
+    monkeypatch.setattr(bracha.threads, 'deferToThread', defer_to_thread)
+    factory = Factory()
+    factory.config.ec_threads = 1
+    sender = Bracha(factory)
+    sender.bcast_init('some message')
+    assert factory.msgs == []
+    d, f, args = jobs.pop()
+    d.callback(f(*args))
+    inits = list(factory.msgs)
+    assert len(inits) == factory.config.n
+
+    delivered = []
+    receiver = Bracha(factory, deliver_f=delivered.append)
+    for vk, init in zip(factory.promoters[1:], inits[1:]):
+        echo = pb.Bracha()
+        echo.CopyFrom(init)
+        echo.ty = pb.Bracha.ECHO
+        assert receiver.handle(echo, vk).m is None
+    ready = pb.Bracha(ty=pb.Bracha.READY, digest=inits[0].digest)
+    assert [receiver.handle(ready, vk).m for vk in factory.promoters[:3]] == [None, None, None]
+
+    # one decoding per broadcast, and a result from before a reset is dropped
+    assert len(jobs) == 1
+    d, f, args = jobs.pop()
+    receiver.reset(deliver_f=delivered.append)
+    d.callback(f(*args))
+    assert receiver._v is None and delivered == []
+
+    for vk, init in zip(factory.promoters[1:], inits[1:]):
+        echo = pb.Bracha()
+        echo.CopyFrom(init)
+        echo.ty = pb.Bracha.ECHO
+        receiver.handle(echo, vk)
+    assert [receiver.handle(ready, vk).m for vk in factory.promoters[:3]] == [None, None, None]
+    d, f, args = jobs.pop()
+    d.callback(f(*args))
+    assert delivered == ['some message']
+
+
+def test_bracha_decode_failure(monkeypatch):
+    jobs = []
+
+    def defer_to_thread(f, *args):
+        d = Deferred()
+        jobs.append((d, f, args))
+        return d
+
+    monkeypatch.setattr(bracha.threads, 'deferToThread', defer_to_thread)
+    factory = Factory()
+    factory.config.ec_threads = 1
+    sender = Bracha(factory)
+    sender.bcast_init('some message')
+    d, f, args = jobs.pop()
+    d.callback(f(*args))
+    inits = list(factory.msgs)
+
+    delivered = []
+    receiver = Bracha(factory, deliver_f=delivered.append)
+    for vk, init in zip(factory.promoters[1:], inits[1:]):
+        echo = pb.Bracha()
+        echo.CopyFrom(init)
+        echo.ty = pb.Bracha.ECHO
+        receiver.handle(echo, vk)
+    ready = pb.Bracha(ty=pb.Bracha.READY, digest=inits[0].digest)
+    for vk in factory.promoters[:3]:
+        receiver.handle(ready, vk)
+
+    # the failed decoding does not block the next attempt
+    d, f, args = jobs.pop()
+    d.errback(ValueError('decoding failed'))
+    assert not receiver._decoding
+    receiver.handle(ready, factory.promoters[3])
+    d, f, args = jobs.pop()
+    d.callback(f(*args))
+    assert delivered == ['some message']
+
+
+def test_acs_counts_decisions():
+    factory = Factory()
+    n, t = factory.config.n, factory.config.t
+    acs = ACS(factory)
+    acs.start('proposal', 1)
+    ones, zeros = factory.promoters[:n - t], factory.promoters[n - t:]
+    for instance in ones:
+        acs._bracha_delivered(instance, 'proposal')
+    index = PromoterIndex(factory.promoters)
+
+    def feed(instances, v, r):
+        res = None
+        for ty in (pb.Mo14.EST, pb.Mo14.AUX):
+            for sender in factory.promoters:
+                for instance in instances:
+                    msg = pb.ACS(instance=index.index(instance), round=1, mo14=pb.Mo14(ty=ty, r=r, v=v))
+                    handled = acs.handle(msg, sender)
+                    res = handled.m or res
+        return res
+
+    # the coin of the first round is 1
+    assert feed(ones, 1, 1) is None
+    assert acs._ones == n - t
+    assert acs._not_provided == set() and acs._undelivered_ones == set()
+    assert all(acs._mo14_provided[instance] == 0 for instance in zeros)
+
+    # the first coin of 0 is in the fifth round
+    res = None
+    for r in range(1, 6):
+        res = feed(zeros, 0, r) or res
+    assert res == ({instance: 'proposal' for instance in ones}, 1)
+
+
+def test_votes_batched():
+    factory = Factory()
+    factory.config.batch_votes = True
+    acs = ACS(factory)
+    acs.start('proposal', 1)
+    del factory.msgs[:]
+    for instance in factory.promoters[:3]:
+        acs._bcast_vote(instance, 1, pb.Mo14(ty=pb.Mo14.EST, r=1, v=1))
+    acs._bcast_vote(factory.promoters[3], 1, pb.Mo14(ty=pb.Mo14.EST, r=1, v=0))
+    acs._bcast_vote(factory.promoters[0], 1, pb.Mo14(ty=pb.Mo14.AUX, r=1, v=1))
+    assert factory.msgs == []
+
+    acs._flush_votes()
+    assert len(factory.msgs) == 1
+    batch = factory.msgs[0]
+    assert isinstance(batch, pb.ACSBatch) and len(batch.votes) == 3
+
+    msgs = acs.unbatch(batch)
+    index = PromoterIndex(factory.promoters)
+    assert sorted((index.vk(m.instance), m.mo14.ty, m.mo14.v) for m in msgs) == sorted(
+        [(vk, pb.Mo14.EST, 1) for vk in factory.promoters[:3]] +
+        [(factory.promoters[3], pb.Mo14.EST, 0), (factory.promoters[0], pb.Mo14.AUX, 1)])
+    assert all(m.round == 1 and m.mo14.r == 1 for m in msgs)
+
+    # the instances of a later round are only known once it starts
+    batch.round = 2
+    assert isinstance(acs.unbatch(batch), Replay)
+    batch.round = 0
+    assert acs.unbatch(batch) == []
@@ -0,0 +1,78 @@
+import time
+
+from twisted.internet import defer
+
+from src.connection_pool import ConnectionPool
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.closed = False
+
+    def loseConnection(self):
+        self.closed = True
+
+
+class FakeProto(object):
+    def __init__(self, last_active):
+        self.last_active = last_active
+        self.transport = FakeTransport()
+        self.sent = []
+
+    def send_frame(self, frame):
+        self.sent.append(frame)
+
+
+class FakeFactory(object):
+    def __init__(self):
+        self.vk = 'me'
+        self.promoters = ['promoter']
+        self.peers = {}
+        self.dials = []
+
+    def make_new_connection(self, host, port, vk=None):
+        d = defer.Deferred()
+        self.dials.append((host, port, vk, d))
+        return d
+
+
+def test_send_queues_until_connected():
+    factory = FakeFactory()
+    pool = ConnectionPool(factory, 0)
+    pool.add('a', 'host', 1)
+    pool.send('a', 'frame 1')
+    pool.send('a', 'frame 2')
+    assert len(factory.dials) == 1
+    assert factory.dials[0][:3] == ('host', 1, 'a')
+
+    proto = FakeProto(0)
+    factory.peers['a'] = ('host', 1, proto)
+    pool.connected('a', proto)
+    assert proto.sent == ['frame 1', 'frame 2']
+    assert pool.stats['dialed'] == 1
+
+
+def test_failed_dial_drops_queue():
+    factory = FakeFactory()
+    pool = ConnectionPool(factory, 0)
+    pool.add('a', 'host', 1)
+    pool.send('a', 'frame')
+    factory.dials[0][3].errback(Exception('refused'))
+
+    pool.send('a', 'frame')
+    assert len(factory.dials) == 2
+
+
+def test_evict_idle_keeps_pinned():
+    factory = FakeFactory()
+    pool = ConnectionPool(factory, 2)
+    for vk, last_active in [('me', 0), ('promoter', 1), ('old', 2), ('new', 3), ('busy', time.time())]:
+        pool.add(vk, 'host', 1)
+        factory.peers[vk] = ('host', 1, FakeProto(last_active))
+
+    old = factory.peers['old'][2]
+    pool.connected('new', factory.peers['new'][2])
+    assert sorted(factory.peers.keys()) == ['busy', 'me', 'new', 'promoter']
+    assert old.transport.closed
+    assert pool.stats['evicted'] == 1
+    assert sorted(pool.members) == ['busy', 'me', 'new', 'old', 'promoter']
@@ -62,6 +62,52 @@ def test_acs(n, t, f, folder, discover):
     print "Test: ACS test passed"
 
 
+@pytest.mark.parametrize("n,t,f,ec_backend,ec_threads", [
+    (7, 2, 'omission', 'numpy', None),
+    (19, 6, 'byzantine', 'numpy', None),
+    (7, 2, 'byzantine', 'pyeclib', 0),
+    (19, 6, 'omission', 'numpy', 0),
+])
+def test_acs_ec_backend(n, t, f, ec_backend, ec_threads, folder, discover):
+    configs = []
+    for i in range(n - t):
+        port = GOOD_PORT + i
+        configs.append(make_args(port, n, t, n, test='acs', output=DIR + str(port) + '.out', ec_backend=ec_backend,
+                                 ec_threads=ec_threads))
+    for i in range(t):
+        port = BAD_PORT + i
+        configs.append(make_args(port, n, t, n, test='acs', failure=f, output=DIR + str(port) + '.out',
+                                 ec_backend=ec_backend, ec_threads=ec_threads))
+
+    ps = run_subprocesses(NODE_CMD_PREFIX, configs)
+
+    print "Test: ACS polling"
+    poll_check_f(120, 5, ps, check_acs_files, n, t)
+    print "Test: ACS test passed"
+
+
+@pytest.mark.parametrize("n,t,f,fixed_codec", [
+    (7, 2, 'byzantine', False),
+    (7, 2, 'byzantine', True),  # only the good nodes use the fixed layouts
+])
+def test_acs_unbatched_votes(n, t, f, fixed_codec, folder, discover):
+    configs = []
+    for i in range(n - t):
+        port = GOOD_PORT + i
+        configs.append(make_args(port, n, t, n, test='acs', output=DIR + str(port) + '.out', batch_votes=False,
+                                 fixed_codec=fixed_codec))
+    for i in range(t):
+        port = BAD_PORT + i
+        configs.append(make_args(port, n, t, n, test='acs', failure=f, output=DIR + str(port) + '.out',
+                                 batch_votes=False))
+
+    ps = run_subprocesses(NODE_CMD_PREFIX, configs)
+
+    print "Test: ACS polling"
+    poll_check_f(120, 5, ps, check_acs_files, n, t)
+    print "Test: ACS test passed"
+
+
 @pytest.mark.parametrize("n,t,f", [
     (4, 1, 'omission'),
     (7, 2, 'omission'),
@@ -0,0 +1,40 @@
+import src.discovery
+from src.discovery import DiscoveryFactory
+
+
+class FakeProto(object):
+    def __init__(self):
+        self.frames = []
+
+    def send_frame(self, frame):
+        self.frames.append(frame)
+
+
+def test_versioned_membership(monkeypatch):
+    monkeypatch.setattr(src.discovery, '_PAGE_SIZE', 2)
+    factory = DiscoveryFactory(None, None, None, None)
+    subscriber = FakeProto()
+    factory.subscribe(subscriber)
+    for i in range(5):
+        vk = 'node{}'.format(i)
+        factory.nodes[vk] = ('addr{}'.format(i), None)
+        factory.added(vk, 'addr{}'.format(i))
+
+    # the subscriber receives the new nodes together
+    assert subscriber.frames == []
+    factory.push()
+    assert len(subscriber.frames) == 1
+    assert dict(subscriber.frames[0].obj.nodes) == {'node{}'.format(i): 'addr{}'.format(i) for i in range(5)}
+    assert subscriber.frames[0].obj.version == 5
+
+    # a snapshot is paginated, the last page has the version
+    replies = factory.make_replies(0)
+    assert [len(r.nodes) for r in replies] == [2, 2, 1]
+    assert [r.more for r in replies] == [True, True, False]
+    assert all(r.version == 5 for r in replies)
+
+    # we only get the nodes that joined later and are still here
+    del factory.nodes['node4']
+    replies = factory.make_replies(3)
+    assert len(replies) == 1 and dict(replies[0].nodes) == {'node3': 'addr3'}
+    assert len(factory.make_replies(5)[0].nodes) == 0
@@ -0,0 +1,31 @@
+import os
+import random
+
+import pytest
+
+from src.consensus.erasure import ReedSolomon
+
+
+@pytest.mark.parametrize("k,m", [
+    (1, 0),
+    (2, 2),
+    (3, 4),
+    (22, 42),  # more than the 32 fragments of liberasurecode
+    (44, 84),
+])
+def test_any_k_fragments(k, m):
+    rs = ReedSolomon(k, m)
+    for size in [0, 1, k, 1000, 12345]:
+        data = os.urandom(size)
+        fragments = rs.encode(data)
+        assert len(fragments) == k + m
+        assert rs.decode(fragments[:k]) == data
+        assert rs.decode(fragments[m:]) == data
+        assert rs.decode(random.sample(fragments, k)) == data
+
+
+def test_too_few_fragments():
+    rs = ReedSolomon(3, 2)
+    fragments = rs.encode('some data')
+    with pytest.raises(ValueError):
+        rs.decode(fragments[:2] + fragments[:1])
@@ -0,0 +1,94 @@
+import src.messages.messages_pb2 as pb
+from src.gossip import GossipOverlay
+from src.protobufreceiver import Frame, _PB_NAME_TO_TAG
+
+
+class Config(object):
+    fan_out = 2
+
+
+class Handlers(object):
+    def __init__(self):
+        self.dispatched = []
+
+    def dispatch(self, tag, obj, remote_vk):
+        self.dispatched.append((obj, remote_vk))
+
+
+class FakeFactory(object):
+    def __init__(self):
+        self.config = Config()
+        self.vk = 'me'
+        self.members = ['me', 'a', 'b', 'c', 'd']
+        self.handlers = Handlers()
+        self.loopback = []
+        self.sent = []
+
+    def send(self, node, frame):
+        self.sent.append((node, frame.obj))
+
+    def send_loopback(self, frame):
+        self.loopback.append(frame.obj)
+
+
+def gossip(msg, msg_id, ttl):
+    return pb.Gossip(id=msg_id, ttl=ttl, tag=_PB_NAME_TO_TAG[msg.__class__.__name__], body=msg.SerializeToString())
+
+
+def test_publish():
+    factory = FakeFactory()
+    overlay = GossipOverlay(factory, 3)
+    msg = pb.SigWithRound(r=1, signer=2, sig='sig')
+    overlay.publish(msg)
+    assert factory.loopback == [msg]
+    assert len(factory.sent) == factory.config.fan_out
+    assert all(node != 'me' and g.ttl == 3 for node, g in factory.sent)
+
+    # identical messages have the same id
+    overlay.publish(Frame(pb.SigWithRound(r=1, signer=2, sig='sig')))
+    assert len(factory.loopback) == 1 and len(factory.sent) == factory.config.fan_out
+
+
+def test_handle():
+    factory = FakeFactory()
+    overlay = GossipOverlay(factory, 3)
+    msg = pb.Cons(round=1)
+
+    overlay.handle(gossip(msg, 'id', 2), 'a')
+    assert factory.handlers.dispatched == [(msg, 'a')]
+    assert len(factory.sent) == factory.config.fan_out
+    assert all(node not in ('me', 'a') and g.ttl == 1 for node, g in factory.sent)
+
+    # duplicate ids are dropped
+    overlay.handle(gossip(msg, 'id', 2), 'b')
+    assert len(factory.handlers.dispatched) == 1
+    assert overlay.dropped['Cons'] == 1
+
+    # the last hop is handled but not forwarded
+    del factory.sent[:]
+    overlay.handle(gossip(msg, 'other id', 1), 'a')
+    assert len(factory.handlers.dispatched) == 2
+    assert factory.sent == []
+
+
+def test_seen_capacity():
+    factory = FakeFactory()
+    overlay = GossipOverlay(factory, 1, capacity=2)
+    msg = pb.Cons(round=1)
+    for msg_id in ['1', '2', '3', '1']:
+        overlay.handle(gossip(msg, msg_id, 1), 'a')
+    assert len(factory.handlers.dispatched) == 4
+
+    overlay.handle(gossip(msg, '3', 1), 'a')
+    assert len(factory.handlers.dispatched) == 4
+
+
+def test_only_gossiped_types():
+    factory = FakeFactory()
+    overlay = GossipOverlay(factory, 3)
+    ping = pb.Ping(port=1)
+    overlay.handle(gossip(ping, 'id', 2), 'a')
+    overlay.handle(pb.Gossip(id='other id', ttl=2, tag=0xfff, body=''), 'a')
+    assert factory.handlers.dispatched == []
+    assert factory.sent == []
+    assert overlay.rejected == {_PB_NAME_TO_TAG['Ping']: 1, 0xfff: 1}
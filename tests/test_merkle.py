@@ -0,0 +1,18 @@
+import pytest
+
+from src.consensus.merkle import merkle_tree, merkle_root, merkle_branch, merkle_verify
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 4, 7, 19, 32])
+def test_branches(count):
+    leaves = ['leaf {}'.format(i) for i in range(count)]
+    tree = merkle_tree(leaves)
+    root = merkle_root(tree)
+    for i, leaf in enumerate(leaves):
+        branch = merkle_branch(tree, i)
+        assert merkle_verify(root, count, i, leaf, branch)
+        assert not merkle_verify(root, count, i, leaf + 'x', branch)
+        assert not merkle_verify(root, count, (i + 1) % count, leaf, branch) or count == 1
+        assert not merkle_verify(root, count, count, leaf, branch)
+    if count > 1:
+        assert not merkle_verify(root, count, 0, leaves[0], merkle_branch(tree, 0)[:-1])
@@ -0,0 +1,70 @@
+import os
+from base64 import b64encode
+
+import pytest
+from twisted.internet import task
+
+import src.messages.messages_pb2 as pb
+from src import utils
+from src.node import Config, MyFactory
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = task.Clock()
+    monkeypatch.setattr(utils, 'reactor', clock)
+    return clock
+
+
+def make_factory(max_connections):
+    config = Config(12345, 4, 1, 4, None, 0, None, 0.0, 2, False, False, False, max_connections=max_connections,
+                    ec_backend='numpy')
+    return MyFactory(config)
+
+
+def test_pool_mode_ready_on_address_book(clock):
+    factory = make_factory(2)
+    vks = [os.urandom(32) for _ in range(factory.config.population)]
+    factory.new_connection_if_not_exist({b64encode(vk): '127.0.0.1:1' for vk in vks[:-1]})
+    assert not factory.peers_ready.is_ready
+
+    # no connection has been made, knowing the whole population is enough
+    factory.new_connection_if_not_exist({b64encode(vks[-1]): '127.0.0.1:1'})
+    assert factory.peers == {}
+    assert factory.peers_ready.is_ready
+
+
+def test_full_mesh_ready_on_handshakes(clock):
+    factory = make_factory(0)
+    vks = [os.urandom(32) for _ in range(factory.config.population)]
+    for vk in vks:
+        factory.pool.add(vk, '127.0.0.1', 1)
+    factory.check_peers_ready()
+    assert not factory.peers_ready.is_ready
+
+    for vk in vks:
+        factory.peers[vk] = ('127.0.0.1', 1, None)
+    factory.check_peers_ready()
+    assert factory.peers_ready.is_ready
+
+
+def test_early_messages_replayed_when_ready(clock):
+    factory = make_factory(2)
+    handled = []
+
+    class Recorder(object):
+        def handle(self, msg, remote_vk):
+            handled.append(msg)
+
+    factory.bracha = factory.mo14 = Recorder()
+    bracha = pb.Bracha(ty=pb.Bracha.READY, digest='d' * 32)
+    mo14 = pb.Mo14(ty=pb.Mo14.EST, r=1, v=1)
+    factory.handle_bracha(bracha, 'vk')
+    factory.handle_mo14(mo14, 'vk')
+    clock.advance(0)
+    assert handled == []
+
+    factory.peers_ready.set()
+    assert handled == []
+    clock.advance(0)
+    assert handled == [bracha, mo14]
@@ -0,0 +1,302 @@
+from struct import pack
+
+import pytest
+from google.protobuf.message import Message
+from twisted.test.proto_helpers import StringTransport
+
+import src.messages.messages_pb2 as pb
+from src.protobufreceiver import ProtobufReceiver, DuplicateFilter, MessageRegistry, Frame, CompressionStats, \
+    LaneStats, batch_frame, _PB_NAME_TO_TAG, _PB_TAG_TO_TUPLE, FIXED_TAG_TO_TAG
+
+
+@pytest.mark.parametrize("capacity", [
+    1,
+    4,
+    100,
+])
+def test_duplicate_filter(capacity):
+    f = DuplicateFilter(['Cons', 'SigWithRound'], capacity)
+    cons_tag = _PB_NAME_TO_TAG['Cons']
+    ping_tag = _PB_NAME_TO_TAG['Ping']
+
+    frames = [pb.Cons(round=r).SerializeToString() for r in range(capacity)]
+    for frame in frames:
+        assert not f.is_duplicate(cons_tag, frame)
+    for frame in frames:
+        assert f.is_duplicate(cons_tag, frame)
+    assert f.dropped['Cons'] == capacity
+
+    # the oldest frame is evicted when the cache is full
+    assert not f.is_duplicate(cons_tag, pb.Cons(round=capacity).SerializeToString())
+    assert not f.is_duplicate(cons_tag, frames[0])
+
+    # types that are not filtered are never dropped
+    ping = pb.Ping(port=1).SerializeToString()
+    assert not f.is_duplicate(ping_tag, ping)
+    assert not f.is_duplicate(ping_tag, ping)
+    assert 'Ping' not in f.dropped
+
+
+def test_registry():
+    registry = MessageRegistry()
+    received = []
+    registry.register(pb.Cons, lambda msg, vk: received.append((msg, vk)))
+
+    with pytest.raises(AssertionError):
+        registry.register(pb.Cons, lambda msg, vk: None)
+
+    msg = pb.Cons(round=1)
+    registry.dispatch(_PB_NAME_TO_TAG['Cons'], msg, 'vk')
+    registry.dispatch(_PB_NAME_TO_TAG['Cons'], msg, 'vk')
+    assert received == [(msg, 'vk'), (msg, 'vk')]
+    assert registry.stats['Cons']['calls'] == 2
+
+    with pytest.raises(AssertionError):
+        registry.dispatch(_PB_NAME_TO_TAG['Ping'], pb.Ping(), 'vk')
+
+
+def test_frame():
+    msg = pb.Cons(round=3, blocks=[pb.CpBlock(inner=pb.CpBlock.Inner(seq=1))])
+    frame = Frame(msg)
+    assert Frame.of(frame) is frame
+    assert frame.size == msg.ByteSize()
+    assert frame.name == 'Cons'
+
+    # the frame is decoded by the usual receiver
+    received = []
+    receiver = ProtobufReceiver()
+    receiver.obj_received = received.append
+    receiver.dataReceived(frame.data + frame.data)
+    assert received == [msg, msg]
+
+
+def make_cons(n):
+    vk = 'v' * 32
+    blocks = [pb.CpBlock(inner=pb.CpBlock.Inner(seq=i, signers='\x0f', sigs=[''] * 4), s=pb.Signature(vk=vk))
+              for i in range(n)]
+    return pb.Cons(round=1, blocks=blocks)
+
+
+def connected_receiver():
+    received = []
+    p = ProtobufReceiver()
+    p.obj_received = received.append
+    p.makeConnection(StringTransport())
+    return p, received
+
+
+@pytest.mark.parametrize("remote_compression,threshold,compressed", [
+    (True, 100, True),
+    (True, 0, False),
+    (True, 10 ** 6, False),
+    (False, 100, False),
+])
+def test_compression(remote_compression, threshold, compressed):
+    msg = make_cons(100)
+    frame = Frame(msg)
+
+    sender, _ = connected_receiver()
+    sender.remote_compression = remote_compression
+    sender.compression_threshold = threshold
+    sender.compression_stats = CompressionStats()
+    sender.send_frame(frame)
+    data = sender.transport.value()
+    assert (len(data) < len(frame.data)) == compressed
+    assert ('Cons' in sender.compression_stats.stats) == compressed
+
+    receiver, received = connected_receiver()
+    receiver.dataReceived(data)
+    assert received == [msg]
+
+
+def test_unknown_version():
+    frame = Frame(pb.Cons(round=1))
+    receiver, received = connected_receiver()
+    with pytest.raises(IOError):
+        receiver.dataReceived(frame.data[:4] + chr(0xf0) + frame.data[5:])
+    assert received == []
+
+
+def test_stable_tags():
+    # changing any of these breaks the wire format
+    assert _PB_NAME_TO_TAG['Dummy'] == 1
+    assert _PB_NAME_TO_TAG['Cons'] == 17
+    assert _PB_NAME_TO_TAG['ValidationResp'] == 22
+    assert FIXED_TAG_TO_TAG[25] == _PB_NAME_TO_TAG['Mo14']
+    assert FIXED_TAG_TO_TAG[28] == _PB_NAME_TO_TAG['ACS']
+
+    # every top level message type has a tag
+    names = {k for k, v in vars(pb).iteritems() if isinstance(v, type) and issubclass(v, Message)}
+    assert names == {name for name, _ in _PB_TAG_TO_TUPLE.itervalues()}
+
+
+_DIGEST = 'd' * 32
+_READY = pb.Bracha.Type.Value('READY')
+
+
+@pytest.mark.parametrize("msg,fits", [
+    (pb.Mo14(ty=pb.Mo14.AUX, r=3, v=1), True),
+    (pb.Mo14(), True),
+    (pb.Mo14(r=1 << 16), False),
+    (pb.Bracha(ty=_READY, digest=_DIGEST), True),
+    (pb.Bracha(ty=_READY, digest='d' * 31), False),
+    (pb.Bracha(ty=pb.Bracha.ECHO, digest=_DIGEST, fragment='f', index=2, branch=['b' * 32]), False),
+    (pb.ACS(instance=5, round=1000, mo14=pb.Mo14(ty=pb.Mo14.EST, r=2, v=0)), True),
+    (pb.ACS(instance=1 << 16, round=1, mo14=pb.Mo14()), False),
+    (pb.ACS(instance=0, round=-1, mo14=pb.Mo14()), False),
+    (pb.ACS(instance=3, round=(1 << 31) - 1, bracha=pb.Bracha(ty=_READY, digest=_DIGEST)), True),
+    (pb.ACS(instance=3, round=7, bracha=pb.Bracha(ty=pb.Bracha.INIT, digest=_DIGEST, fragment='f')), False),
+    (pb.ACS(instance=3, round=7), False),
+])
+def test_fixed_layouts(msg, fits):
+    frame = Frame(msg)
+    fixed = frame.fixed()
+    assert (fixed is not frame) == fits
+    assert frame.fixed() is fixed and fixed.fixed() is fixed
+    if fits:
+        assert fixed.tag in FIXED_TAG_TO_TAG and FIXED_TAG_TO_TAG[fixed.tag] == frame.tag
+        assert fixed.name == frame.name
+
+    # the receiver gets the same message with the tag of its type, alone or batched
+    tags = []
+    receiver, received = connected_receiver()
+    receiver.tagged_obj_received = lambda tag, obj: (tags.append(tag), received.append(obj))
+    receiver.dataReceived(fixed.data + batch_frame([(fixed, False), (frame, False)]))
+    assert received == [msg] * 3
+    assert tags == [frame.tag] * 3
+
+    # fixed layouts are only sent to the peers that support them
+    for remote_fixed in (False, True):
+        sender, _ = connected_receiver()
+        sender.remote_fixed = remote_fixed
+        assert sender.send_frame(frame) is (fixed if remote_fixed else frame)
+        sender.flush()
+        assert sender.transport.value() == (fixed.data if remote_fixed else frame.data)
+
+
+def test_fixed_layout_size():
+    frame = Frame(pb.ACS(instance=5, round=1, mo14=pb.Mo14(ty=pb.Mo14.EST, r=2, v=0))).fixed()
+    receiver, received = connected_receiver()
+    with pytest.raises(IOError):
+        receiver.stringReceived(frame.data[4:-1])
+    with pytest.raises(IOError):
+        receiver.stringReceived(frame.data[4:] + '\x00')
+    assert received == []
+
+
+def test_batch():
+    msgs = [pb.Cons(round=1), make_cons(100), pb.Ping(port=1), pb.Dummy()]
+    data = batch_frame([(Frame(msg), True) for msg in msgs])
+    assert data[:4] == pack('!I', len(data) - 4)  # a single length prefix
+
+    receiver, received = connected_receiver()
+    receiver.dataReceived(data + Frame(msgs[0]).data)
+    assert received == msgs + msgs[:1]
+
+    # truncated entries are rejected
+    with pytest.raises(IOError):
+        receiver.stringReceived(data[4:-1])
+
+
+@pytest.mark.parametrize("remote_batch", [
+    True,
+    False,
+])
+def test_coalescing(remote_batch):
+    msgs = [pb.Cons(round=r) for r in range(10)]
+    sender, _ = connected_receiver()
+    sender.flush_threshold = 1024
+    sender.remote_batch = remote_batch
+    for msg in msgs:
+        sender.send_obj(msg)
+    assert sender.transport.value() == ''
+    sender.flush()
+    data = sender.transport.value()
+    assert (len(data) < sum(len(Frame(msg).data) for msg in msgs)) == remote_batch
+
+    receiver, received = connected_receiver()
+    receiver.dataReceived(data)
+    assert received == msgs
+
+
+def test_coalescing_length_limit():
+    msgs = [make_cons(3) for _ in range(10)]
+    sender, _ = connected_receiver()
+    sender.MAX_LENGTH = 4 * len(Frame(msgs[0]).data)
+    sender.flush_threshold = 10 ** 6
+    sender.remote_batch = True
+    for msg in msgs:
+        sender.send_obj(msg)
+    sender.flush()
+
+    # every batch fits in the receiver's MAX_LENGTH
+    receiver, received = connected_receiver()
+    receiver.MAX_LENGTH = sender.MAX_LENGTH
+    receiver.dataReceived(sender.transport.value())
+    assert received == msgs
+
+
+@pytest.mark.parametrize("chunk", [
+    1,
+    7,
+    1000,
+    10 ** 6,
+])
+def test_partial_reads(chunk):
+    msgs = [pb.Cons(round=1), make_cons(100), pb.Ping(port=1), make_cons(3)]
+    data = ''.join(Frame(msg).data for msg in msgs)
+
+    receiver, received = connected_receiver()
+    for i in range(0, len(data), chunk):
+        receiver.dataReceived(data[i:i + chunk])
+    assert received == msgs
+    assert receiver._buffer is None
+
+
+def test_length_limit():
+    receiver, received = connected_receiver()
+    receiver.MAX_LENGTH = 100
+    with pytest.raises(IOError):
+        receiver.dataReceived(Frame(make_cons(10)).data)
+    assert received == []
+
+
+class PausingTransport(StringTransport):
+    """
+    A transport that is full after every write
+    """
+    def write(self, data):
+        StringTransport.write(self, data)
+        self.producer.pauseProducing()
+
+
+@pytest.mark.parametrize("remote_chunk,compress", [
+    (True, False),
+    (True, True),
+    (False, False),
+])
+def test_lanes(remote_chunk, compress):
+    big = make_cons(1000)
+    small = pb.Mo14(ty=pb.Mo14.EST, r=1, v=1)
+
+    sender = ProtobufReceiver()
+    sender.lane_names = ('high', 'low')
+    sender.tag_lanes = {_PB_NAME_TO_TAG['Cons']: 1}
+    sender.lane_stats = LaneStats()
+    sender.chunk_size = 1000
+    sender.remote_chunk = remote_chunk
+    sender.remote_compression = compress
+    sender.compression_threshold = 1
+    sender.makeConnection(PausingTransport())
+
+    # the first write pauses us, the small frame overtakes the rest of the big one if it is chunked
+    sender.send_obj(big)
+    sender.send_obj(small)
+    while sender._lanes[0] or sender._lanes[1]:
+        sender.resumeProducing()
+
+    receiver, received = connected_receiver()
+    receiver.dataReceived(sender.transport.value())
+    assert received == ([small, big] if remote_chunk else [big, small])
+    assert sender.lane_stats.stats['low']['frames'] == 1
+    assert sender.lane_stats.stats['high']['frames'] == 1
@@ -0,0 +1,60 @@
+import time
+
+from src.scheduler import Scheduler
+
+
+def test_priority():
+    scheduler = Scheduler(['high', 'low'], 10)
+    done = []
+    scheduler.submit(1, done.append, 'low 1')
+    scheduler.submit(0, done.append, 'high 1')
+    scheduler.submit(1, done.append, 'low 2')
+    scheduler.submit(0, done.append, 'high 2')
+    assert len(scheduler) == 4
+
+    scheduler._run()
+    assert done == ['high 1', 'high 2', 'low 1', 'low 2']
+    assert len(scheduler) == 0
+    assert scheduler.stats['high']['tasks'] == 2
+    assert scheduler.stats['low']['tasks'] == 2
+
+
+def test_budget():
+    scheduler = Scheduler(['high', 'low'], 0.01)
+    done = []
+
+    def slow(x):
+        time.sleep(0.01)
+        done.append(x)
+
+    for i in range(3):
+        scheduler.submit(1, slow, i)
+
+    # only one task fits in the budget, a new high priority task overtakes the rest
+    scheduler._run()
+    scheduler.submit(0, slow, 'high')
+    scheduler._run()
+    assert done == [0, 'high']
+    assert len(scheduler) == 2
+    assert scheduler.stats['low']['queued'] == 2
+    assert scheduler.stats['low']['tasks'] == 1
+
+
+def test_raising_task():
+    scheduler = Scheduler(['high', 'low'], 10)
+    done = []
+
+    def fail(x):
+        raise ValueError(x)
+
+    scheduler.submit(0, done.append, 1)
+    scheduler.submit(0, fail, 2)
+    scheduler.submit(1, done.append, 3)
+
+    scheduler._run()
+    assert done == [1, 3]
+    assert len(scheduler) == 0
+
+    # the next submission is scheduled again
+    scheduler.submit(1, done.append, 4)
+    assert scheduler._scheduled
@@ -2,6 +2,7 @@ import random
 import string
 import pytest
 from src.trustchain import *
+from src.trustchain.trustchain_runner import _strip_endpoints, _restore_endpoints
 from src.utils import hash_pointers_ok
 
 
@@ -55,6 +56,27 @@ def gen_txblock(prev_s, prev_r, vk_s, sk_s, vk_r, sk_r, h_s, h_r, m):
     return tx_s, tx_r
 
 
+def test_tx_endpoints_restored():
+    m, vk_s, sk_s = sigs()
+    _, vk_r, sk_r = sigs()
+    tx = TxBlock.new('p' * 32, 1, vk_r, m, vk_s, sk_s)
+
+    wire = _strip_endpoints(tx)
+    assert vk_s not in wire.SerializeToString() and vk_r not in wire.SerializeToString()
+    assert tx.inner.counterparty == vk_r and tx.s.vk == vk_s
+
+    _restore_endpoints(wire, vk_s, vk_r)
+    assert TxBlock(wire) == tx
+
+    # the signature covers the counterparty, so the tx cannot be passed off as one for another receiver
+    other = TxBlock.new('p' * 32, 1, vk_s, m, vk_r, sk_r, tx.inner.nonce)
+    wire = _strip_endpoints(tx)
+    _, vk_x, _ = sigs()
+    _restore_endpoints(wire, vk_s, vk_x)
+    with pytest.raises(ValueError):
+        other.add_other_half(TxBlock(wire))
+
+
 def test_txblock():
     """
     test creation of a single block
@@ -94,7 +116,12 @@ def test_cpblock(n, x):
 
     t = (n - 1) / 3
     if x - 1 >= t:  # number of signatures - 1 is greater than t
-        CpBlock.new(my_genesis.hash, 1, cons, 1, my_vk, my_sk, ss, vks, t)
+        cp = CpBlock.new(my_genesis.hash, 1, cons, 1, my_vk, my_sk, ss, vks, t)
+        # the signers are a bitmap of the promoters, the signatures come back whole
+        assert len(cp.inner.signers) == (n + 7) / 8
+        expected = sorted(s.SerializeToString() for s in ss)
+        assert sorted(s.SerializeToString() for s in cp.signatures(vks)) == expected
+        assert sorted(s.SerializeToString() for s in CpBlock(cp.pb).signatures(vks[::-1])) == expected
     else:
         with pytest.raises(ValueError):
             CpBlock.new(my_genesis.hash, 1, cons, 1, my_vk, my_sk, ss, vks, t)
@@ -325,3 +352,52 @@ def test_validation(seq, n_cp, n_tx, expected):
         # if we load the cache again, it should be the initial response
         assert tc_s.load_cache_for_verification(seq) == resp
 
+
+@pytest.mark.parametrize("seq,n_cp,n_tx,horizon", [
+    (4, 3, 5, 0),
+    (7, 4, 5, 1),
+    (7, 4, 5, 10),
+])
+def test_compaction(seq, n_cp, n_tx, horizon):
+    """
+    Validation should give the same result before and after compacting the consensus results
+    :param seq:
+    :param n_cp:
+    :param n_tx:
+    :param horizon:
+    :return:
+    """
+    tc_s, tc_r = generate_tc_pair(n_cp, n_tx)
+    promoters = {r: list(cons.get_promoters(2)) for r, cons in tc_s.consensus.iteritems()}
+    full = dict(tc_s.consensus)
+
+    compacted = tc_s.compact_consensus(horizon, 2)
+    assert compacted == max(0, n_cp - horizon - 1)
+    assert tc_s.compact_consensus(horizon, 2) == 0
+
+    for r, cons in tc_s.consensus.iteritems():
+        assert isinstance(cons, CompactCons) == (r < tc_s.latest_round - horizon)
+        assert cons.get_promoters(2) == promoters[r]
+        assert tc_s.full_consensus(r) == full[r]
+
+    assert tc_s.consensus_round_of_cp(tc_s.my_chain.chain[0]) == 1
+
+    seq_r = tc_s.my_chain.chain[seq].inner.seq
+    resp = tc_r.agreed_pieces(seq_r)
+    assert tc_s.verify_tx(seq, resp) == VALIDITY_ENUM.Valid
+
+
+def test_compacted_cons_cache():
+    """
+    Only the serialized results of the most recently used compacted rounds are kept
+    """
+    tc_s, _ = generate_tc_pair(7, 1)
+    full = dict(tc_s.consensus)
+
+    assert tc_s.compact_consensus(3, 2, cache_size=2) == 3
+    assert tc_s.full_consensus(1) is None
+    assert tc_s.full_consensus(2) == full[2]
+
+    # round 3 is now the least recently used
+    assert tc_s.compact_consensus(2, 2, cache_size=2) == 1
+    assert [tc_s.full_consensus(r) for r in range(1, 8)] == [None, full[2], None, full[4], full[5], full[6], full[7]]
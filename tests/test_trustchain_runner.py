@@ -1,6 +1,200 @@
 from tools import *
 import json
 
+import src.messages.messages_pb2 as pb
+from src.trustchain.trustchain import TrustChain, Cons, CompactCons, Signature
+from src.trustchain import trustchain_runner
+from src.trustchain.trustchain_runner import TrustChainRunner, ASK_CONS_TIMEOUT
+from src.utils import PromoterIndex
+
+
+class Config(object):
+    n = 2
+    t = 0
+    population = 2
+    cons_horizon = 1
+    auto_byzantine = False
+    ignore_promoter = False
+
+
+class ACS(object):
+    def stop(self, r):
+        pass
+
+
+class Factory(object):
+    def __init__(self, promoters):
+        self.config = Config()
+        self.promoters = promoters
+        self.acs = ACS()
+        self.msgs = []
+
+    def send(self, node, msg):
+        self.msgs.append((node, msg))
+
+    def promoter_cast(self, msg):
+        pass
+
+    def gossip(self, msg):
+        pass
+
+    def log_communication_costs(self, heading):
+        pass
+
+
+def make_runner(tc, promoters):
+    runner = TrustChainRunner(Factory(promoters))
+    runner.collect_rubbish_lc.stop()
+    runner.log_tx_count_lc.stop()
+    runner.tc = tc
+    runner._initial_promoters = promoters
+    return runner
+
+
+def generate_rounds(tcs, n_cp):
+    """
+    Every node is a promoter and signs the consensus result of every round
+    :param tcs:
+    :param n_cp: number of rounds
+    :return: the consensus result and the signatures of every round
+    """
+    vks = [tc.vk for tc in tcs]
+    rounds = []
+    for r in range(1, n_cp + 1):
+        cons = Cons.new(r, [tc.latest_cp.pb for tc in tcs])
+        ss = [Signature.new(tc.vk, tc._sk, cons.hash) for tc in tcs]
+        for tc in tcs:
+            tc.new_cp(1, cons, ss, vks, 0)
+        rounds.append((cons, ss))
+    return rounds
+
+
+def test_catch_up_past_horizon():
+    """
+    A node that missed the consensus results of the rounds that the promoter compacted still catches up
+    """
+    tcs = [TrustChain(), TrustChain()]
+    vks = [tc.vk for tc in tcs]
+    rounds = generate_rounds(tcs, 5)
+
+    promoter = make_runner(tcs[0], vks)
+    promoter._collect_rubbish()
+    assert [r for r, cons in promoter.tc.consensus.iteritems() if isinstance(cons, CompactCons)] == [1, 2, 3]
+
+    # the lagging node has every signature but only the latest consensus result
+    lagging = make_runner(TrustChain(), vks)
+    index = PromoterIndex(vks)
+    for r, (cons, ss) in enumerate(rounds, 1):
+        for s in ss:
+            lagging.handle_sig(pb.SigWithRound(r=r, signer=index.index(s.vk), sig=s.detached), vks[0])
+    lagging.handle_cons(rounds[-1][0].pb, vks[0])
+    assert lagging.tc.latest_round == 0
+
+    (node, ask), = lagging.factory.msgs
+    assert isinstance(ask, pb.AskConsRange)
+    assert (ask.start, ask.end) == (1, 4)
+
+    promoter.handle_ask_cons_range(ask, lagging.tc.vk)
+    assert [cons.round for _, cons in promoter.factory.msgs] == [1, 2, 3, 4]
+    for _, cons in promoter.factory.msgs:
+        lagging.handle_cons(cons.pb, node)
+    assert lagging.tc.latest_round == 5
+
+
+def test_ask_cons_range_once():
+    """
+    The missing consensus results are asked for again only after ASK_CONS_TIMEOUT
+    """
+    tcs = [TrustChain(), TrustChain()]
+    vks = [tc.vk for tc in tcs]
+    rounds = generate_rounds(tcs, 5)
+    index = PromoterIndex(vks)
+
+    def sig(r, i):
+        s = rounds[r - 1][1][i]
+        return pb.SigWithRound(r=r, signer=index.index(s.vk), sig=s.detached)
+
+    lagging = make_runner(TrustChain(), vks)
+    lagging.handle_sig(sig(4, 0), vks[0])
+    lagging.handle_cons(rounds[3][0].pb, vks[0])
+    lagging.handle_sig(sig(4, 1), vks[0])
+    assert [(ask.start, ask.end) for _, ask in lagging.factory.msgs] == [(1, 3)]
+
+    # only the rounds after the ones that are on their way
+    lagging.handle_sig(sig(5, 0), vks[0])
+    lagging.handle_cons(rounds[4][0].pb, vks[0])
+    assert [(ask.start, ask.end) for _, ask in lagging.factory.msgs] == [(1, 3), (4, 4)]
+
+    # nothing arrived in time
+    end, asked_time = lagging._asked_cons
+    lagging._asked_cons = (end, asked_time - ASK_CONS_TIMEOUT)
+    lagging.handle_sig(sig(5, 1), vks[0])
+    assert [(ask.start, ask.end) for _, ask in lagging.factory.msgs] == [(1, 3), (4, 4), (1, 4)]
+
+
+@pytest.mark.parametrize("start,end,max_range,expected", [
+    (1, 5, 64, [1, 2, 3, 4, 5]),
+    (-3, 2, 64, [1, 2]),
+    (2, 5, 2, [2, 3]),
+    (4, 4, 64, [4]),
+    (3, 2, 64, []),
+    (1, 6, 64, [1, 2, 3, 4, 5]),
+    (6, 8, 64, []),
+    (-3, -1, 64, []),
+])
+def test_ask_cons_range(start, end, max_range, expected, monkeypatch):
+    tcs = [TrustChain(), TrustChain()]
+    vks = [tc.vk for tc in tcs]
+    generate_rounds(tcs, 5)
+    monkeypatch.setattr(trustchain_runner, 'MAX_CONS_RANGE', max_range)
+
+    promoter = make_runner(tcs[0], vks)
+    promoter.handle_ask_cons_range(pb.AskConsRange(start=start, end=end), vks[1])
+    assert [cons.round for _, cons in promoter.factory.msgs] == expected
+
+
+def test_try_add_cp_chains():
+    """
+    A CP that was waiting for the consensus result of the previous round is added as soon as that result arrives
+    """
+    tcs = [TrustChain(), TrustChain()]
+    vks = [tc.vk for tc in tcs]
+    rounds = generate_rounds(tcs, 3)
+    index = PromoterIndex(vks)
+
+    lagging = make_runner(TrustChain(), vks)
+    for r, (cons, ss) in enumerate(rounds, 1):
+        lagging.handle_sig(pb.SigWithRound(r=r, signer=index.index(ss[0].vk), sig=ss[0].detached), vks[0])
+    lagging.handle_cons(rounds[2][0].pb, vks[0])
+    lagging.handle_cons(rounds[1][0].pb, vks[0])
+    assert lagging.tc.latest_round == 0
+
+    lagging.handle_cons(rounds[0][0].pb, vks[0])
+    assert lagging.tc.latest_round == 3
+    assert [cp.round for cp in lagging.tc.my_chain.chain] == [0, 1, 2, 3]
+
+
+def test_invalid_signer():
+    """
+    Signatures of positions that are not promoters do not count
+    """
+    tcs = [TrustChain(), TrustChain()]
+    vks = [tc.vk for tc in tcs]
+    rounds = generate_rounds(tcs, 1)
+    cons, ss = rounds[0]
+
+    runner = make_runner(TrustChain(), vks)
+    runner.handle_cons(cons.pb, vks[0])
+    for signer in [-1, 2, 7]:
+        runner.handle_sig(pb.SigWithRound(r=1, signer=signer, sig=ss[0].detached), vks[0])
+    runner.round_states[1].new_sig(5, ss[0].detached)
+    assert not runner._sufficient_sigs(1)
+    assert runner.tc.latest_round == 0
+
+    signer = PromoterIndex(vks).index(ss[0].vk)
+    runner.handle_sig(pb.SigWithRound(r=1, signer=signer, sig=ss[0].detached), vks[0])
+    assert runner.tc.latest_round == 1
+
 
 def check_multiple_rounds(n, t, max_r):
     for r in range(1, 1 + max_r):
@@ -73,6 +267,22 @@ def test_consensus(n, t, m, failure, profile, folder, discover):
         print_profile_stats(profile)
 
 
+@pytest.mark.parametrize("n,t,m,max_connections", [
+    (4, 1, 12, 6),
+])
+def test_connection_pool(n, t, m, max_connections, folder, discover):
+    configs = []
+    for i in range(m):
+        port = GOOD_PORT + i
+        configs.append(make_args(port, n, t, m, test='bootstrap', output=DIR + str(port) + '.out', broadcast=False,
+                                 max_connections=max_connections))
+
+    ps = run_subprocesses(NODE_CMD_PREFIX, configs)
+    print "Test: consensus nodes starting with a connection pool"
+
+    poll_check_f(8 * m, 5, ps, check_multiple_rounds, m, 0, 3)
+
+
 def check_tx(expected):
     target = 'INFO - TC: current tx count'
     total_tx_count = sum([int(res.split(',')[0]) for res in search_for_last_string_in_dir(DIR, target)])
@@ -0,0 +1,86 @@
+import pytest
+from twisted.internet import task
+
+from src import utils
+from src.utils import Readiness, FutureBuffer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = task.Clock()
+    monkeypatch.setattr(utils, 'reactor', clock)
+    return clock
+
+
+def test_readiness(clock):
+    ready = Readiness('test')
+    done = []
+    ready.then(done.append, 'then 1')
+    ready.first(done.append, 'first')
+    ready.then(done.append, 'then 2')
+    clock.advance(0)
+    assert not ready.is_ready and done == []
+
+    # first runs as part of set, then in the next iteration in the order they were added
+    ready.set()
+    assert ready.is_ready
+    assert done == ['first']
+    clock.advance(0)
+    assert done == ['first', 'then 1', 'then 2']
+
+    # after set, first runs immediately and then still runs in the next iteration
+    ready.then(done.append, 'then 3')
+    ready.first(done.append, 'first 2')
+    assert done == ['first', 'then 1', 'then 2', 'first 2']
+    clock.advance(0)
+    assert done == ['first', 'then 1', 'then 2', 'first 2', 'then 3']
+
+    # nothing runs twice
+    ready.set()
+    clock.advance(0)
+    assert done == ['first', 'then 1', 'then 2', 'first 2', 'then 3']
+
+
+def test_future_buffer_release():
+    buf = FutureBuffer(10)
+    for msg in ['a1', 'b1', 'a2']:
+        assert buf.add(1, msg[0], msg)
+    buf.add(1, None, 'batch')
+    buf.add(2, 'a', 'next round')
+    assert len(buf) == 5
+
+    # one instance, in the order the messages were added
+    assert buf.release(1, 'a') == ['a1', 'a2']
+    assert buf.release(1, 'a') == []
+    assert len(buf) == 3
+
+    # the whole round, including the messages of no particular instance, but not the other rounds
+    assert sorted(buf.release(1)) == ['b1', 'batch']
+    assert len(buf) == 1
+    assert buf.release(2) == ['next round']
+    assert len(buf) == 0
+
+
+def test_future_buffer_discard():
+    buf = FutureBuffer(10)
+    for r in range(1, 4):
+        buf.add(r, 'a', r)
+        buf.add(r, 'b', r)
+
+    buf.discard(2)
+    assert len(buf) == 2
+    assert buf.dropped['stale'] == 4
+    assert buf.release(1) == [] and buf.release(2) == []
+    assert buf.release(3) == [3, 3]
+
+
+def test_future_buffer_full():
+    buf = FutureBuffer(2)
+    assert buf.add(1, 'a', 1)
+    assert buf.add(1, 'a', 2)
+    assert not buf.add(1, 'a', 3)
+    assert buf.dropped['full'] == 1
+
+    # releasing makes room again
+    assert buf.release(1, 'a') == [1, 2]
+    assert buf.add(1, 'a', 3)
@@ -154,7 +154,8 @@ def run_subprocesses(prefix, cmds, sleep_interval=0):
 
 
 def make_args(port, n, t, population, test=None, value=0, failure=None, tx_rate=0, loglevel=logging.INFO, output=None,
-              broadcast=True, fan_out=10, profile=None, validate=False, ignore_promoter=False):
+              broadcast=True, fan_out=10, profile=None, validate=False, ignore_promoter=False, max_connections=0,
+              ec_backend=None, ec_threads=None, batch_votes=True, fixed_codec=False):
     """
     This function should produce all the parameters accepted by argparse
     :param port:
@@ -172,6 +173,11 @@ def make_args(port, n, t, population, test=None, value=0, failure=None, tx_rate=
     :param profile:
     :param validate:
     :param ignore_promoter:
+    :param max_connections:
+    :param ec_backend:
+    :param ec_threads:
+    :param batch_votes:
+    :param fixed_codec:
     :return:
     """
     res = [str(port), str(n), str(t), str(population)]
@@ -216,5 +222,23 @@ def make_args(port, n, t, population, test=None, value=0, failure=None, tx_rate=
     if ignore_promoter:
         res.append('--ignore-promoter')
 
+    if max_connections:
+        res.append('--max-connections')
+        res.append(str(max_connections))
+
+    if ec_backend is not None:
+        res.append('--ec-backend')
+        res.append(ec_backend)
+
+    if ec_threads is not None:
+        res.append('--ec-threads')
+        res.append(str(ec_threads))
+
+    if not batch_votes:
+        res.append('--no-batch-votes')
+
+    if fixed_codec:
+        res.append('--fixed-codec')
+
     return res
 